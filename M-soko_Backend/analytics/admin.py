@@ -0,0 +1,22 @@
+from django.contrib import admin
+from .models import DailyProductSales, DailyCategorySales, DailyUserSales
+
+@admin.register(DailyProductSales)
+class DailyProductSalesAdmin(admin.ModelAdmin):
+    list_display = ('day', 'product', 'orders', 'units', 'revenue')
+    list_filter = ('day',)
+    list_select_related = ('product',)
+    show_full_result_count = False
+
+@admin.register(DailyCategorySales)
+class DailyCategorySalesAdmin(admin.ModelAdmin):
+    list_display = ('day', 'category', 'orders', 'units', 'revenue')
+    list_filter = ('day', 'category')
+    list_select_related = ('category',)
+
+@admin.register(DailyUserSales)
+class DailyUserSalesAdmin(admin.ModelAdmin):
+    list_display = ('day', 'user', 'orders', 'units', 'revenue')
+    list_filter = ('day',)
+    list_select_related = ('user',)
+    show_full_result_count = False
@@ -0,0 +1,56 @@
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.utils import timezone
+
+from m_soko.bulk import iter_pk_chunks
+from orders.models import ArchivedOrder, Order
+from analytics.models import DailyProductSales, DailyCategorySales, DailyUserSales
+from analytics.rollups import record_orders
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the daily sales rollups from order history, one chunk of "
+        "orders at a time so memory use stays flat regardless of history size."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only rebuild days from this date (YYYY-MM-DD).")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        orders = Order.objects.exclude(status='Cancelled')
+        rollups = [DailyProductSales, DailyCategorySales, DailyUserSales]
+
+        since = None
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("--since must be a date in YYYY-MM-DD format.")
+
+        # Archived orders no longer have lines to roll up, so the days they cover are kept as they are
+        newest_archived = ArchivedOrder.objects.aggregate(last=Max('created_at'))['last']
+        if newest_archived is not None:
+            keep_until = timezone.localdate(newest_archived) + timedelta(days=1)
+            if since is None or since < keep_until:
+                since = keep_until
+                self.stdout.write(f"Keeping rollups before {since} (archived orders).")
+
+        if since is not None:
+            orders = orders.filter(created_at__gte=timezone.make_aware(datetime.combine(since, time.min)))
+            for model in rollups:
+                model.objects.filter(day__gte=since).delete()
+        else:
+            for model in rollups:
+                model.objects.all().delete()
+
+        processed = 0
+        for pks in iter_pk_chunks(orders, options['chunk_size']):
+            record_orders(pks)
+            processed += len(pks)
+            self.stdout.write(f"Rolled up {processed} orders...")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt sales rollups from {processed} orders."))
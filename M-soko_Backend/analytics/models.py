@@ -0,0 +1,57 @@
+from django.db import models
+from django.contrib.auth import get_user_model
+from products.models import Product, Category
+
+User = get_user_model()
+
+# Pre-aggregated sales per day. Rows are kept up to date incrementally by
+# analytics.rollups when orders are placed or cancelled, so reports never
+# have to scan OrderItem. Cancelled orders are excluded from every rollup.
+
+class DailyProductSales(models.Model):
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('day', 'product')
+        verbose_name_plural = "Daily product sales"
+        indexes = [
+            models.Index(fields=['product', 'day'], name='dailyproduct_product_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} on {self.day}: {self.revenue}"
+
+class DailyCategorySales(models.Model):
+    day = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('day', 'category')
+        verbose_name_plural = "Daily category sales"
+
+    def __str__(self):
+        return f"{self.category_id} on {self.day}: {self.revenue}"
+
+class DailyUserSales(models.Model):
+    day = models.DateField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('day', 'user')
+        verbose_name_plural = "Daily user sales"
+        indexes = [
+            models.Index(fields=['user', 'day'], name='dailyuser_user_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} on {self.day}: {self.revenue}"
@@ -0,0 +1,94 @@
+"""
+Incremental maintenance of the daily sales rollup tables.
+
+Every write groups the order lines of a set of orders by day in the
+database and then adds (or subtracts) the totals into the matching rollup
+rows with F() increments, so concurrent checkouts never overwrite each
+other's counts.
+
+Revenue is net of promotions: an order's discount_amount is spread over its
+lines in proportion to their value, so the product, category and user
+rollups all add up to the order totals actually charged.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Coalesce, NullIf, TruncDate
+from django.utils import timezone
+
+from orders.models import OrderItem
+from .models import DailyProductSales, DailyCategorySales, DailyUserSales
+
+# (rollup model, OrderItem field the rollup is keyed on, rollup key name)
+ROLLUPS = [
+    (DailyProductSales, 'product_id', 'product_id'),
+    (DailyCategorySales, 'product__category_id', 'category_id'),
+    (DailyUserSales, 'order__user_id', 'user_id'),
+]
+
+
+def _increment(model, keys, deltas):
+    changes = {field: F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**keys).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **deltas)
+    except IntegrityError:
+        # Another writer created the row first
+        model.objects.filter(**keys).update(**changes)
+
+
+def record_orders(order_ids, sign=1):
+    """
+    Adds the lines of the given orders to the rollups, or removes them with
+    sign=-1 (used when orders are cancelled).
+    """
+    order_ids = list(order_ids)
+    if not order_ids:
+        return
+    lines = OrderItem.objects.filter(order_id__in=order_ids).annotate(
+        day=TruncDate('order__created_at', tzinfo=timezone.get_current_timezone()),
+    )
+    # Each line's share of the total charged; orders that came to nothing count for nothing
+    line_total = ExpressionWrapper(
+        Coalesce(
+            F('price') * F('quantity') * F('order__total_amount')
+            / NullIf(F('order__total_amount') + F('order__discount_amount'), Value(0)),
+            Value(0),
+        ),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+    for model, source, key in ROLLUPS:
+        grouped = (
+            lines.values('day', source)
+            .annotate(
+                orders=Count('order_id', distinct=True),
+                units=Sum('quantity'),
+                revenue=Sum(line_total),
+            )
+            .order_by()
+        )
+        for row in grouped:
+            _increment(
+                model,
+                {'day': row['day'], key: row[source]},
+                {
+                    'orders': sign * row['orders'],
+                    'units': sign * row['units'],
+                    'revenue': sign * row['revenue'],
+                },
+            )
+
+
+def record_status_change(order_ids, old_status, new_status):
+    """
+    Keeps the rollups in step with a status transition: cancelled orders
+    leave the rollups, and orders restored from Cancelled come back.
+    """
+    if new_status == old_status:
+        return
+    if new_status == 'Cancelled':
+        record_orders(order_ids, sign=-1)
+    elif old_status == 'Cancelled':
+        record_orders(order_ids)
@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import CategorySalesView, TopProductsView, TopCustomersView
+
+urlpatterns = [
+    path('categories/daily/', CategorySalesView.as_view(), name='analytics-category-daily'),
+    path('products/top/', TopProductsView.as_view(), name='analytics-top-products'),
+    path('customers/top/', TopCustomersView.as_view(), name='analytics-top-customers'),
+]
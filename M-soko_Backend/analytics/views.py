@@ -0,0 +1,93 @@
+from datetime import timedelta
+
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import generics
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser
+
+from .models import DailyProductSales, DailyCategorySales, DailyUserSales
+from .serializers import DailyCategorySalesSerializer, TopProductSerializer, TopCustomerSerializer
+
+DEFAULT_RANGE_DAYS = 7
+MAX_LIMIT = 1000
+
+
+class RollupRangeMixin:
+    """
+    Reads the ?start=YYYY-MM-DD&end=YYYY-MM-DD range (inclusive, defaulting
+    to the last seven days) and ?limit= used by the analytics endpoints.
+    All of them read the rollup tables only, never the order tables.
+    """
+    permission_classes = [IsAdminUser]
+    pagination_class = None
+
+    def get_date_range(self):
+        end = self._date_param('end') or timezone.localdate()
+        start = self._date_param('start') or end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+        if start > end:
+            raise ValidationError({'start': "start must not be after end."})
+        return start, end
+
+    def get_limit(self, default=100):
+        try:
+            return max(1, min(int(self.request.query_params.get('limit', default)), MAX_LIMIT))
+        except ValueError:
+            raise ValidationError({'limit': "limit must be an integer."})
+
+    def _date_param(self, name):
+        value = self.request.query_params.get(name)
+        if value is None:
+            return None
+        parsed = parse_date(value)
+        if parsed is None:
+            raise ValidationError({name: "Use the YYYY-MM-DD format."})
+        return parsed
+
+
+class CategorySalesView(RollupRangeMixin, generics.ListAPIView):
+    """
+    Revenue, units and orders per category per day.
+    """
+    serializer_class = DailyCategorySalesSerializer
+
+    def get_queryset(self):
+        start, end = self.get_date_range()
+        return (
+            DailyCategorySales.objects.filter(day__range=(start, end))
+            .values('day', 'category_id', 'category__name', 'orders', 'units', 'revenue')
+            .order_by('day', '-revenue')
+        )
+
+
+class TopProductsView(RollupRangeMixin, generics.ListAPIView):
+    """
+    Best selling products by revenue over the date range.
+    """
+    serializer_class = TopProductSerializer
+
+    def get_queryset(self):
+        start, end = self.get_date_range()
+        return (
+            DailyProductSales.objects.filter(day__range=(start, end))
+            .values('product_id', 'product__name')
+            .annotate(orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue'))
+            .order_by('-revenue')[:self.get_limit()]
+        )
+
+
+class TopCustomersView(RollupRangeMixin, generics.ListAPIView):
+    """
+    Customers with the highest spend over the date range.
+    """
+    serializer_class = TopCustomerSerializer
+
+    def get_queryset(self):
+        start, end = self.get_date_range()
+        return (
+            DailyUserSales.objects.filter(day__range=(start, end))
+            .values('user_id', 'user__username')
+            .annotate(orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue'))
+            .order_by('-revenue')[:self.get_limit()]
+        )
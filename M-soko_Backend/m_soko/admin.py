@@ -0,0 +1,71 @@
+from django.contrib import admin
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
+
+from .models import RequestProfile
+from .profiling import ENGINES
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('path', 'method', 'status_code', 'duration_ms', 'query_count', 'query_ms', 'trigger', 'user', 'created_at')
+    list_filter = ('trigger', 'method', 'status_code')
+    list_select_related = ('user',)
+    search_fields = ('^path',)
+    fields = (
+        'method', 'path', 'status_code', 'duration_ms', 'query_count', 'query_ms', 'trigger', 'user', 'engine',
+        'created_at', 'download', 'summary_text', 'sql_timeline',
+    )
+    readonly_fields = fields
+
+    def get_queryset(self, request):
+        # The call profile and SQL can be large; the detail page loads what it shows on its own
+        return super().get_queryset(request).defer('summary', 'data', 'queries')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/download/', self.admin_site.admin_view(self.download_view),
+                name='m_soko_requestprofile_download',
+            ),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk):
+        if not self.has_view_permission(request):
+            return HttpResponse(status=403)
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        engine = ENGINES[profile.engine]
+        response = HttpResponse(bytes(profile.data), content_type=engine.content_type)
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile.pk}.{engine.extension}"'
+        return response
+
+    @admin.display(description='Download')
+    def download(self, obj):
+        engine = ENGINES[obj.engine]
+        url = reverse('admin:m_soko_requestprofile_download', args=[obj.pk])
+        return format_html('<a href="{}">profile-{}.{}</a>', url, obj.pk, engine.extension)
+
+    @admin.display(description='Call profile')
+    def summary_text(self, obj):
+        return format_html('<pre style="white-space: pre; overflow-x: auto;">{}</pre>', obj.summary)
+
+    @admin.display(description='SQL timeline')
+    def sql_timeline(self, obj):
+        rows = format_html_join(
+            '', '<tr><td>{}</td><td>{}</td><td>{}</td><td><code>{}</code></td></tr>',
+            ((query['start_ms'], query['duration_ms'], query['alias'], query['sql']) for query in obj.queries),
+        )
+        shown = len(obj.queries)
+        note = f' (first {shown} of {obj.query_count})' if shown < obj.query_count else ''
+        return format_html(
+            '<p>{} queries, {} ms{}</p><table><tr><th>Start (ms)</th><th>Took (ms)</th><th>DB</th><th>SQL</th></tr>{}</table>',
+            obj.query_count, obj.query_ms, note, rows,
+        )
@@ -0,0 +1,91 @@
+"""
+API routes. Kept apart from the admin so API-only workers (settings_api)
+can serve them without loading the admin or baton at all.
+
+The views are imported up front. Django only imports the URLconf on the
+first request, and the routers need the viewset classes, which live in the
+same modules as the other views, so deferring those imports wouldn't keep
+any app's views from loading.
+"""
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+
+# Import all of your views here
+from products.views import ProductViewSet, CategoryViewSet, ReviewViewSet
+# 👈 New: Import both of your new profile views
+from users.views import (
+    UserRegistrationView, 
+    UserProfileRetrieveView, 
+    UserProfileUpdateView, 
+    AddressViewSet, 
+    LogoutView, UserLoginView
+)
+from orders.views import (
+    CartViewSet, CartItemViewSet, CheckoutView, OrderHistoryView,
+    OrderTransitionView, OrderCancelView, OrderTimelineView, WishlistViewSet,
+)
+from .views import (
+    CartPageBootstrapView, ChangesFeedView, HomePageBootstrapView, LocalUploadView, ProductPageBootstrapView,
+    ThrottleMetricsView, UploadCompleteView, UploadNotificationView, UploadSignatureView,
+)
+
+# Create a single router for all your apps
+router = DefaultRouter()
+router.register(r'products', ProductViewSet, basename='product')
+router.register(r'categories', CategoryViewSet, basename='category')
+router.register(r'users/addresses', AddressViewSet, basename='user-address')
+router.register(r'orders/carts', CartViewSet, basename='cart')
+router.register(r'orders/cart-items', CartItemViewSet, basename='cart-item')
+router.register(r'orders/wishlist', WishlistViewSet, basename='wishlist')
+
+urlpatterns = [
+    # Main API endpoint for all router views
+    path('api/', include(router.urls)),
+
+    # User Authentication Endpoints
+    path('api/register/', UserRegistrationView.as_view(), name='register'),
+    path('api/login/', UserLoginView.as_view(), name='api-login'),
+    path('api/logout/', LogoutView.as_view(), name='api-logout'),
+    
+    # 👈 New: Separate URL for viewing the profile
+    path('api/profile/view/', UserProfileRetrieveView.as_view(), name='user-profile-view'),
+    
+    # 👈 New: Separate URL for editing the profile
+    path('api/profile/edit/', UserProfileUpdateView.as_view(), name='user-profile-edit'),
+    
+    path('api/checkout/', CheckoutView.as_view(), name='checkout'),
+    path('api/orders/history/', OrderHistoryView.as_view(), name='order-history'),
+    path('api/orders/transitions/', OrderTransitionView.as_view(), name='order-transitions'),
+    path('api/orders/<int:pk>/cancel/', OrderCancelView.as_view(), name='order-cancel'),
+    path('api/orders/<int:pk>/events/', OrderTimelineView.as_view(), name='order-events'),
+
+    path('api/metrics/throttles/', ThrottleMetricsView.as_view(), name='throttle-metrics'),
+
+    # One-round-trip page payloads for the SPA (see m_soko.bootstrap)
+    path('api/pages/home/', HomePageBootstrapView.as_view(), name='page-home'),
+    path('api/pages/products/<int:pk>/', ProductPageBootstrapView.as_view(), name='page-product'),
+    path('api/pages/cart/', CartPageBootstrapView.as_view(), name='page-cart'),
+
+    # Cursor-based change feed for downstream consumers (see m_soko.outbox)
+    path('api/changes/', ChangesFeedView.as_view(), name='changes-feed'),
+
+    # Signed direct image uploads (see m_soko.uploads)
+    path('api/uploads/signatures/', UploadSignatureView.as_view(), name='upload-signature'),
+    path('api/uploads/complete/', UploadCompleteView.as_view(), name='upload-complete'),
+    path('api/uploads/notifications/', UploadNotificationView.as_view(), name='upload-notification'),
+    path('api/uploads/local/', LocalUploadView.as_view(), name='upload-local'),
+
+    # Sales reports served from the rollup tables
+    path('api/analytics/', include('analytics.urls')),
+    
+    # Nested URLs for Product Reviews
+    path('api/products/<int:product_pk>/reviews/', 
+          ReviewViewSet.as_view({'get': 'list', 'post': 'create'}), 
+          name='product-reviews-list'),
+    path('api/products/<int:product_pk>/reviews/mine/', 
+          ReviewViewSet.as_view({'get': 'mine'}), 
+          name='product-reviews-mine'),
+    path('api/products/<int:product_pk>/reviews/<int:pk>/', 
+          ReviewViewSet.as_view({'get': 'retrieve'}), 
+          name='product-reviews-detail'),
+]
@@ -0,0 +1,24 @@
+from rest_framework import authentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from .memo import request_memo
+
+
+class TokenAuthentication(authentication.TokenAuthentication):
+    """
+    DRF's token authentication, looked up once per request. The profiling
+    middleware checks the token before the view runs, and the view reuses
+    that lookup, failures included, instead of querying again.
+    """
+
+    def authenticate(self, request):
+        memo = request_memo(request)
+        if 'token_auth' not in memo:
+            try:
+                memo['token_auth'] = super().authenticate(request)
+            except AuthenticationFailed as e:
+                memo['token_auth'] = e
+        result = memo['token_auth']
+        if isinstance(result, AuthenticationFailed):
+            raise result
+        return result
@@ -0,0 +1,125 @@
+"""
+Page bootstrap: one response carrying everything a storefront page needs.
+
+Each section of a page is produced by the same API view the SPA would
+otherwise call on its own, run in-process as a GET sub-request with the
+caller's user, so a section's payload is exactly what that endpoint returns.
+Sections are independent, so they run concurrently on a small thread pool
+(each worker thread uses its own database connection).
+
+Sections backed by conditional views are cached: the cached payload is
+stored with the ETag the view returned, and the next fetch sends that ETag
+as If-None-Match. A 304 means only the view's cheap validators ran and the
+cached payload is reused without serializing anything.
+"""
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections
+from django.http import HttpRequest, QueryDict
+from django.urls import resolve
+
+SECTION_CACHE_TIMEOUT = 300
+
+
+class Section:
+    """
+    A sub-request to include in a page: ``path`` and ``query`` of the API
+    endpoint, and ``headers`` to copy from its response into the payload.
+    ``shared`` sections are the same for every user and are cached once.
+    """
+
+    def __init__(self, path, query='', headers=None, shared=True):
+        self.path = path
+        self.query = query
+        self.headers = headers or {}
+        self.shared = shared
+
+
+class SectionResult:
+    def __init__(self, status_code, data, headers=None):
+        self.status_code = status_code
+        self.data = data
+        self.headers = headers or {}
+
+
+def _header_value(value):
+    # Count and id headers become numbers in the payload; an empty header becomes null
+    if value == '':
+        return None
+    return int(value) if value.isdigit() else value
+
+
+def _subrequest(request, section):
+    sub = HttpRequest()
+    sub.method = 'GET'
+    sub.path = sub.path_info = section.path
+    sub.GET = QueryDict(section.query)
+    sub.META = {
+        key: value for key, value in request.META.items()
+        if key not in ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE', 'HTTP_ACCEPT')
+    }
+    sub.META.update({
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': section.path, 'QUERY_STRING': section.query,
+        'HTTP_ACCEPT': 'application/json',
+    })
+    # The caller is already authenticated; DRF's forced authentication skips doing it again
+    if request.user.is_authenticated:
+        sub._force_auth_user = request.user
+        sub._force_auth_token = request.auth
+    return sub
+
+
+def _cache_key(request, section):
+    owner = 'shared' if section.shared else request.user.pk
+    raw = f'{section.path}?{section.query}:{owner}'
+    return 'bootstrap:section:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def fetch_section(request, section):
+    """
+    Runs one section's view and returns a SectionResult.
+    """
+    key = _cache_key(request, section)
+    cached = cache.get(key)
+    sub = _subrequest(request, section)
+    if cached is not None:
+        sub.META['HTTP_IF_NONE_MATCH'] = cached['etag']
+
+    match = resolve(section.path)
+    response = match.func(sub, *match.args, **match.kwargs)
+    if response.status_code == 304 and cached is not None:
+        return SectionResult(200, cached['data'], cached['headers'])
+
+    headers = {
+        name: _header_value(response[header])
+        for name, header in section.headers.items() if response.has_header(header)
+    }
+    data = getattr(response, 'data', None)
+    if response.status_code == 200 and response.has_header('ETag'):
+        cache.set(key, {'etag': response['ETag'], 'data': data, 'headers': headers}, SECTION_CACHE_TIMEOUT)
+    return SectionResult(response.status_code, data, headers)
+
+
+def _fetch_in_thread(request, section):
+    try:
+        return fetch_section(request, section)
+    finally:
+        # Worker threads open their own connections; don't leave them behind
+        connections.close_all()
+
+
+def fetch_sections(request, sections):
+    """
+    Fetches {name: Section} concurrently and returns {name: SectionResult}.
+    Runs serially when BOOTSTRAP_WORKERS is below 2, or inside a transaction,
+    whose uncommitted rows other connections couldn't see.
+    """
+    workers = min(settings.BOOTSTRAP_WORKERS, len(sections))
+    if workers < 2 or connection.in_atomic_block:
+        return {name: fetch_section(request, section) for name, section in sections.items()}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {name: executor.submit(_fetch_in_thread, request, section) for name, section in sections.items()}
+        return {name: future.result() for name, future in futures.items()}
@@ -0,0 +1,85 @@
+"""
+Helpers for running bulk writes in fixed-size batches.
+
+Large admin selections (or "select all" across a changelist) are walked
+by primary key so that each UPDATE only touches one batch of rows and
+holds its locks for a short transaction.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CLAIM_LEASE = timedelta(minutes=15)
+
+
+def iter_pk_chunks(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields lists of primary keys from the queryset, in ascending order.
+    Uses keyset pagination (pk > last seen) instead of OFFSET so every
+    batch is an index range scan.
+    """
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    last_pk = None
+    while True:
+        page = pks if last_pk is None else pks.filter(pk__gt=last_pk)
+        batch = list(page[:chunk_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1]
+
+
+def chunked_update(queryset, values, chunk_size=DEFAULT_CHUNK_SIZE, progress=None, on_batch=None):
+    """
+    Applies ``queryset.update(**values)`` one batch of primary keys at a time.
+
+    The original filters of the queryset are kept on every batch, so the
+    update stays conditional (rows that changed since the selection was
+    made are skipped). ``on_batch(pks)`` runs inside each batch's transaction
+    and ``progress`` is called as ``progress(updated, batches)`` after it.
+    Returns a ``(updated, batches)`` tuple.
+    """
+    updated = 0
+    batches = 0
+    for pks in iter_pk_chunks(queryset, chunk_size):
+        with transaction.atomic():
+            updated += queryset.filter(pk__in=pks).update(**values)
+            if on_batch is not None:
+                on_batch(pks)
+        batches += 1
+        logger.info(
+            "Bulk update of %s: batch %d done, %d rows updated so far",
+            queryset.model._meta.label, batches, updated,
+        )
+        if progress is not None:
+            progress(updated, batches)
+    return updated, batches
+
+
+def claim_batch(queryset, chunk_size=DEFAULT_CHUNK_SIZE, lease=DEFAULT_CLAIM_LEASE, field='processed_at'):
+    """
+    Claims up to ``chunk_size`` rows of a work queue and returns them,
+    lowest pk first. The claim is a timestamp written to ``field`` in a
+    short transaction of its own, so the work on the rows (sending mail,
+    say) runs with no transaction open while other workers skip them. A
+    claim older than ``lease`` is taken to belong to a worker that died,
+    and its rows can be claimed again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            queryset.select_for_update(skip_locked=True, of=('self',))
+            .filter(Q(**{f'{field}__isnull': True}) | Q(**{f'{field}__lt': now - lease}))
+            .order_by('pk')[:chunk_size]
+        )
+        if rows:
+            queryset.model.objects.filter(pk__in=[row.pk for row in rows]).update(**{field: now})
+            for row in rows:
+                setattr(row, field, now)
+    return rows
@@ -0,0 +1,93 @@
+"""
+Conditional GET support for DRF list/retrieve views.
+
+Views derive cheap validators (usually MAX(updated_at) and a row count over
+the filtered queryset, or version counters kept in the cache for tables
+without timestamps) before anything is serialized. If the client's
+If-None-Match / If-Modified-Since still matches, a 304 is returned and the
+serializer never runs. Every response also gets ETag, Last-Modified and a
+Cache-Control policy: shared-cacheable for catalog data, private for
+per-user data.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+COLLECTION_VERSION_KEY = 'collection-version:{name}'
+
+
+def collection_version(name):
+    return cache.get_or_set(COLLECTION_VERSION_KEY.format(name=name), 1, None)
+
+
+def bump_collection_version(name):
+    """
+    Invalidates every ETag built from the named collection's version.
+    """
+    key = COLLECTION_VERSION_KEY.format(name=name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+
+
+class ConditionalGetMixin:
+    """
+    Adds validators and caching headers to list() and retrieve().
+
+    ``cache_scope`` is 'public' (CDN/shared caches may store the response)
+    or 'private' (per-user data, only the browser may keep it and must
+    revalidate). Override get_validators() when MAX(updated_at) over the
+    filtered queryset doesn't capture everything the payload depends on.
+    """
+    cache_scope = 'public'
+    cache_max_age = 60
+    last_modified_field = 'updated_at'
+
+    def get_validators(self, detail):
+        """
+        Returns (parts, last_modified): parts is anything hashable that changes
+        whenever the payload would, last_modified a datetime or None.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        if detail:
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        stats = queryset.order_by().aggregate(last=Max(self.last_modified_field), count=Count('pk'))
+        return (stats['count'], stats['last']), stats['last']
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(request, False, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(request, True, super().retrieve, *args, **kwargs)
+
+    def _conditional(self, request, detail, handler, *args, **kwargs):
+        parts, last_modified = self.get_validators(detail)
+        key = [parts, request.get_full_path(), request.accepted_renderer.format]
+        if self.cache_scope == 'private':
+            key.append(request.user.pk)
+        etag = 'W/"%s"' % hashlib.md5(repr(key).encode()).hexdigest()
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if not 200 <= response.status_code < 400:
+            return response
+
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        if self.cache_scope == 'private':
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ['Authorization', 'Cookie'])
+        else:
+            patch_cache_control(
+                response, public=True, max_age=self.cache_max_age, s_maxage=self.cache_max_age * 5,
+            )
+        patch_vary_headers(response, ['Accept'])
+        return response
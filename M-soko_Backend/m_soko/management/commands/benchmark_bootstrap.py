@@ -0,0 +1,78 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares loading each storefront page through its sequential API calls "
+        "(the SPA's current waterfall) with a single bootstrap request, adding a "
+        "simulated network round trip per request. Uses the current database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help="Authenticate as this user (adds the cart sections).")
+        parser.add_argument('--product', type=int, help="Product for the detail page; defaults to the first one.")
+        parser.add_argument('--rtt-ms', type=float, default=150.0, help="Simulated round-trip time per request.")
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        host = next((h for h in settings.ALLOWED_HOSTS if h and '*' not in h and not h.startswith('.')), 'localhost')
+        headers = {'HTTP_HOST': host}
+        if options['username']:
+            user = get_user_model().objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(f"No user named {options['username']!r}.")
+            token, _ = Token.objects.get_or_create(user=user)
+            headers['HTTP_AUTHORIZATION'] = f'Token {token.key}'
+        client = Client(**headers)
+        signed_in = 'HTTP_AUTHORIZATION' in headers
+
+        product_id = options['product'] or Product.objects.order_by('pk').values_list('pk', flat=True).first()
+        if product_id is None:
+            raise CommandError("There are no products to load the detail page for.")
+
+        cart = ['/api/orders/carts/'] if signed_in else []
+        pages = [
+            ('home', ['/api/products/', '/api/categories/'] + cart, '/api/pages/home/'),
+            ('product', [
+                f'/api/products/{product_id}/', f'/api/products/{product_id}/reviews/',
+                f'/api/products/{product_id}/related/',
+            ] + cart, f'/api/pages/products/{product_id}/'),
+        ]
+        if signed_in:
+            pages.append(('cart', ['/api/orders/carts/', '/api/orders/cart-items/', '/api/users/addresses/'],
+                          '/api/pages/cart/'))
+
+        rtt = options['rtt_ms'] / 1000
+        repeat = options['repeat']
+        self.stdout.write(f"{'page':10} {'requests':>8} {'waterfall ms':>13} {'bootstrap ms':>13} {'saved':>7}")
+        for name, waterfall, bootstrap in pages:
+            # Warm the caches so both sides are measured in steady state
+            for path in waterfall + [bootstrap]:
+                client.get(path)
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for path in waterfall:
+                    client.get(path)
+            waterfall_s = (time.perf_counter() - start) / repeat + rtt * len(waterfall)
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                response = client.get(bootstrap)
+            bootstrap_s = (time.perf_counter() - start) / repeat + rtt
+            if response.status_code != 200:
+                self.stdout.write(f"{name:10} skipped (HTTP {response.status_code})")
+                continue
+
+            self.stdout.write(
+                f"{name:10} {len(waterfall):>8} {waterfall_s * 1000:>13,.1f} {bootstrap_s * 1000:>13,.1f} "
+                f"{(1 - bootstrap_s / waterfall_s) * 100:>6.0f}%"
+            )
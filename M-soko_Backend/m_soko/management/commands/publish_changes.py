@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from m_soko.outbox import get_sink, prune, relay
+
+
+class Command(BaseCommand):
+    help = (
+        "Relays unpublished change events to the configured sinks in batches, "
+        "then prunes published events past the retention window and unpublished "
+        "ones past the hard limit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sink', action='append', dest='sinks',
+                            help="Sink spec (file:<path>, http(s)://..., memory:). Repeatable; "
+                                 "defaults to OUTBOX_SINKS.")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--no-prune', action='store_true')
+
+    def handle(self, *args, **options):
+        try:
+            sinks = [get_sink(spec) for spec in options['sinks'] or settings.OUTBOX_SINKS]
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        published = relay(
+            sinks, options['batch_size'], progress=lambda n: self.stdout.write(f"Published {n} events..."),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Published {published} events to {len(sinks)} sinks."))
+
+        if not options['no_prune']:
+            pruned = prune(settings.OUTBOX_RETENTION_DAYS, settings.OUTBOX_MAX_RETENTION_DAYS)
+            self.stdout.write(
+                f"Pruned {pruned} events older than {settings.OUTBOX_RETENTION_DAYS} days (published) "
+                f"or {settings.OUTBOX_MAX_RETENTION_DAYS} days (unpublished)."
+            )
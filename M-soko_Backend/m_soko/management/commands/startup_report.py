@@ -0,0 +1,104 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter, so the numbers match a worker's cold start
+STARTUP_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+seconds = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == 'darwin':
+    rss //= 1024
+print(json.dumps({'seconds': seconds, 'max_rss_kb': rss}))
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Returns {module: cumulative_us} for the top-level imports reported by -X importtime.
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        try:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            cumulative = int(cumulative)
+        except ValueError:
+            continue  # the header line
+        if not name.startswith('  '):
+            modules[name.strip()] = cumulative
+    return modules
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures cold-start time (settings, app loading and URLconf import) and "
+        "peak RSS for a settings profile in a fresh interpreter, lists the slowest "
+        "imports, and optionally records the result to a JSON-lines history file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--settings-module', default='m_soko.settings_api')
+        parser.add_argument('--runs', type=int, default=3)
+        parser.add_argument('--top', type=int, default=15)
+        parser.add_argument('--history', help="Append the result to this JSON-lines file and compare with the last run.")
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=options['settings_module'])
+        results = []
+        imports = {}
+        for _ in range(max(1, options['runs'])):
+            proc = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT],
+                env=env, capture_output=True, text=True, cwd=os.getcwd(),
+            )
+            if proc.returncode != 0:
+                raise CommandError(f"Startup failed:\n{proc.stderr[-2000:]}")
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+            imports = parse_importtime(proc.stderr)
+
+        report = {
+            'at': datetime.now(timezone.utc).isoformat(),
+            'settings': options['settings_module'],
+            'seconds': statistics.median(r['seconds'] for r in results),
+            'max_rss_kb': statistics.median(r['max_rss_kb'] for r in results),
+        }
+
+        self.stdout.write(f"Profile {report['settings']}: startup {report['seconds'] * 1000:,.0f} ms, "
+                          f"peak RSS {report['max_rss_kb'] / 1024:,.1f} MB (median of {len(results)} runs)")
+        self.stdout.write("Slowest top-level imports:")
+        for name, cumulative in sorted(imports.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+        if options['history']:
+            previous = self._last_entry(options['history'], report['settings'])
+            with open(options['history'], 'a') as history:
+                history.write(json.dumps(report) + '\n')
+            if previous:
+                self.stdout.write(
+                    f"Change since {previous['at']}: "
+                    f"{(report['seconds'] - previous['seconds']) * 1000:+,.0f} ms, "
+                    f"{(report['max_rss_kb'] - previous['max_rss_kb']) / 1024:+,.1f} MB RSS"
+                )
+
+    def _last_entry(self, path, settings_module):
+        if not os.path.exists(path):
+            return None
+        last = None
+        with open(path) as history:
+            for line in history:
+                entry = json.loads(line)
+                if entry.get('settings') == settings_module:
+                    last = entry
+        return last
@@ -0,0 +1,36 @@
+"""
+Request-scoped memoization.
+
+Lookups that several layers of one request repeat (the view, its
+validators, the serializer) are stored in a dict that lives on the
+underlying HttpRequest, so the DRF Request, the serializer context and any
+helper handed either of them all share it. Code that writes the looked-up
+rows forgets the affected keys, so later readers in the same request see
+the new state.
+"""
+
+
+def request_memo(request):
+    request = getattr(request, '_request', request)
+    try:
+        return request._memo
+    except AttributeError:
+        request._memo = {}
+        return request._memo
+
+
+def memoized(request, key, load):
+    """
+    Returns the memoized value for ``key``, calling ``load()`` the first time.
+    None is memoized too.
+    """
+    memo = request_memo(request)
+    if key not in memo:
+        memo[key] = load()
+    return memo[key]
+
+
+def forget(request, *keys):
+    memo = request_memo(request)
+    for key in keys:
+        memo.pop(key, None)
@@ -0,0 +1,101 @@
+"""
+Response compression with Brotli/gzip negotiation.
+
+Brotli support is optional: when the ``brotli`` package isn't installed,
+or the client doesn't accept it, this behaves like Django's GZipMiddleware
+with a configurable size threshold (COMPRESSION_MIN_SIZE).
+
+Brotli is only used for the API's JSON and MessagePack bodies. The API
+authenticates with tokens sent by the client, never with cookies, so a
+cross-site page can't get a secret into those responses next to text it
+controls, which is what BREACH needs. Everything else, the admin's
+CSRF-bearing HTML included, goes through GZipMiddleware and gets its
+random-length padding.
+"""
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+DEFAULT_MIN_SIZE = 860
+BROTLI_QUALITY = 5
+BROTLI_CONTENT_TYPES = ('application/json', 'application/msgpack')
+
+
+def accepted_encodings(header):
+    """
+    Parses an Accept-Encoding header into the set of codings with a non-zero q.
+    """
+    codings = set()
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            codings.add(coding)
+    return codings
+
+
+def brotli_sequence(sequence):
+    """
+    Compresses an iterator of byte chunks, flushing after every chunk so
+    streamed responses keep streaming.
+    """
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    for chunk in sequence:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compresses responses with Brotli when the client accepts it, gzip otherwise.
+    Small bodies are left alone; the encoding overhead isn't worth it there.
+    """
+
+    def process_response(self, request, response):
+        min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', DEFAULT_MIN_SIZE)
+        if not response.streaming and len(response.content) < min_size:
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+
+        codings = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        content_type = response.get('Content-Type', '').partition(';')[0].strip().lower()
+        if (
+            brotli is None or 'br' not in codings or content_type not in BROTLI_CONTENT_TYPES
+            or (response.streaming and response.is_async)
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if response.streaming:
+            response.streaming_content = brotli_sequence(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            compressed = brotli.compress(response.content, quality=BROTLI_QUALITY)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(response.content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
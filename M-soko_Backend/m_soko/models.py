@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.db import models
+
+
+class ChangeEvent(models.Model):
+    """
+    Outbox row for a change to a catalog or order record, written in the
+    same transaction as the change itself (see m_soko.outbox). The id is the
+    cursor of the /api/changes/ feed.
+    """
+    ACTION_CHOICES = [
+        ('upsert', 'Created or updated'),
+        ('delete', 'Deleted'),
+    ]
+
+    topic = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, default='upsert')
+    payload = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(blank=True, null=True)
+    # Set by a relay while it publishes the event outside a transaction (see m_soko.bulk.claim_batch)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # Feed reads filtered to a few topics
+            models.Index(fields=['topic', 'id'], name='changeevent_topic_idx'),
+            # The relay only scans what it hasn't published yet
+            models.Index(fields=['id'], name='changeevent_unpublished_idx', condition=models.Q(published_at__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.action} {self.topic}:{self.object_id}"
+
+
+class RequestProfile(models.Model):
+    """
+    A captured profile of one request (see m_soko.profiling). Only the most
+    recent PROFILING_KEEP are kept.
+    """
+    TRIGGER_CHOICES = [
+        ('staff', 'Requested by staff'),
+        ('sampled', 'Sampled'),
+    ]
+    ENGINE_CHOICES = [
+        ('cprofile', 'cProfile'),
+        ('pyinstrument', 'pyinstrument'),
+    ]
+
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField(default=0)
+    query_ms = models.FloatField(default=0)
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True)
+    engine = models.CharField(max_length=20, choices=ENGINE_CHOICES)
+    # Top of the call profile as text, for reading in the admin
+    summary = models.TextField(blank=True)
+    # pstats (cProfile) or speedscope JSON (pyinstrument), for downloading
+    data = models.BinaryField()
+    # SQL timeline: [{'alias', 'sql', 'start_ms', 'duration_ms', 'many'}]
+    queries = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
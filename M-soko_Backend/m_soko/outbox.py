@@ -0,0 +1,215 @@
+"""
+Transactional outbox for catalog and order changes.
+
+Changes to products, categories, reviews, orders and payments write a
+ChangeEvent row on the same database connection, so the event commits or
+rolls back together with the change. Model saves and deletes are covered by
+signal receivers in each app; bulk UPDATEs, which skip signals, call
+record_changes() next to the statement.
+
+Consumers either read the cursor-based /api/changes/ feed or receive the
+events from the relay command (publish_changes), which pushes unpublished
+events to one or more sinks in batches and marks them published. Each batch
+is claimed first and published with no transaction open; a sink that fails
+releases the claim so the events are retried on the next run: delivery is
+at-least-once, and consumers dedupe on the event id. Events that stay
+unpublished past OUTBOX_MAX_RETENTION_DAYS, because no relay runs, are
+pruned with a warning so the table can't grow without bound.
+
+In-process caches that derive from these rows subscribe() to a topic and
+are called with the changed ids once the recording transaction commits.
+"""
+import json
+import logging
+import os
+import urllib.request
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .bulk import claim_batch, iter_pk_chunks
+from .models import ChangeEvent
+
+TOPICS = ('product', 'category', 'review', 'order', 'payment')
+
+logger = logging.getLogger(__name__)
+
+_subscribers = {}
+
+
+def subscribe(topic, callback):
+    """
+    Calls ``callback(object_ids)`` after each transaction that records
+    changes to ``topic`` commits.
+    """
+    _subscribers.setdefault(topic, []).append(callback)
+
+
+def _notify(topic, object_ids):
+    callbacks = _subscribers.get(topic)
+    if callbacks and object_ids:
+        object_ids = set(object_ids)
+        transaction.on_commit(lambda: [callback(object_ids) for callback in callbacks])
+
+
+def record_change(topic, object_id, action='upsert', payload=None):
+    ChangeEvent.objects.create(topic=topic, object_id=object_id, action=action, payload=payload or {})
+    _notify(topic, [object_id])
+
+
+def record_changes(topic, object_ids, action='upsert', payload=None):
+    """
+    Records the same change for many objects with one bulk INSERT.
+    """
+    object_ids = list(object_ids)
+    ChangeEvent.objects.bulk_create(
+        [ChangeEvent(topic=topic, object_id=pk, action=action, payload=payload or {}) for pk in object_ids],
+        batch_size=1000,
+    )
+    _notify(topic, object_ids)
+
+
+def track_model(model, topic):
+    """
+    Records an event for every save and delete of ``model`` instances.
+    Called from the apps' signals modules.
+    """
+    def saved(sender, instance, **kwargs):
+        record_change(topic, instance.pk)
+
+    def deleted(sender, instance, **kwargs):
+        record_change(topic, instance.pk, 'delete')
+
+    post_save.connect(saved, sender=model, weak=False, dispatch_uid=f'outbox-{topic}-saved')
+    post_delete.connect(deleted, sender=model, weak=False, dispatch_uid=f'outbox-{topic}-deleted')
+
+
+def event_data(event):
+    return {
+        'id': event.pk,
+        'topic': event.topic,
+        'object_id': event.object_id,
+        'action': event.action,
+        'payload': event.payload,
+        'created_at': event.created_at,
+    }
+
+
+class MemorySink:
+    """
+    Keeps published events in a list; for tests and local development.
+    """
+
+    def __init__(self):
+        self.events = []
+
+    def publish(self, events):
+        self.events.extend(events)
+
+
+class NdjsonFileSink:
+    """
+    Appends one JSON document per event to a file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def publish(self, events):
+        lines = ''.join(json.dumps(event, cls=DjangoJSONEncoder) + '\n' for event in events)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class HttpSink:
+    """
+    POSTs each batch as an NDJSON body; any non-2xx response fails the batch.
+    """
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def publish(self, events):
+        body = ''.join(json.dumps(event, cls=DjangoJSONEncoder) + '\n' for event in events).encode()
+        request = urllib.request.Request(
+            self.url, data=body, method='POST', headers={'Content-Type': 'application/x-ndjson'},
+        )
+        # urlopen raises HTTPError for 4xx/5xx responses
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+# Shared by every "memory:" sink in the process, so tests can inspect what was published
+memory_sink = MemorySink()
+
+
+def get_sink(spec):
+    """
+    Builds a sink from a spec: ``file:<path>``, ``http(s)://...`` or ``memory:``.
+    """
+    scheme = urlsplit(spec).scheme
+    if scheme == 'file':
+        return NdjsonFileSink(spec[len('file:'):].removeprefix('//'))
+    if scheme in ('http', 'https'):
+        return HttpSink(spec)
+    if scheme == 'memory':
+        return memory_sink
+    raise ValueError(f"Unknown outbox sink {spec!r}.")
+
+
+def relay(sinks, batch_size=500, progress=None):
+    """
+    Publishes unpublished events to every sink, oldest first, one claimed
+    batch at a time. Returns the number of events published.
+    """
+    published = 0
+    while True:
+        # The claim lets a second relay take other batches, and no row lock is held while sinks run
+        events = claim_batch(ChangeEvent.objects.filter(published_at__isnull=True), batch_size, field='claimed_at')
+        if not events:
+            break
+        pks = [event.pk for event in events]
+        claimed = ChangeEvent.objects.filter(pk__in=pks, claimed_at=events[0].claimed_at, published_at__isnull=True)
+        data = [event_data(event) for event in events]
+        try:
+            for sink in sinks:
+                sink.publish(data)
+        except Exception:
+            claimed.update(claimed_at=None)
+            raise
+        # A relay whose lease ran out may have been overtaken; it only marks what it still holds
+        published += claimed.update(published_at=timezone.now())
+        if progress is not None:
+            progress(published)
+    return published
+
+
+def prune(days, max_days=None, chunk_size=5000):
+    """
+    Deletes published events older than ``days`` and, with ``max_days``,
+    unpublished ones older than that. Returns the number deleted.
+    """
+    now = timezone.now()
+    old = ChangeEvent.objects.filter(published_at__isnull=False, created_at__lt=now - timedelta(days=days))
+    deleted = 0
+    for pks in iter_pk_chunks(old, chunk_size):
+        deleted += ChangeEvent.objects.filter(pk__in=pks).delete()[0]
+    if max_days is not None:
+        stale = ChangeEvent.objects.filter(published_at__isnull=True, created_at__lt=now - timedelta(days=max_days))
+        dropped = 0
+        for pks in iter_pk_chunks(stale, chunk_size):
+            dropped += ChangeEvent.objects.filter(pk__in=pks).delete()[0]
+        if dropped:
+            logger.warning(
+                "Pruned %d change events never published after %d days; is the publish_changes relay running?",
+                dropped, max_days,
+            )
+        deleted += dropped
+    return deleted
@@ -0,0 +1,226 @@
+"""
+On-demand request profiling.
+
+ProfilingMiddleware profiles a request when a staff user asks for it, with
+an ``X-Profile`` header or a ``_profile`` query parameter, or when the
+request is picked by sampling (PROFILING_SAMPLE_RATE, optionally limited to
+PROFILING_SAMPLE_PATHS). It records a call profile and a timeline of the SQL
+run on every database connection, and stores them as a RequestProfile; only
+the last PROFILING_KEEP are kept. The admin lists them and serves the raw
+profile for download: a pstats file for cProfile, or a speedscope JSON file
+when pyinstrument is installed and PROFILING_ENGINE is 'pyinstrument'. The
+id of the stored profile comes back in the ``X-Profile-Id`` response header.
+
+Requests that aren't profiled only pay for a header lookup and, when
+sampling is on, a random number. PROFILING_ENABLED is off by default, and
+then the middleware removes itself at startup.
+"""
+import cProfile
+import io
+import marshal
+import pstats
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connections
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import TokenAuthentication
+
+try:
+    import pyinstrument
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:  # pragma: no cover - optional dependency
+    pyinstrument = None
+
+SUMMARY_LINES = 60
+SQL_LENGTH = 2000
+
+
+class QueryTimeline:
+    """
+    A database execute wrapper that records when each query started and how
+    long it took, relative to the start of the request.
+    """
+
+    def __init__(self, started, limit):
+        self.started = started
+        self.limit = limit
+        self.entries = []
+        self.count = 0
+        self.total_ms = 0.0
+
+    def wrapper(self, alias):
+        def record(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                duration_ms = (time.perf_counter() - start) * 1000
+                self.count += 1
+                self.total_ms += duration_ms
+                # Statements only; parameters can hold personal data
+                if len(self.entries) < self.limit:
+                    self.entries.append({
+                        'alias': alias,
+                        'sql': sql[:SQL_LENGTH],
+                        'start_ms': round((start - self.started) * 1000, 3),
+                        'duration_ms': round(duration_ms, 3),
+                        'many': many,
+                    })
+        return record
+
+
+class CProfileEngine:
+    name = 'cprofile'
+    extension = 'pstats'
+    content_type = 'application/octet-stream'
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+
+    def summary(self):
+        stream = io.StringIO()
+        pstats.Stats(self.profiler, stream=stream).sort_stats('cumulative').print_stats(SUMMARY_LINES)
+        return stream.getvalue()
+
+    def data(self):
+        # The same bytes pstats.Stats.dump_stats() writes
+        self.profiler.create_stats()
+        return marshal.dumps(self.profiler.stats)
+
+
+class PyinstrumentEngine:
+    name = 'pyinstrument'
+    extension = 'speedscope.json'
+    content_type = 'application/json'
+
+    def __init__(self):
+        self.profiler = pyinstrument.Profiler(interval=settings.PROFILING_INTERVAL)
+
+    def start(self):
+        self.profiler.start()
+
+    def stop(self):
+        self.profiler.stop()
+
+    def summary(self):
+        return self.profiler.output_text(unicode=True, color=False)
+
+    def data(self):
+        return self.profiler.output(renderer=SpeedscopeRenderer()).encode()
+
+
+ENGINES = {engine.name: engine for engine in (CProfileEngine, PyinstrumentEngine)}
+
+
+def get_engine():
+    if settings.PROFILING_ENGINE == 'pyinstrument' and pyinstrument is not None:
+        return PyinstrumentEngine()
+    return CProfileEngine()
+
+
+def _staff_user(request):
+    """
+    The staff user behind a request, from the session or the API token, or None.
+    The token lookup is memoized, so the view doesn't repeat it, and requests
+    without credentials never query at all.
+    """
+    user = getattr(request, 'user', None)
+    if (user is None or not user.is_authenticated) and 'HTTP_AUTHORIZATION' in request.META:
+        try:
+            authenticated = TokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return None
+        user = authenticated[0] if authenticated else None
+    return user if user is not None and user.is_staff else None
+
+
+def _profile_requested(request):
+    value = request.META.get('HTTP_X_PROFILE')
+    if value is None and '_profile' in request.META.get('QUERY_STRING', ''):
+        value = request.GET.get('_profile')
+    return value is not None and value.lower() not in ('0', 'false', 'no')
+
+
+def _sampled(request):
+    rate = settings.PROFILING_SAMPLE_RATE
+    if not rate or random.random() >= rate:
+        return False
+    paths = settings.PROFILING_SAMPLE_PATHS
+    return not paths or request.path.startswith(tuple(paths))
+
+
+def save_profile(request, response, engine, timeline, duration_ms, trigger, user):
+    from .models import RequestProfile
+
+    profile = RequestProfile.objects.create(
+        method=request.method,
+        path=request.get_full_path()[:255],
+        status_code=response.status_code,
+        duration_ms=round(duration_ms, 3),
+        query_count=timeline.count,
+        query_ms=round(timeline.total_ms, 3),
+        trigger=trigger,
+        user=user if user is not None and user.is_authenticated else None,
+        engine=engine.name,
+        summary=engine.summary(),
+        data=engine.data(),
+        queries=timeline.entries,
+    )
+    cutoff = RequestProfile.objects.order_by('-id').values_list('id', flat=True)[settings.PROFILING_KEEP:][:1]
+    if cutoff:
+        RequestProfile.objects.filter(id__lte=cutoff[0]).delete()
+    return profile
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        user = _staff_user(request) if _profile_requested(request) else None
+        if user is not None:
+            trigger = 'staff'
+        elif _sampled(request):
+            trigger = 'sampled'
+        else:
+            return self.get_response(request)
+
+        engine = get_engine()
+        started = time.perf_counter()
+        timeline = QueryTimeline(started, settings.PROFILING_MAX_QUERIES)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timeline.wrapper(connection.alias)))
+            try:
+                engine.start()
+            except ValueError:
+                # Another profiler is already running in this thread
+                return self.get_response(request)
+            try:
+                response = self.get_response(request)
+            finally:
+                engine.stop()
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        user = user or getattr(request, 'user', None)
+        try:
+            profile = save_profile(request, response, engine, timeline, duration_ms, trigger, user)
+        except DatabaseError:
+            # Losing a profile must never fail the request it was taken from
+            return response
+        if trigger == 'staff':
+            response.headers['X-Profile-Id'] = str(profile.pk)
+        return response
@@ -1,13 +1,15 @@
 from pathlib import Path
+from importlib.util import find_spec
 import os
 from dotenv import load_dotenv
-import cloudinary
-
-load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# Load .env from the project directory directly instead of letting dotenv
+# search up the tree from the caller's frame on every startup
+load_dotenv(os.path.join(BASE_DIR, '.env'))
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -39,17 +41,23 @@ INSTALLED_APPS = [
     'products',
     'users',
     'orders',
+    'analytics',
     'django_filters',
+    'm_soko',
     'baton.autodiscover',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Brotli/gzip; sits above everything else that reads or writes the body
+    'm_soko.middleware.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Staff-requested and sampled profiles; needs request.user from the line above
+    'm_soko.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -64,13 +72,111 @@ AUTH_USER_MODEL = 'users.CustomUser'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication', # 👈 Use TokenAuthentication by default
+        'm_soko.authentication.TokenAuthentication', # 👈 Use TokenAuthentication by default
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'TEST_REQUEST_DEFAULT_FORMAT': 'json',
+    # Rates for the throttles in m_soko.throttling; views opt in per scope
+    'DEFAULT_THROTTLE_RATES': {
+        'login': os.environ.get('THROTTLE_LOGIN_RATE', '20/min'),
+        'login_username': os.environ.get('THROTTLE_LOGIN_USERNAME_RATE', '5/min'),
+        'register': os.environ.get('THROTTLE_REGISTER_RATE', '10/hour'),
+    },
 }
 
+# MessagePack is an optional, more compact alternative to JSON for the SPA
+if find_spec('msgpack') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('m_soko.renderers.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append('m_soko.renderers.MessagePackParser')
+
+# Responses smaller than this (in bytes) are sent uncompressed
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 860))
+
+# Retention (see orders.retention and the apply_retention command)
+# Converted carts are kept this long after checkout, abandoned ones this long after their last change
+CART_RETENTION_DAYS = int(os.environ.get('CART_RETENTION_DAYS', 30))
+ABANDONED_CART_RETENTION_DAYS = int(os.environ.get('ABANDONED_CART_RETENTION_DAYS', 90))
+# Delivered and cancelled orders older than this move to the archive table
+ORDER_ARCHIVE_MONTHS = int(os.environ.get('ORDER_ARCHIVE_MONTHS', 18))
+
+# Abandoned-cart reminders go to carts left untouched between these two ages (see orders.abandoned)
+ABANDONED_CART_AFTER_HOURS = int(os.environ.get('ABANDONED_CART_AFTER_HOURS', 24))
+ABANDONED_CART_MAX_AGE_DAYS = int(os.environ.get('ABANDONED_CART_MAX_AGE_DAYS', 7))
+
+# Threads used to fetch the sections of a page bootstrap response concurrently; below 2 runs them in turn
+BOOTSTRAP_WORKERS = int(os.environ.get('BOOTSTRAP_WORKERS', 4))
+
+# Search-box suggestions (see products.suggest): per-worker index size and refresh cadence
+SUGGEST_MAX_PRODUCTS = int(os.environ.get('SUGGEST_MAX_PRODUCTS', 200000))
+SUGGEST_REFRESH_SECONDS = int(os.environ.get('SUGGEST_REFRESH_SECONDS', 5))
+SUGGEST_REBUILD_SECONDS = int(os.environ.get('SUGGEST_REBUILD_SECONDS', 3600))
+SUGGEST_POPULARITY_DAYS = int(os.environ.get('SUGGEST_POPULARITY_DAYS', 90))
+# Build the index when a worker starts instead of on the first suggest request
+SUGGEST_PRELOAD = os.environ.get('SUGGEST_PRELOAD', 'true').lower() in ('1', 'true', 'yes')
+
+# Pre-rendered product detail documents (see products.documents)
+PRODUCT_DOCUMENT_TIMEOUT = int(os.environ.get('PRODUCT_DOCUMENT_TIMEOUT', 6 * 3600))
+# Share of the catalog, by recent sales, that build_product_documents keeps warm
+PRODUCT_DOCUMENT_TOP_PERCENT = float(os.environ.get('PRODUCT_DOCUMENT_TOP_PERCENT', 1))
+
+# Change-event outbox (see m_soko.outbox)
+# Where publish_changes sends events: comma-separated file:<path>, http(s)://... or memory: specs
+OUTBOX_SINKS = [spec for spec in os.environ.get('OUTBOX_SINKS', 'file:changes.ndjson').split(',') if spec]
+# Published events are pruned after this many days
+OUTBOX_RETENTION_DAYS = int(os.environ.get('OUTBOX_RETENTION_DAYS', 7))
+# Hard limit: events no relay has published after this many days are pruned too, with a warning
+OUTBOX_MAX_RETENTION_DAYS = int(os.environ.get('OUTBOX_MAX_RETENTION_DAYS', 30))
+# The feed holds back events this recent, so a transaction that commits a little late isn't skipped by a
+# cursor; one open for longer than this still can be (see ChangesFeedView)
+OUTBOX_SETTLE_SECONDS = int(os.environ.get('OUTBOX_SETTLE_SECONDS', 2))
+
+# Request profiling (see m_soko.profiling)
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+# 'cprofile', or 'pyinstrument' (when installed) for speedscope downloads
+PROFILING_ENGINE = os.environ.get('PROFILING_ENGINE', 'cprofile')
+# pyinstrument's sampling interval, in seconds
+PROFILING_INTERVAL = float(os.environ.get('PROFILING_INTERVAL', 0.001))
+# Share of requests profiled without being asked, optionally only under these comma-separated path prefixes
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_SAMPLE_PATHS = [path for path in os.environ.get('PROFILING_SAMPLE_PATHS', '').split(',') if path]
+# How many profiles are kept, and how many queries of each one's SQL timeline
+PROFILING_KEEP = int(os.environ.get('PROFILING_KEEP', 50))
+PROFILING_MAX_QUERIES = int(os.environ.get('PROFILING_MAX_QUERIES', 500))
+
+# Email
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'M-soko <no-reply@m-soko.local>')
+
+# Cache
+# Throttle counters, the remembered active carts (see orders.carts) and the
+# cached price/recommendation lookups must be shared by every worker, so
+# production should point REDIS_URL at a Redis instance.
+# Without it each process falls back to its own in-memory cache.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -95,6 +201,14 @@ CLOUDINARY_API_KEY = os.environ.get('CLOUDINARY_API_KEY')
 CLOUDINARY_API_SECRET = os.environ.get('CLOUDINARY_API_SECRET')
 
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
+
+# Signed direct uploads (see m_soko.uploads): 'cloudinary', or 'local' to stand in for it in development
+UPLOAD_BACKEND = os.environ.get('UPLOAD_BACKEND', 'cloudinary' if CLOUDINARY_API_SECRET else 'local')
+UPLOAD_LOCAL_ROOT = os.environ.get('UPLOAD_LOCAL_ROOT', os.path.join(BASE_DIR, 'uploads'))
+# How long an upload signature stays usable
+UPLOAD_SIGNATURE_TTL = int(os.environ.get('UPLOAD_SIGNATURE_TTL', 3600))
+# Public URL of /api/uploads/notifications/ for the storage service to call; empty to rely on client confirmation
+UPLOAD_NOTIFICATION_URL = os.environ.get('UPLOAD_NOTIFICATION_URL', '')
 MEDIA_URL = '/media/'
 
 # Database
@@ -108,6 +222,28 @@ DATABASES = {
 }
 
 
+# Password hashing (see users.hashers): the preferred algorithm and its cost. Hashes made with
+# another algorithm or cost are upgraded on the user's next successful login.
+PASSWORD_HASHER_PROFILE = os.environ.get('PASSWORD_HASHER_PROFILE', 'pbkdf2')
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 1_000_000))
+PASSWORD_ARGON2_TIME_COST = int(os.environ.get('PASSWORD_ARGON2_TIME_COST', 2))
+PASSWORD_ARGON2_MEMORY_COST = int(os.environ.get('PASSWORD_ARGON2_MEMORY_COST', 102400))
+PASSWORD_HASHER_PROFILES = {
+    'pbkdf2': 'users.hashers.TunablePBKDF2PasswordHasher',
+    'argon2': 'users.hashers.TunableArgon2PasswordHasher',  # needs argon2-cffi
+    'scrypt': 'django.contrib.auth.hashers.ScryptPasswordHasher',
+}
+PASSWORD_HASHERS = [PASSWORD_HASHER_PROFILES[PASSWORD_HASHER_PROFILE]] + [
+    hasher for hasher in PASSWORD_HASHER_PROFILES.values() if hasher != PASSWORD_HASHER_PROFILES[PASSWORD_HASHER_PROFILE]
+] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    # Imported from the old platform (see import_users); bcrypt needs the bcrypt package
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.BCryptPasswordHasher',
+    'users.hashers.LegacyMD5PasswordHasher',
+    'users.hashers.LegacySHA1PasswordHasher',
+]
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
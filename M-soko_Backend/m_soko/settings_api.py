@@ -0,0 +1,44 @@
+"""
+Slim settings for API-only workers.
+
+Usage: DJANGO_SETTINGS_MODULE=m_soko.settings_api
+
+Drops the admin, baton, messages and static files apps (and the browsable
+API that needs them) so a cold worker imports and initializes only what the
+JSON API uses. The admin keeps running from the default m_soko.settings.
+"""
+from copy import deepcopy
+
+from .settings import *  # noqa: F401,F403
+
+ADMIN_ONLY_APPS = {
+    'baton',
+    'baton.autodiscover',
+    'django.contrib.admin',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+}
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in ADMIN_ONLY_APPS]
+
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware != 'django.contrib.messages.middleware.MessageMiddleware'
+]
+
+ROOT_URLCONF = 'm_soko.api_urls'
+
+# A copy, so the default profile's TEMPLATES stays as it is when both are imported in one process
+TEMPLATES = deepcopy(TEMPLATES)
+TEMPLATES[0]['OPTIONS']['context_processors'] = [
+    processor for processor in TEMPLATES[0]['OPTIONS']['context_processors']
+    if processor != 'django.contrib.messages.context_processors.messages'
+]
+
+REST_FRAMEWORK = dict(
+    REST_FRAMEWORK,
+    DEFAULT_RENDERER_CLASSES=[
+        renderer for renderer in REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES']
+        if renderer != 'rest_framework.renderers.BrowsableAPIRenderer'
+    ],
+)
@@ -0,0 +1,267 @@
+import gzip
+import json
+import marshal
+import tempfile
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+from orders.models import Cart
+from products.models import Category, Product
+from .models import ChangeEvent, RequestProfile
+from .outbox import MemorySink, prune, record_changes, relay
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Shoes')
+        Product.objects.bulk_create([
+            Product(name=f'Runner {i}', description='A light running shoe. ' * 5, price=50, stock=5, category=category)
+            for i in range(20)
+        ])
+
+    @skipUnless(brotli, "brotli isn't installed")
+    def test_brotli_json_keeps_a_weak_etag(self):
+        response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertEqual(len(json.loads(brotli.decompress(response.content))), 20)
+
+    def test_brotli_refused_falls_back_to_gzip(self):
+        response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(gzip.decompress(response.content).startswith(b'['))
+
+    def test_html_never_gets_brotli(self):
+        admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin)
+        response = self.client.get('/admin/products/product/', HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertEqual(response.status_code, 200)
+        # gzip, with Django's random-length padding against BREACH
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    @skipUnless(msgpack, "msgpack isn't installed")
+    def test_messagepack_negotiation(self):
+        response = self.client.get('/api/products/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(len(msgpack.unpackb(response.content)), 20)
+
+
+@override_settings(OUTBOX_SETTLE_SECONDS=0)
+class ChangesFeedTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        record_changes('product', [1, 2, 3])
+        record_changes('order', [7])
+
+    def test_cursor_pages_through_the_feed(self):
+        first = self.client.get('/api/changes/', {'limit': 3}).json()
+        self.assertEqual([e['object_id'] for e in first['results']], [1, 2, 3])
+        self.assertTrue(first['has_more'])
+
+        second = self.client.get('/api/changes/', {'after': first['next'], 'limit': 3}).json()
+        self.assertEqual([(e['topic'], e['object_id']) for e in second['results']], [('order', 7)])
+        self.assertFalse(second['has_more'])
+
+        empty = self.client.get('/api/changes/', {'after': second['next']}).json()
+        self.assertEqual((empty['results'], empty['next']), ([], second['next']))
+
+    def test_topic_filter_and_validation(self):
+        orders = self.client.get('/api/changes/', {'topics': 'order'}).json()
+        self.assertEqual([e['object_id'] for e in orders['results']], [7])
+        self.assertEqual(self.client.get('/api/changes/', {'topics': 'nope'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/changes/', {'after': 'x'}).status_code, 400)
+
+
+class FailingSink:
+    def publish(self, events):
+        raise OSError("sink is down")
+
+
+class OutboxRelayTests(TestCase):
+    def setUp(self):
+        record_changes('product', range(1, 6))
+
+    def test_relay_publishes_every_event_once(self):
+        sink = MemorySink()
+        self.assertEqual(relay([sink], batch_size=2), 5)
+        self.assertEqual([e['object_id'] for e in sink.events], [1, 2, 3, 4, 5])
+        self.assertFalse(ChangeEvent.objects.filter(published_at__isnull=True).exists())
+        self.assertEqual(relay([sink]), 0)
+
+    def test_failed_sink_releases_the_claim(self):
+        with self.assertRaises(OSError):
+            relay([FailingSink()], batch_size=2)
+        self.assertFalse(ChangeEvent.objects.filter(published_at__isnull=False).exists())
+        self.assertFalse(ChangeEvent.objects.filter(claimed_at__isnull=False).exists())
+        self.assertEqual(relay([MemorySink()]), 5)
+
+    def test_prune_drops_unpublished_events_past_the_hard_limit(self):
+        relay([MemorySink()])
+        record_changes('order', [7, 8])
+        ChangeEvent.objects.update(created_at=timezone.now() - timedelta(days=10))
+        self.assertEqual(prune(7), 5)
+        self.assertEqual(ChangeEvent.objects.count(), 2)
+        with self.assertLogs('m_soko.outbox', 'WARNING'):
+            self.assertEqual(prune(7, max_days=9), 2)
+        self.assertFalse(ChangeEvent.objects.exists())
+
+
+class DirectUploadTests(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.enterContext(override_settings(UPLOAD_BACKEND='local', UPLOAD_LOCAL_ROOT=root.name))
+        self.user = get_user_model().objects.create_user('ann', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, signed, name='me.png'):
+        fields = dict(signed['fields'], file=SimpleUploadedFile(name, b'\x89PNG', content_type='image/png'))
+        return APIClient().post(signed['upload_url'], fields, format='multipart')
+
+    def test_profile_picture_round_trip(self):
+        signed = self.client.post('/api/uploads/signatures/', {'kind': 'profile_picture'}).json()
+        self.assertTrue(signed['public_id'].startswith(f'profiles/{self.user.pk}-'))
+        result = self.upload(signed).json()
+
+        response = self.client.post('/api/uploads/complete/', result)
+        self.assertEqual(response.json()['object_id'], self.user.pk)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_picture.public_id, signed['public_id'])
+        # A second confirmation finds nothing pending
+        self.assertEqual(self.client.post('/api/uploads/complete/', result).status_code, 400)
+
+    def test_tampered_fields_and_results_are_refused(self):
+        signed = self.client.post('/api/uploads/signatures/', {'kind': 'profile_picture'}).json()
+        self.assertEqual(self.upload(signed, name='me.exe').status_code, 400)
+        signed['fields']['public_id'] = 'profiles/someone-else'
+        self.assertEqual(self.upload(signed).status_code, 400)
+        forged = {'public_id': signed['public_id'], 'version': 1, 'signature': 'x'}
+        self.assertEqual(self.client.post('/api/uploads/complete/', forged).status_code, 400)
+
+    def test_product_images_are_staff_only(self):
+        category = Category.objects.create(name='Shoes')
+        product = Product.objects.create(name='Runner', description='d', price=50, stock=5, category=category)
+        response = self.client.post('/api/uploads/signatures/', {'kind': 'product_image', 'object_id': product.pk})
+        self.assertEqual(response.status_code, 400)
+
+    def test_direct_upload_views_refuse_multipart_bodies(self):
+        response = self.client.patch('/api/profile/edit/', {'first_name': 'Ann'}, format='multipart')
+        self.assertEqual(response.status_code, 415)
+        response = self.client.patch('/api/profile/edit/', {'first_name': 'Ann'})
+        self.assertEqual(response.status_code, 200)
+
+
+class PageBootstrapTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Shoes')
+        self.product = Product.objects.create(name='Runner', description='d', price=50, stock=5, category=self.category)
+        self.user = get_user_model().objects.create_user('ann', password='pw')
+        self.client = APIClient()
+
+    def test_home_page_for_visitors(self):
+        response = self.client.get('/api/pages/home/')
+        payload = response.json()
+        self.assertEqual(set(payload), {'products', 'categories'})
+        self.assertEqual(payload['products'][0]['name'], 'Runner')
+        self.assertEqual(payload['categories'][0]['name'], 'Shoes')
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('Authorization', response['Vary'])
+
+    def test_home_page_for_a_shopper_includes_the_cart(self):
+        Cart.objects.create(user=self.user)
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/pages/home/')
+        self.assertEqual(set(response.json()), {'products', 'categories', 'cart'})
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_product_page(self):
+        payload = self.client.get(f'/api/pages/products/{self.product.pk}/').json()
+        self.assertEqual(payload['product']['name'], 'Runner')
+        self.assertEqual(payload['related'], [])
+        self.assertIn('approved_count', payload['reviews'])
+        # The required section's failure fails the page
+        self.assertEqual(self.client.get('/api/pages/products/999999/').status_code, 404)
+
+    def test_sections_are_revalidated_not_rebuilt(self):
+        first = self.client.get('/api/pages/home/').json()
+        with CaptureQueriesContext(connection) as cold:
+            cache.clear()
+            self.client.get('/api/pages/home/')
+        with CaptureQueriesContext(connection) as warm:
+            second = self.client.get('/api/pages/home/').json()
+        self.assertEqual(first, second)
+        self.assertLess(len(warm), len(cold))
+
+        self.product.name = 'Trail runner'
+        self.product.save()
+        self.assertEqual(self.client.get('/api/pages/home/').json()['products'][0]['name'], 'Trail runner')
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_ENGINE='cprofile', PROFILING_SAMPLE_RATE=0, PROFILING_KEEP=2)
+class ProfilingTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.shopper = User.objects.create_user('ann', password='pw')
+        category = Category.objects.create(name='Shoes')
+        Product.objects.create(name='Runner', description='d', price=50, stock=5, category=category)
+
+    def client_for(self, user):
+        # A new client loads the middleware under the overridden settings
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        return client
+
+    def test_staff_request_is_profiled(self):
+        response = self.client_for(self.admin).get('/api/products/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual((profile.path, profile.trigger, profile.user), ('/api/products/', 'staff', self.admin))
+        self.assertGreater(profile.query_count, 0)
+        self.assertTrue(any('products_product' in query['sql'] for query in profile.queries))
+        self.assertIsInstance(marshal.loads(bytes(profile.data)), dict)
+
+        self.client.force_login(self.admin)
+        download = self.client.get(f'/admin/m_soko/requestprofile/{profile.pk}/download/')
+        self.assertEqual(download.content, bytes(profile.data))
+
+    def test_other_requests_are_left_alone(self):
+        response = self.client_for(self.shopper).get('/api/products/', HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+        response = self.client_for(self.admin).get('/api/products/')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_only_the_latest_profiles_are_kept(self):
+        client = self.client_for(self.admin)
+        ids = [int(client.get('/api/products/', {'_profile': 1})['X-Profile-Id']) for _ in range(3)]
+        self.assertEqual(sorted(RequestProfile.objects.values_list('pk', flat=True)), ids[1:])
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_nothing_is_profiled_when_disabled(self):
+        response = self.client_for(self.admin).get('/api/products/', HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
@@ -0,0 +1,115 @@
+"""
+Sliding-window rate limiting for DRF views.
+
+Counts live in the shared cache (see CACHES in settings) as one integer per
+client per fixed window. A request is allowed when the previous window's
+count, weighted by how much of it still overlaps the sliding window, plus
+the current window's count is under the limit. That's a single get_many and
+one incr per request, with no per-request timestamp lists like DRF's
+SimpleRateThrottle keeps, so rejecting a flood is cheap and happens before
+the view runs any password hashing or database work.
+"""
+import hashlib
+import logging
+
+from django.core.cache import cache as default_cache
+from rest_framework.throttling import SimpleRateThrottle
+
+logger = logging.getLogger(__name__)
+
+THROTTLED_METRIC_KEY = 'throttle:rejected:{scope}'
+
+
+def record_throttled(scope):
+    """
+    Counts a rejected request for the given scope so it shows up in the
+    throttle metrics endpoint.
+    """
+    key = THROTTLED_METRIC_KEY.format(scope=scope)
+    try:
+        default_cache.incr(key)
+    except ValueError:
+        default_cache.add(key, 0, None)
+        default_cache.incr(key)
+
+
+def throttled_counts(scopes):
+    keys = {THROTTLED_METRIC_KEY.format(scope=scope): scope for scope in scopes}
+    counts = default_cache.get_many(keys.keys())
+    return {scope: counts.get(key, 0) for key, scope in keys.items()}
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    Base class: subclasses set ``scope`` and implement get_cache_key()
+    exactly like DRF's SimpleRateThrottle subclasses.
+    """
+    cache = default_cache
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        now = self.timer()
+        window, offset = divmod(now, self.duration)
+        current_key = f'{self.key}:{int(window)}'
+        previous_key = f'{self.key}:{int(window) - 1}'
+        counts = self.cache.get_many([current_key, previous_key])
+
+        overlap = 1 - offset / self.duration
+        estimated = counts.get(previous_key, 0) * overlap + counts.get(current_key, 0)
+        if estimated >= self.num_requests:
+            self.wait_time = self.duration - offset
+            record_throttled(self.scope)
+            logger.debug("Throttled %s request for %s", self.scope, self.key)
+            return False
+
+        # Two windows' lifetime so the count can still weigh on the next window
+        if not self.cache.add(current_key, 1, int(self.duration * 2)):
+            try:
+                self.cache.incr(current_key)
+            except ValueError:
+                self.cache.set(current_key, 1, int(self.duration * 2))
+        return True
+
+    def wait(self):
+        return getattr(self, 'wait_time', None)
+
+
+class LoginRateThrottle(SlidingWindowThrottle):
+    """
+    Limits login attempts per client IP.
+    """
+    scope = 'login'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginUsernameRateThrottle(SlidingWindowThrottle):
+    """
+    Limits login attempts per target username, whichever IPs they come from.
+    """
+    scope = 'login_username'
+
+    def get_cache_key(self, request, view):
+        username = request.data.get('username')
+        if not username or not isinstance(username, str):
+            return None
+        ident = hashlib.sha1(username.strip().lower().encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class RegistrationRateThrottle(SlidingWindowThrottle):
+    """
+    Limits account creation per client IP.
+    """
+    scope = 'register'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
@@ -0,0 +1,222 @@
+"""
+Signed direct uploads for images.
+
+Image bytes never pass through the API workers. The client asks for an
+upload signature (sign_upload()), posts the file straight to the storage
+service with the signed fields, and then the server only learns the result:
+either the client confirms it with the public_id, version and response
+signature the service returned (complete_upload()), or the service calls
+the notification endpoint. Both paths verify the service's signature and
+are idempotent, so it doesn't matter which one arrives first.
+
+The server picks the public_id and remembers what it is for (the kind of
+image and the object it belongs to) in the cache, so a client can only ever
+attach an image it was given a signature for. Thumbnails are generated by
+the storage service as eager, asynchronous transformations.
+
+UPLOAD_BACKEND selects Cloudinary or a local stand-in for development and
+tests. The stand-in signs the same fields the same way with SECRET_KEY and
+accepts the upload on /api/uploads/local/, writing it to UPLOAD_LOCAL_ROOT.
+
+Views whose images moved here take DirectUploadMixin, which turns away form
+and multipart bodies so no file can be streamed through them any more.
+"""
+import os
+import secrets
+import time
+
+from cloudinary import CloudinaryResource
+from cloudinary.utils import api_sign_request, compute_hex_hash
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.urls import reverse
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.settings import api_settings
+
+UPLOAD_FORMATS = ('jpg', 'jpeg', 'png', 'webp')
+
+
+class DirectUploadMixin:
+    """
+    The default parsers without the form and multipart ones, for views
+    whose images are uploaded directly to storage.
+    """
+    parser_classes = [
+        parser for parser in api_settings.DEFAULT_PARSER_CLASSES
+        if not issubclass(parser, (FormParser, MultiPartParser))
+    ]
+
+
+class UploadKind:
+    """
+    An image field clients can upload to. ``staff_only`` kinds take an
+    object id; the others always belong to the requesting user.
+    """
+
+    def __init__(self, model, field, folder, eager=(), staff_only=False):
+        self.model = model
+        self.field = field
+        self.folder = folder
+        self.eager = eager
+        self.staff_only = staff_only
+
+    def get_model(self):
+        return apps.get_model(self.model)
+
+
+UPLOAD_KINDS = {
+    'profile_picture': UploadKind('users.CustomUser', 'profile_picture', 'profiles', eager=('c_fill,w_256,h_256',)),
+    'product_image': UploadKind(
+        'products.Product', 'image', 'products',
+        eager=('c_fill,w_96,h_96', 'c_limit,w_480', 'c_limit,w_1200'), staff_only=True,
+    ),
+}
+
+
+class UploadError(Exception):
+    pass
+
+
+class SignedUploads:
+    """
+    Cloudinary's signed upload protocol: the form fields are signed with the
+    API secret, and so are the public_id and version it sends back.
+    """
+
+    def __init__(self, upload_url, api_key, secret):
+        self.upload_url = upload_url
+        self.api_key = api_key
+        self.secret = secret
+
+    def sign(self, params):
+        return dict(params, api_key=self.api_key, signature=api_sign_request(params, self.secret))
+
+    def fields_valid(self, fields):
+        params = {key: value for key, value in fields.items() if key not in ('api_key', 'signature', 'file')}
+        return secrets.compare_digest(str(fields.get('signature', '')), api_sign_request(params, self.secret))
+
+    def result_signature(self, public_id, version):
+        return api_sign_request({'public_id': public_id, 'version': version}, self.secret, signature_version=1)
+
+    def result_valid(self, public_id, version, signature):
+        return secrets.compare_digest(str(signature), self.result_signature(public_id, version))
+
+    def notification_valid(self, body, timestamp, signature):
+        if not timestamp.isdigit() or int(timestamp) < time.time() - settings.UPLOAD_SIGNATURE_TTL:
+            return False
+        return secrets.compare_digest(signature, compute_hex_hash(f'{body}{timestamp}{self.secret}'))
+
+
+def get_backend():
+    if settings.UPLOAD_BACKEND == 'cloudinary':
+        return SignedUploads(
+            f'https://api.cloudinary.com/v1_1/{settings.CLOUDINARY_CLOUD_NAME}/image/upload',
+            settings.CLOUDINARY_API_KEY,
+            settings.CLOUDINARY_API_SECRET,
+        )
+    if settings.UPLOAD_BACKEND == 'local':
+        return SignedUploads(reverse('upload-local'), 'local', settings.SECRET_KEY)
+    raise ValueError(f"Unknown upload backend {settings.UPLOAD_BACKEND!r}.")
+
+
+def _pending_key(public_id):
+    return f'uploads:pending:{public_id}'
+
+
+def sign_upload(kind_name, user, object_id=None):
+    """
+    Returns {'upload_url', 'fields', 'public_id', 'expires_in'} for one
+    upload. Raises UploadError if the user can't upload this kind of image.
+    """
+    kind = UPLOAD_KINDS.get(kind_name)
+    if kind is None:
+        raise UploadError(f"Unknown upload kind {kind_name!r}.")
+    if kind.staff_only:
+        if not user.is_staff:
+            raise UploadError("Only staff can upload this kind of image.")
+        if object_id is None or not kind.get_model().objects.filter(pk=object_id).exists():
+            raise UploadError("Unknown object.")
+    else:
+        object_id = user.pk
+
+    public_id = f'{kind.folder}/{object_id}-{secrets.token_hex(8)}'
+    params = {
+        'public_id': public_id,
+        'timestamp': int(time.time()),
+        'allowed_formats': ','.join(UPLOAD_FORMATS),
+        'overwrite': 'false',
+    }
+    if kind.eager:
+        params.update(eager='|'.join(kind.eager), eager_async='true')
+    if settings.UPLOAD_NOTIFICATION_URL:
+        params['notification_url'] = settings.UPLOAD_NOTIFICATION_URL
+    backend = get_backend()
+    cache.set(
+        _pending_key(public_id), {'kind': kind_name, 'object_id': object_id, 'user_id': user.pk},
+        settings.UPLOAD_SIGNATURE_TTL,
+    )
+    return {
+        'upload_url': backend.upload_url,
+        'fields': backend.sign(params),
+        'public_id': public_id,
+        'expires_in': settings.UPLOAD_SIGNATURE_TTL,
+    }
+
+
+def complete_upload(public_id, version, image_format=None, user=None):
+    """
+    Attaches an uploaded image to the object it was signed for. The caller
+    has already checked the storage service's signature. With ``user``, the
+    upload must have been signed for that user. Returns (kind, object).
+    """
+    pending = cache.get(_pending_key(public_id))
+    if pending is None:
+        raise UploadError("Unknown or expired upload.")
+    if user is not None and pending['user_id'] != user.pk:
+        raise UploadError("This upload was signed for someone else.")
+    kind = UPLOAD_KINDS[pending['kind']]
+    obj = kind.get_model().objects.filter(pk=pending['object_id']).first()
+    if obj is None:
+        raise UploadError("The object this upload was for no longer exists.")
+
+    setattr(obj, kind.field, CloudinaryResource(
+        public_id, version=str(version), format=image_format, type='upload', resource_type='image',
+    ))
+    update_fields = [kind.field]
+    if any(field.name == 'updated_at' for field in obj._meta.concrete_fields):
+        update_fields.append('updated_at')
+    obj.save(update_fields=update_fields)
+    # The confirmation and the notification can both arrive; the second finds nothing pending
+    cache.delete(_pending_key(public_id))
+    return pending['kind'], obj
+
+
+def store_local_upload(fields, file):
+    """
+    The local stand-in for the storage service's upload API: checks the
+    signed fields, writes the file and answers like Cloudinary does.
+    """
+    backend = get_backend()
+    if not backend.fields_valid(fields):
+        raise UploadError("Invalid upload signature.")
+    if int(fields.get('timestamp', 0)) < time.time() - settings.UPLOAD_SIGNATURE_TTL:
+        raise UploadError("Upload signature has expired.")
+    image_format = os.path.splitext(file.name)[1].lstrip('.').lower()
+    if image_format not in fields.get('allowed_formats', '').split(','):
+        raise UploadError(f"Images must be one of {fields.get('allowed_formats')}.")
+
+    public_id = fields['public_id']
+    storage = FileSystemStorage(location=settings.UPLOAD_LOCAL_ROOT)
+    if storage.exists(f'{public_id}.{image_format}'):
+        raise UploadError("Already uploaded.")
+    storage.save(f'{public_id}.{image_format}', file)
+    version = int(time.time())
+    return {
+        'public_id': public_id,
+        'version': version,
+        'format': image_format,
+        'bytes': file.size,
+        'signature': backend.result_signature(public_id, version),
+    }
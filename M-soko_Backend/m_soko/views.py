@@ -0,0 +1,250 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from rest_framework import status
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+from .bootstrap import Section, fetch_sections
+from .models import ChangeEvent
+from .outbox import TOPICS, event_data
+from .throttling import throttled_counts
+from .uploads import UploadError, complete_upload, sign_upload, store_local_upload
+from .uploads import get_backend as get_upload_backend
+
+
+class ThrottleMetricsView(APIView):
+    """
+    Number of requests rejected per throttle scope since the cache was last cleared.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({'throttled': throttled_counts(api_settings.DEFAULT_THROTTLE_RATES.keys())})
+
+
+class ChangesFeedView(APIView):
+    """
+    Incremental change feed for downstream systems.
+
+    ``?after=<cursor>`` returns the events recorded after that cursor, oldest
+    first, optionally limited to ``?topics=product,order``. Clients store the
+    ``next`` cursor from each response and pass it back on the next call;
+    ``has_more`` says whether to call again straight away.
+
+    Events newer than OUTBOX_SETTLE_SECONDS are held back, since ids are
+    handed out at insert time but become visible at commit. That's only a
+    heuristic: a transaction that stays open longer than the hold-back can
+    still commit an id below a cursor already returned, and the feed never
+    shows that event. Consumers that can't miss one should use the relay
+    (publish_changes), which sends every unpublished event whatever its id.
+    """
+    permission_classes = [IsAdminUser]
+    default_limit = 500
+    max_limit = 1000
+
+    def get(self, request):
+        try:
+            after = int(request.query_params.get('after', 0))
+            limit = min(int(request.query_params.get('limit', self.default_limit)), self.max_limit)
+        except ValueError:
+            return Response({'detail': 'after and limit must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'detail': 'limit must be at least 1.'}, status=status.HTTP_400_BAD_REQUEST)
+        topics = [topic for topic in request.query_params.get('topics', '').split(',') if topic]
+        unknown = set(topics) - set(TOPICS)
+        if unknown:
+            return Response(
+                {'detail': f"Unknown topics: {', '.join(sorted(unknown))}."}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        settled = timezone.now() - timedelta(seconds=settings.OUTBOX_SETTLE_SECONDS)
+        events = ChangeEvent.objects.filter(pk__gt=after, created_at__lte=settled)
+        if topics:
+            events = events.filter(topic__in=topics)
+        page = list(events.order_by('pk')[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit]
+        return Response({
+            'results': [event_data(event) for event in page],
+            'next': page[-1].pk if page else after,
+            'has_more': has_more,
+        })
+
+
+class PageBootstrapView(APIView):
+    """
+    Base for the page bootstrap endpoints: returns every section of a page in
+    one response (see m_soko.bootstrap). Subclasses override get_sections()
+    and list in ``required`` the sections whose failure fails the page.
+    Optional sections that fail come back as null.
+    """
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    required = ()
+
+    def get_sections(self, request, **kwargs):
+        return {}
+
+    def get(self, request, **kwargs):
+        response = self.build_response(request, fetch_sections(request, self.get_sections(request, **kwargs)))
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        elif response.status_code == 200:
+            patch_cache_control(response, public=True, max_age=60)
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        # The same URL answers differently per user, errors included, so shared caches must key on the credentials
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def build_response(self, request, results):
+        for name in self.required:
+            if results[name].status_code != 200:
+                return Response(results[name].data, status=results[name].status_code)
+
+        payload = {}
+        for name, result in results.items():
+            if result.status_code != 200:
+                payload[name] = None
+            elif result.headers:
+                payload[name] = dict(result.data, **result.headers)
+            else:
+                payload[name] = result.data
+        return Response(payload)
+
+    def cart_section(self, request):
+        return {'cart': Section('/api/orders/carts/', shared=False)} if request.user.is_authenticated else {}
+
+
+class HomePageBootstrapView(PageBootstrapView):
+    """
+    HomePage: product listing, categories and, when signed in, the cart.
+    """
+    required = ('products',)
+
+    def get_sections(self, request):
+        return {
+            'products': Section('/api/products/'),
+            'categories': Section('/api/categories/'),
+            **self.cart_section(request),
+        }
+
+
+class ProductPageBootstrapView(PageBootstrapView):
+    """
+    ProductDetailPage: the product, its first page of reviews, related
+    products and, when signed in, the cart.
+    """
+    required = ('product',)
+
+    def get_sections(self, request, pk):
+        return {
+            'product': Section(f'/api/products/{pk}/'),
+            'reviews': Section(
+                f'/api/products/{pk}/reviews/',
+                headers={'approved_count': 'X-Approved-Count', 'user_review_id': 'X-User-Review-Id'},
+                shared=not request.user.is_authenticated,
+            ),
+            'related': Section(f'/api/products/{pk}/related/'),
+            **self.cart_section(request),
+        }
+
+
+class CartPageBootstrapView(PageBootstrapView):
+    """
+    CartPage: the active cart and the address book used at checkout.
+    """
+    permission_classes = [IsAuthenticated]
+    required = ('cart',)
+
+    def get_sections(self, request):
+        return {
+            **self.cart_section(request),
+            'addresses': Section('/api/users/addresses/', shared=False),
+        }
+
+
+class UploadSignatureView(APIView):
+    """
+    Issues the signed fields for one direct upload (see m_soko.uploads).
+    ``{"kind": "profile_picture"}``, or ``{"kind": "product_image", "object_id": 3}`` for staff.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            upload = sign_upload(request.data.get('kind'), request.user, request.data.get('object_id'))
+        except UploadError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(upload, status=status.HTTP_201_CREATED)
+
+
+class UploadCompleteView(APIView):
+    """
+    The client's confirmation of a finished direct upload: the public_id,
+    version and signature the storage service returned.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        public_id = request.data.get('public_id', '')
+        version = request.data.get('version', '')
+        if not get_upload_backend().result_valid(public_id, version, request.data.get('signature', '')):
+            return Response({'detail': 'Invalid upload signature.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            kind, obj = complete_upload(public_id, version, request.data.get('format'), user=request.user)
+        except UploadError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'kind': kind, 'object_id': obj.pk, 'public_id': public_id})
+
+
+class UploadNotificationView(APIView):
+    """
+    Upload notifications from the storage service, signed over the raw body.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def post(self, request):
+        body = request.body.decode()
+        if not get_upload_backend().notification_valid(
+            body, request.headers.get('X-Cld-Timestamp', ''), request.headers.get('X-Cld-Signature', ''),
+        ):
+            return Response({'detail': 'Invalid notification signature.'}, status=status.HTTP_403_FORBIDDEN)
+        notification = json.loads(body)
+        if notification.get('notification_type') == 'upload':
+            try:
+                complete_upload(notification['public_id'], notification['version'], notification.get('format'))
+            except UploadError:
+                # Already confirmed by the client, or a signature that expired unused
+                pass
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class LocalUploadView(APIView):
+    """
+    Stand-in for the storage service's upload API when UPLOAD_BACKEND is 'local'.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        if settings.UPLOAD_BACKEND != 'local':
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        file = request.FILES.get('file')
+        if file is None:
+            return Response({'detail': 'No file.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            result = store_local_upload(request.data.dict(), file)
+        except UploadError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
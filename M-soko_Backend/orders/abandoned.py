@@ -0,0 +1,161 @@
+"""
+Abandoned-cart detection and reminders.
+
+detect_abandoned_carts() walks the active carts whose updated_at falls in
+the abandoned window with keyset pagination on (updated_at, id), which the
+cart_retention_idx index serves directly, so each batch is an index range
+scan and memory stays flat however many carts there are. Cart values come
+from one query per batch, at the prices in effect now
+(products.pricing.active_prices). Carts are only read, never locked, so
+customers editing their carts are never blocked.
+
+Each stale cart gets an AbandonedCartNotice keyed on (cart, updated_at);
+inserting with ignore_conflicts makes the job idempotent. send_notices()
+then works through the queued notices in batches, re-checking that each
+cart is still active and unchanged before sending, and records the outcome.
+Each batch is claimed in a short transaction and mailed with none open, so
+a slow mail server holds no locks; a sender that dies mid-batch leaves its
+claim to expire, and those notices may go out twice.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.utils import timezone
+
+from m_soko.bulk import claim_batch
+from products.pricing import active_prices
+from .models import AbandonedCartNotice, Cart, CartItem
+
+
+def abandoned_window(now=None, after_hours=None, max_age_days=None):
+    """
+    (oldest, newest) updated_at bounds of the carts that count as abandoned.
+    """
+    now = now or timezone.now()
+    after_hours = settings.ABANDONED_CART_AFTER_HOURS if after_hours is None else after_hours
+    max_age_days = settings.ABANDONED_CART_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    return now - timedelta(days=max_age_days), now - timedelta(hours=after_hours)
+
+
+def iter_stale_carts(oldest, newest, chunk_size=1000):
+    """
+    Yields batches of (cart_id, user_id, updated_at) for active carts last
+    changed between ``oldest`` and ``newest``, oldest first.
+    """
+    carts = (
+        Cart.objects.filter(is_active=True, updated_at__gte=oldest, updated_at__lt=newest)
+        .order_by('updated_at', 'pk')
+        .values_list('pk', 'user_id', 'updated_at')
+    )
+    last = None
+    while True:
+        page = carts
+        if last is not None:
+            page = carts.filter(Q(updated_at__gt=last[2]) | Q(updated_at=last[2], pk__gt=last[0]))
+        batch = list(page[:chunk_size])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1]
+
+
+def cart_values(cart_ids):
+    """
+    {cart_id: (item_count, value)} for the non-empty carts among ``cart_ids``.
+    """
+    rows = list(CartItem.objects.filter(cart_id__in=cart_ids).values_list('cart_id', 'product_id', 'quantity'))
+    prices = active_prices({product_id for _, product_id, _ in rows})
+    values = {}
+    for cart_id, product_id, quantity in rows:
+        items, value = values.get(cart_id, (0, Decimal('0.00')))
+        values[cart_id] = (items + quantity, value + prices[product_id] * quantity)
+    return values
+
+
+def detect_abandoned_carts(now=None, after_hours=None, max_age_days=None, chunk_size=1000, progress=None):
+    """
+    Queues a notice for every non-empty abandoned cart that doesn't have one
+    for its current state yet. Returns (carts scanned, notices queued).
+    """
+    oldest, newest = abandoned_window(now, after_hours, max_age_days)
+    scanned = queued = 0
+    for batch in iter_stale_carts(oldest, newest, chunk_size):
+        cart_ids = [cart_id for cart_id, _, _ in batch]
+        values = cart_values(cart_ids)
+        noticed = set(
+            AbandonedCartNotice.objects.filter(cart_id__in=cart_ids).values_list('cart_id', 'cart_updated_at')
+        )
+        notices = [
+            AbandonedCartNotice(
+                cart_id=cart_id, user_id=user_id, cart_updated_at=updated_at,
+                item_count=values[cart_id][0], value=values[cart_id][1],
+            )
+            for cart_id, user_id, updated_at in batch
+            if cart_id in values and (cart_id, updated_at) not in noticed
+        ]
+        # A concurrent run may have queued some of these already; the unique constraint drops them
+        AbandonedCartNotice.objects.bulk_create(notices, ignore_conflicts=True)
+        queued += len(notices)
+        scanned += len(batch)
+        if progress is not None:
+            progress(scanned, queued)
+    return scanned, queued
+
+
+def _message(notice):
+    return EmailMessage(
+        subject="You left something in your cart",
+        body=(
+            f"Hi {notice.user.get_username()},\n\n"
+            f"You still have {notice.item_count} item(s) worth {notice.value} waiting in your cart. "
+            f"Come back any time to finish your order.\n"
+        ),
+        to=[notice.user.email],
+    )
+
+
+def send_notices(chunk_size=200, progress=None):
+    """
+    Sends the queued notices in batches, over a single mail connection.
+    Returns {status: count} for the notices processed.
+    """
+    outcomes = {}
+    queued = AbandonedCartNotice.objects.filter(status='queued').select_related('user')
+    with get_connection() as connection:
+        while True:
+            # The claim lets several senders share the queue without sending twice
+            notices = claim_batch(queued, chunk_size)
+            if not notices:
+                break
+            current = dict(
+                Cart.objects.filter(pk__in=[n.cart_id for n in notices], is_active=True)
+                .values_list('pk', 'updated_at')
+            )
+            to_send = []
+            for notice in notices:
+                if current.get(notice.cart_id) != notice.cart_updated_at:
+                    notice.status, notice.detail = 'skipped', "Cart was checked out or changed."
+                elif not notice.user.email:
+                    notice.status, notice.detail = 'skipped', "User has no email address."
+                else:
+                    to_send.append(notice)
+
+            for notice in to_send:
+                try:
+                    connection.send_messages([_message(notice)])
+                    notice.status = 'sent'
+                except Exception as e:
+                    notice.status, notice.detail = 'failed', str(e)[:255]
+
+            now = timezone.now()
+            for notice in notices:
+                notice.processed_at = now
+            AbandonedCartNotice.objects.bulk_update(notices, ['status', 'detail', 'processed_at'])
+            for notice in notices:
+                outcomes[notice.status] = outcomes.get(notice.status, 0) + 1
+            if progress is not None:
+                progress(outcomes)
+    return outcomes
@@ -1,43 +1,194 @@
 # orders/admin.py
 
-from django.contrib import admin
-from .models import Order, OrderItem, Cart, CartItem
+from django.contrib import admin, messages
+from django.db.models import F, Sum
+
+from analytics.rollups import record_orders
+from m_soko.bulk import iter_pk_chunks
+from m_soko.outbox import record_change
+from products.models import Product
+from .lifecycle import transition
+from .models import (
+    AbandonedCartNotice, ArchivedOrder, Order, OrderAllocation, OrderItem, OrderStatusEvent, Cart, CartItem,
+    Promotion, PromotionRedemption, WishlistAlert,
+)
+
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     raw_id_fields = ['product']
     readonly_fields = ['price']
 
+
+class OrderAllocationInline(admin.TabularInline):
+    model = OrderAllocation
+    fields = ['location', 'product', 'quantity']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class OrderStatusEventInline(admin.TabularInline):
+    model = OrderStatusEvent
+    fields = ['from_status', 'to_status', 'actor', 'created_at']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class PromotionRedemptionInline(admin.TabularInline):
+    model = PromotionRedemption
+    fields = ['promotion', 'amount', 'created_at']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('user', 'status', 'total_amount', 'created_at')
     list_filter = ('status', 'created_at')
-    inlines = [OrderItemInline]
-    readonly_fields = ['total_amount']
+    list_select_related = ('user',)
+    raw_id_fields = ('user', 'cart', 'shipping_address')
+    show_full_result_count = False
+    inlines = [OrderItemInline, OrderAllocationInline, OrderStatusEventInline, PromotionRedemptionInline]
+    # Status only changes through the lifecycle actions below
+    readonly_fields = ['status', 'total_amount', 'discount_amount', 'stock_reserved', 'shipping_snapshot']
+    actions = ['mark_processing', 'mark_shipped', 'mark_delivered', 'mark_cancelled']
 
     def save_formset(self, request, form, formset, change):
         instances = formset.save(commit=False)
         order_instance = form.instance
-        
-        # Manually set the price from the product before saving
+
+        # Take the old lines out of the sales rollups; the edited ones go back in below.
+        # Status is read-only here, so the instance still holds the stored one.
+        if change and order_instance.status != 'Cancelled':
+            record_orders([order_instance.pk], sign=-1)
+
+        for obj in formset.deleted_objects:
+            obj.delete()
+
+        # Fetch the current price of every product that needs one in a single query
+        missing = {instance.product_id for instance in instances if not instance.price}
+        prices = dict(Product.objects.filter(pk__in=missing).values_list('pk', 'price')) if missing else {}
+
         for instance in instances:
             if not instance.price:
-                instance.price = instance.product.price
+                instance.price = prices[instance.product_id]
             instance.save()
-        
-        # Calculate and save the total amount for the order
-        total_amount = sum(item.price * item.quantity for item in order_instance.items.all())
+
+        # Calculate and save the total amount for the order in the database
+        total_amount = order_instance.items.aggregate(
+            total=Sum(F('price') * F('quantity'))
+        )['total'] or 0
+        # The checkout discount stays as it was; it can't take the total below zero
+        total_amount = max(total_amount - order_instance.discount_amount, 0)
+        Order.objects.filter(pk=order_instance.pk).update(total_amount=total_amount)
+        record_change('order', order_instance.pk)
         order_instance.total_amount = total_amount
-        order_instance.save()
-        
+
+        if order_instance.status != 'Cancelled':
+            record_orders([order_instance.pk])
+
         # Save the formset
         formset.save_m2m()
 
+    def _set_status(self, request, queryset, new_status):
+        changed = skipped = batches = 0
+        for pks in iter_pk_chunks(queryset):
+            result = transition(pks, new_status, actor=request.user)
+            changed += len(result.changed)
+            skipped += len(result.skipped)
+            batches += 1
+        self.message_user(request, f"{changed} orders marked as {new_status} ({batches} batches).")
+        if skipped:
+            self.message_user(
+                request, f"{skipped} orders were skipped: they can't move to {new_status} from their current status.",
+                messages.WARNING,
+            )
+
+    def mark_processing(self, request, queryset):
+        self._set_status(request, queryset, 'Processing')
+    mark_processing.short_description = "Mark selected orders as Processing"
+
+    def mark_shipped(self, request, queryset):
+        self._set_status(request, queryset, 'Shipped')
+    mark_shipped.short_description = "Mark selected orders as Shipped"
+
+    def mark_delivered(self, request, queryset):
+        self._set_status(request, queryset, 'Delivered')
+    mark_delivered.short_description = "Mark selected orders as Delivered"
+
+    def mark_cancelled(self, request, queryset):
+        self._set_status(request, queryset, 'Cancelled')
+    mark_cancelled.short_description = "Mark selected orders as Cancelled"
+
+
 class CartItemInline(admin.TabularInline):
     model = CartItem
     raw_id_fields = ['product']
 
+
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
     list_display = ('user', 'created_at')
-    inlines = [CartItemInline]
\ No newline at end of file
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    inlines = [CartItemInline]
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'total_amount', 'created_at', 'archived_at')
+    list_filter = ('status',)
+    list_select_related = ('user',)
+    search_fields = ('=id', '^user__username')
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(AbandonedCartNotice)
+class AbandonedCartNoticeAdmin(admin.ModelAdmin):
+    list_display = ('cart', 'user', 'item_count', 'value', 'status', 'created_at', 'processed_at')
+    list_filter = ('status',)
+    list_select_related = ('user',)
+    raw_id_fields = ('cart', 'user')
+    readonly_fields = ('cart_updated_at', 'item_count', 'value', 'detail', 'created_at', 'processed_at')
+    search_fields = ('^user__username',)
+    show_full_result_count = False
+
+
+@admin.register(WishlistAlert)
+class WishlistAlertAdmin(admin.ModelAdmin):
+    list_display = ('product', 'user', 'kind', 'old_price', 'new_price', 'status', 'created_at', 'processed_at')
+    list_filter = ('kind', 'status')
+    list_select_related = ('product', 'user')
+    raw_id_fields = ('product', 'user')
+    readonly_fields = ('kind', 'old_price', 'new_price', 'detail', 'created_at', 'processed_at')
+    search_fields = ('^user__username', '^product__name')
+    show_full_result_count = False
+
+
+@admin.register(Promotion)
+class PromotionAdmin(admin.ModelAdmin):
+    list_display = ('name', 'code', 'kind', 'value', 'product', 'category', 'starts_at', 'ends_at', 'is_active',
+                    'redemption_count', 'max_redemptions')
+    list_filter = ('is_active', 'kind')
+    list_select_related = ('product', 'category')
+    raw_id_fields = ('product',)
+    readonly_fields = ('redemption_count', 'created_at', 'updated_at')
+    search_fields = ('^name', '=code')
@@ -0,0 +1,81 @@
+"""
+Active cart lookups.
+
+The cart endpoints, their validators, the cart-item serializer and checkout
+all need the user's active cart. active_cart_id() resolves it once per
+request (m_soko.memo) and remembers the id across requests in the cache,
+keyed by user, so most requests don't query Cart to find it at all. The
+remembered id is dropped by the Cart signals whenever a cart is deactivated
+or deleted, which covers checkout, the admin and the retention purge.
+
+That only holds when every worker sees the same cache: with a per-process
+cache (no REDIS_URL) a worker can keep handing out a cart that another one
+checked out. Readers that take the id as is therefore also filter on
+``is_active``; active_cart() always does.
+"""
+from django.core.cache import cache
+
+from m_soko.memo import forget, memoized, request_memo
+from .models import Cart
+
+ACTIVE_CART_TIMEOUT = 24 * 3600
+
+
+def _active_cart_key(user_id):
+    return f'orders:active-cart:{user_id}'
+
+
+def remember_active_cart(user_id, cart_id):
+    cache.set(_active_cart_key(user_id), cart_id, ACTIVE_CART_TIMEOUT)
+
+
+def forget_active_carts(user_ids):
+    cache.delete_many([_active_cart_key(user_id) for user_id in user_ids])
+
+
+def _load_active_cart_id(user_id):
+    cart_id = cache.get(_active_cart_key(user_id))
+    if cart_id is None:
+        cart_id = (
+            Cart.objects.filter(user_id=user_id, is_active=True).order_by('pk').values_list('pk', flat=True).first()
+        )
+        if cart_id is not None:
+            remember_active_cart(user_id, cart_id)
+    return cart_id
+
+
+def active_cart_id(request):
+    """
+    Id of the user's active cart, or None if they don't have one.
+    """
+    return memoized(request, 'active_cart_id', lambda: _load_active_cart_id(request.user.pk))
+
+
+def active_cart(request, create=False):
+    """
+    The user's active cart; with ``create``, one is made if there is none.
+    Returns None if there's no cart and ``create`` is false.
+    """
+    cart = memoized(request, 'active_cart', lambda: _load_active_cart(request))
+    if cart is None and create:
+        cart, _ = Cart.objects.get_or_create(user=request.user, is_active=True)
+        remember_active_cart(request.user.pk, cart.pk)
+        memo = request_memo(request)
+        memo['active_cart'], memo['active_cart_id'] = cart, cart.pk
+    return cart
+
+
+def _load_active_cart(request):
+    cart_id = active_cart_id(request)
+    if cart_id is None:
+        return None
+    cart = Cart.objects.filter(pk=cart_id, is_active=True).first()
+    if cart is None:
+        # The remembered cart is gone; don't hand its id out again
+        forget_active_carts([request.user.pk])
+        request_memo(request)['active_cart_id'] = None
+    return cart
+
+
+def forget_request_cart(request):
+    forget(request, 'active_cart', 'active_cart_id')
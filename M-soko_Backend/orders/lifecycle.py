@@ -0,0 +1,93 @@
+"""
+Order lifecycle: allowed status transitions and the bulk engine that applies them.
+
+    Pending -> Processing -> Shipped -> Delivered
+    Pending / Processing -> Cancelled
+
+Transitions are applied as conditional UPDATEs (``WHERE status = <from>``)
+on rows read with SELECT ... FOR UPDATE, one statement per source status,
+so an order that another request moved in the meantime is never overwritten
+and orders that can't make the transition are reported as skipped. Every change
+is logged to OrderStatusEvent. Cancelling an order that reserved stock puts
+that stock back in the same transaction.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from analytics.rollups import record_status_change
+from m_soko.outbox import record_changes
+from .models import Order, OrderStatusEvent
+from .stock import release_orders
+
+TRANSITIONS = {
+    'Pending': {'Processing', 'Cancelled'},
+    'Processing': {'Shipped', 'Cancelled'},
+    'Shipped': {'Delivered'},
+    'Delivered': set(),
+    'Cancelled': set(),
+}
+
+
+class TransitionResult:
+    def __init__(self):
+        self.changed = []
+        self.skipped = []
+
+    def __repr__(self):
+        return f"<TransitionResult changed={len(self.changed)} skipped={len(self.skipped)}>"
+
+
+def can_transition(from_status, to_status):
+    return to_status in TRANSITIONS.get(from_status, set())
+
+
+def sources_for(to_status):
+    return [status for status, targets in TRANSITIONS.items() if to_status in targets]
+
+
+def transition(order_ids, to_status, actor=None):
+    """
+    Moves the given orders to ``to_status`` where the lifecycle allows it.
+    Returns a TransitionResult listing the ids that changed and the ids that
+    were skipped (unknown, already there, or not allowed from their current status).
+    """
+    if to_status not in TRANSITIONS:
+        raise ValueError(f"Unknown order status {to_status!r}.")
+    order_ids = list(order_ids)
+    result = TransitionResult()
+    now = timezone.now()
+
+    with transaction.atomic():
+        current = dict(
+            Order.objects.select_for_update()
+            .filter(pk__in=order_ids, status__in=sources_for(to_status))
+            .values_list('pk', 'status')
+        )
+        by_status = {}
+        for pk, status in current.items():
+            by_status.setdefault(status, []).append(pk)
+
+        events = []
+        for from_status, ids in by_status.items():
+            # Conditional on from_status, so a concurrent change is never overwritten
+            Order.objects.filter(pk__in=ids, status=from_status).update(status=to_status, updated_at=now)
+            record_changes('order', ids, payload={'status': to_status})
+            events.extend(
+                OrderStatusEvent(order_id=pk, from_status=from_status, to_status=to_status, actor=actor)
+                for pk in ids
+            )
+            record_status_change(ids, from_status, to_status)
+            result.changed.extend(ids)
+
+        if to_status == 'Cancelled' and result.changed:
+            reserved = list(
+                Order.objects.filter(pk__in=result.changed, stock_reserved=True).values_list('pk', flat=True)
+            )
+            release_orders(reserved)
+            Order.objects.filter(pk__in=reserved).update(stock_reserved=False)
+
+        OrderStatusEvent.objects.bulk_create(events, batch_size=1000)
+
+    changed = set(result.changed)
+    result.skipped = [pk for pk in order_ids if pk not in changed]
+    return result
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.models import Order
+from orders.retention import ARCHIVED_STATUSES, archive_cutoff, archive_orders, expired_carts, purge_carts
+
+
+class Command(BaseCommand):
+    help = (
+        "Purges converted and abandoned carts past their retention window and "
+        "moves old delivered/cancelled orders into the archive table, in small "
+        "batches so it can run against a live database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cart-days', type=int, default=settings.CART_RETENTION_DAYS,
+                            help="Keep converted carts this many days after checkout.")
+        parser.add_argument('--abandoned-days', type=int, default=settings.ABANDONED_CART_RETENTION_DAYS,
+                            help="Keep untouched active carts this many days.")
+        parser.add_argument('--archive-months', type=int, default=settings.ORDER_ARCHIVE_MONTHS,
+                            help="Archive finished orders older than this many months.")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be removed.")
+
+    def handle(self, *args, **options):
+        carts = expired_carts(converted_days=options['cart_days'], abandoned_days=options['abandoned_days'])
+        cutoff = archive_cutoff(months=options['archive_months'])
+
+        if options['dry_run']:
+            orders = Order.objects.filter(status__in=ARCHIVED_STATUSES, created_at__lt=cutoff)
+            self.stdout.write(f"{carts.count()} carts would be purged.")
+            self.stdout.write(f"{orders.count()} orders created before {cutoff:%Y-%m-%d} would be archived.")
+            return
+
+        purged = purge_carts(carts, options['batch_size'], progress=lambda n: self.stdout.write(f"Purged {n} carts..."))
+        archived = archive_orders(
+            cutoff, options['batch_size'], progress=lambda n: self.stdout.write(f"Archived {n} orders..."),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} carts and archived {archived} orders."))
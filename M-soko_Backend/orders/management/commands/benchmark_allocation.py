@@ -0,0 +1,60 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from products.inventory import plan_allocation
+from products.models import StockLevel
+from users.models import Address
+from orders.stock import allocate_stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Times stock allocation for simulated checkouts over the location-tracked "
+        "products in the current database. Every reservation is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=500)
+        parser.add_argument('--lines', type=int, default=5, help="Distinct products per simulated cart.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        product_ids = list(StockLevel.objects.filter(quantity__gt=0).values_list('product_id', flat=True).distinct())
+        if len(product_ids) < options['lines']:
+            raise CommandError("Not enough location-tracked products in stock to build the simulated carts.")
+        addresses = list(Address.objects.all()[:100]) or [None]
+        rng = random.Random(options['seed'])
+        iterations = options['iterations']
+        carts = [
+            ({pk: rng.randint(1, 2) for pk in rng.sample(product_ids, options['lines'])}, rng.choice(addresses))
+            for _ in range(iterations)
+        ]
+
+        # Planning from warm availability, as a busy checkout would see it
+        for quantities, address in carts:
+            plan_allocation(quantities, address)
+        start = time.perf_counter()
+        for quantities, address in carts:
+            plan_allocation(quantities, address)
+        plan_us = (time.perf_counter() - start) / iterations * 1e6
+
+        filled = 0
+        queries = 0
+        start = time.perf_counter()
+        for quantities, address in carts:
+            with CaptureQueriesContext(connection) as captured, transaction.atomic():
+                if allocate_stock(quantities, address) is not None:
+                    filled += 1
+                transaction.set_rollback(True)
+            queries += len(captured)
+        reserve_us = (time.perf_counter() - start) / iterations * 1e6
+
+        self.stdout.write(f"Planning from cached availability: {plan_us:,.1f} us per cart ({options['lines']} lines)")
+        self.stdout.write(
+            f"Plan and reserve: {reserve_us:,.1f} us per cart, {queries / iterations:.1f} queries per cart"
+        )
+        self.stdout.write(self.style.SUCCESS(f"{filled} of {iterations} carts could be filled"))
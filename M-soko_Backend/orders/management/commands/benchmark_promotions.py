@@ -0,0 +1,102 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.promotions import ZERO, Rule, RuleIndex, evaluate
+
+
+class Command(BaseCommand):
+    help = (
+        "Prices synthetic carts against a synthetic set of active promotions, "
+        "through the rule index and through a naive scan of every rule for every "
+        "line, and reports index build time and per-cart latency. Touches no data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rules', type=int, default=1000)
+        parser.add_argument('--lines', type=int, default=100, help="Lines per cart.")
+        parser.add_argument('--carts', type=int, default=1000)
+        parser.add_argument('--products', type=int, default=20000)
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        products, categories = options['products'], options['categories']
+        category_of = {pk: rng.randint(1, categories) for pk in range(1, products + 1)}
+
+        rules = []
+        for pk in range(1, options['rules'] + 1):
+            roll = rng.random()
+            product_id = rng.randint(1, products) if roll < 0.6 else None
+            category_id = rng.randint(1, categories) if 0.6 <= roll < 0.85 else None
+            percent = rng.random() < 0.7
+            rules.append(Rule(
+                pk=pk, name=f'Promotion {pk}', code=f'CODE{pk}' if roll >= 0.95 else None,
+                kind='percent' if percent else 'fixed',
+                value=Decimal(rng.randint(5, 40)) if percent else Decimal(rng.randint(1, 20)),
+                product_id=product_id, category_id=category_id,
+                min_subtotal=Decimal(rng.choice([0, 50, 200])),
+                starts_at=now - timedelta(days=1), ends_at=now + timedelta(days=rng.randint(1, 30)),
+                max_redemptions=rng.choice([None, None, 1000]),
+            ))
+        coupons = [rule.code for rule in rules if rule.code]
+
+        start = time.perf_counter()
+        index = RuleIndex(1, rules)
+        build_ms = (time.perf_counter() - start) * 1000
+        self.stdout.write(f"Indexed {len(index):,} rules in {build_ms:,.1f} ms.")
+
+        carts = []
+        for _ in range(options['carts']):
+            lines = []
+            for product_id in rng.sample(range(1, products + 1), options['lines']):
+                lines.append((product_id, category_of[product_id], rng.randint(1, 3), Decimal(rng.randint(1, 500))))
+            carts.append((lines, rng.choice(coupons) if coupons and rng.random() < 0.3 else ''))
+
+        indexed = self._time(carts, lambda lines, code: evaluate(lines, code, now=now, index=index).discount)
+        naive = self._time(carts, lambda lines, code: self._naive(rules, lines, code, now))
+        if indexed[0] != naive[0]:
+            self.stdout.write(self.style.ERROR(f"Discounts differ: {indexed[0]} indexed, {naive[0]} naive."))
+        for label, (_, timings) in (('Rule index', indexed), ('Naive scan', naive)):
+            timings.sort()
+            p50 = timings[len(timings) // 2]
+            p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+            self.stdout.write(
+                f"{label}: {len(timings):,} carts of {options['lines']} lines, "
+                f"p50 {p50:,.0f} us, p99 {p99:,.0f} us, max {timings[-1]:,.0f} us."
+            )
+
+    def _time(self, carts, price):
+        total = ZERO
+        timings = []
+        for lines, code in carts:
+            start = time.perf_counter()
+            total += price(lines, code)
+            timings.append((time.perf_counter() - start) * 1e6)
+        return total, timings
+
+    def _naive(self, rules, lines, code, now):
+        """
+        The same pricing, checking every rule against every line.
+        """
+        live = [rule for rule in rules if rule.is_live(now) and (not rule.code or rule.code == code)]
+        discount = subtotal = ZERO
+        for product_id, category_id, quantity, price in lines:
+            amount = price * quantity
+            subtotal += amount
+            discount += max(
+                (rule.discount(amount, quantity) for rule in live if rule.targets(product_id, category_id)),
+                default=ZERO,
+            )
+        remaining = subtotal - discount
+        discount += max(
+            (rule.discount(remaining) for rule in live if rule.cart_wide and remaining >= rule.min_subtotal),
+            default=ZERO,
+        )
+        return discount
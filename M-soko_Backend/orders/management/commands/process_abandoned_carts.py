@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.abandoned import detect_abandoned_carts, send_notices
+
+
+class Command(BaseCommand):
+    help = (
+        "Finds active carts left untouched inside the abandoned window, queues one "
+        "reminder per cart state and sends the queued reminders. Safe to run on a "
+        "schedule: carts are never locked and already-queued carts are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--after-hours', type=int, default=settings.ABANDONED_CART_AFTER_HOURS,
+                            help="A cart counts as abandoned this many hours after its last change.")
+        parser.add_argument('--max-age-days', type=int, default=settings.ABANDONED_CART_MAX_AGE_DAYS,
+                            help="Carts older than this are left alone.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--no-send', action='store_true', help="Only detect and queue, don't send.")
+
+    def handle(self, *args, **options):
+        scanned, queued = detect_abandoned_carts(
+            after_hours=options['after_hours'],
+            max_age_days=options['max_age_days'],
+            chunk_size=options['batch_size'],
+            progress=lambda scanned, queued: self.stdout.write(f"Scanned {scanned} carts, queued {queued}..."),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Scanned {scanned} abandoned carts and queued {queued} reminders."))
+        if options['no_send']:
+            return
+
+        outcomes = send_notices()
+        summary = ', '.join(f"{count} {status}" for status, count in sorted(outcomes.items())) or 'nothing to send'
+        self.stdout.write(self.style.SUCCESS(f"Reminders: {summary}."))
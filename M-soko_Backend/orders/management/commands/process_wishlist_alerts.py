@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from orders.wishlist import detect_wishlist_changes, send_alerts
+
+
+class Command(BaseCommand):
+    help = (
+        "Diffs every saved product against the price and stock its user last saw, "
+        "queues price-drop and back-in-stock alerts and mails them as one digest per "
+        "user. Safe to run on a schedule and concurrently: rows are processed in "
+        "locked batches and alerts are queued once per change."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--no-send', action='store_true', help="Only detect and queue, don't send.")
+
+    def handle(self, *args, **options):
+        scanned, queued = detect_wishlist_changes(
+            chunk_size=options['batch_size'],
+            progress=lambda scanned, queued: self.stdout.write(f"Scanned {scanned} saved items, queued {queued}..."),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Scanned {scanned} saved items and queued {queued} alerts."))
+        if options['no_send']:
+            return
+
+        outcomes = send_alerts()
+        summary = ', '.join(f"{count} {status}" for status, count in sorted(outcomes.items())) or 'nothing to send'
+        self.stdout.write(self.style.SUCCESS(f"Alerts: {summary}."))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:22
+
+from django.db import migrations, models
+
+SNAPSHOT_FIELDS = (
+    'full_name', 'phone_number', 'address_line_1', 'address_line_2',
+    'city', 'state_province', 'country', 'postal_code',
+)
+
+
+def backfill_snapshots(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    Address = apps.get_model('users', 'Address')
+    orders = Order.objects.filter(shipping_address__isnull=False, shipping_snapshot__isnull=True)
+    for address in Address.objects.filter(pk__in=orders.values('shipping_address_id')).values('pk', *SNAPSHOT_FIELDS):
+        pk = address.pop('pk')
+        orders.filter(shipping_address_id=pk).update(shipping_snapshot=address)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_abandoned_cart_notice'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedorder',
+            name='shipping_snapshot',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='shipping_snapshot',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0012_promotions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedorder',
+            name='allocations',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='payment',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='redemptions',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='status_events',
+            field=models.JSONField(default=list),
+        ),
+    ]
@@ -1,14 +1,18 @@
 from django.db import models
 from django.contrib.auth import get_user_model
-from products.models import Product
+from django.utils import timezone
+from products.models import Category, Product, StockLocation
 from users.models import Address
 
 User = get_user_model()
 
+
 class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
     cart = models.ForeignKey('Cart', on_delete=models.SET_NULL, null=True, related_name='orders')
     shipping_address = models.ForeignKey(Address, on_delete=models.SET_NULL, null=True, blank=True)
+    # Copy of the address at checkout; later edits to the address book don't rewrite past orders
+    shipping_snapshot = models.JSONField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(
         max_length=20,
@@ -22,6 +26,17 @@ class Order(models.Model):
         default='Pending'
     )
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    # Already taken off total_amount; the promotions behind it are in redemptions
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Set when checkout took the items out of Product.stock, so cancelling knows to put them back
+    stock_reserved = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Serves the archival scan for old, finished orders (see orders.retention)
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.id} by {self.user.username}"
@@ -31,6 +46,7 @@ class Order(models.Model):
         # A more efficient way to calculate the total price of all order items
         return sum(item.get_total_price for item in self.items.all())
 
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -44,6 +60,76 @@ class OrderItem(models.Model):
     def get_total_price(self):
         return self.price * self.quantity
 
+
+class OrderAllocation(models.Model):
+    """
+    How much of a product an order takes from one stock location. An order
+    whose lines come from several locations is split into one shipment per
+    location. Only location-tracked products get allocation rows.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='allocations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    location = models.ForeignKey(StockLocation, on_delete=models.PROTECT, related_name='allocations')
+    quantity = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"Order {self.order_id}: {self.quantity} of {self.product_id} from {self.location_id}"
+
+
+class OrderStatusEvent(models.Model):
+    """
+    Append-only log of order status changes, written by orders.lifecycle.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_events')
+    from_status = models.CharField(max_length=20, blank=True)
+    to_status = models.CharField(max_length=20)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['order', 'created_at'], name='orderstatusevent_timeline_idx'),
+        ]
+
+    def __str__(self):
+        return f"Order {self.order_id}: {self.from_status or '-'} -> {self.to_status}"
+
+
+class ArchivedOrder(models.Model):
+    """
+    Cold copy of a finished order that has aged out of the Order table (see
+    orders.retention). The lines are kept as a JSON list of
+    {"product": id, "quantity": n, "price": "9.99"} so reading a customer's
+    archived history is one indexed query with no joins. The payment, status
+    history, stock allocations and promotion redemptions are kept alongside
+    in the same way, with ids in place of foreign keys.
+    """
+    id = models.BigIntegerField(primary_key=True)  # The original Order id
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+    status = models.CharField(max_length=20)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    shipping_address_id = models.BigIntegerField(blank=True, null=True)
+    shipping_snapshot = models.JSONField(blank=True, null=True)
+    items = models.JSONField(default=list)
+    payment = models.JSONField(blank=True, null=True)
+    status_events = models.JSONField(default=list)
+    allocations = models.JSONField(default=list)
+    redemptions = models.JSONField(default=list)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='archivedorder_history_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.id}"
+
+
 class Payment(models.Model):
     PAYMENT_METHOD_CHOICES = [
         ('Mpesa', 'M-Pesa'),
@@ -64,14 +150,24 @@ class Payment(models.Model):
 
     def __str__(self):
         return f"Payment for Order {self.order.id} via {self.payment_method}"
-    
+
 
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='carts')
     is_active = models.BooleanField(default=True) 
+    # Entered by the user; checked again at every evaluation (see orders.promotions)
+    coupon_code = models.CharField(max_length=40, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Every cart request looks up the user's active cart; converted carts stay out of this index
+            models.Index(fields=['user'], name='cart_active_user_idx', condition=models.Q(is_active=True)),
+            # Serves the retention purge of converted and abandoned carts
+            models.Index(fields=['is_active', 'updated_at'], name='cart_retention_idx'),
+        ]
+
     @property
     def total_price(self):
         return sum(item.total_price for item in self.cartitem_set.all())
@@ -79,10 +175,170 @@ class Cart(models.Model):
     def __str__(self):
         return f"Cart for {self.user.username}"
 
+
+class AbandonedCartNotice(models.Model):
+    """
+    One reminder for a cart that went stale, written by orders.abandoned.
+    A cart gets at most one notice per state (cart_updated_at), so re-running
+    the detector never queues the same reminder twice.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('sent', 'Sent'),
+        ('skipped', 'Skipped'),
+        ('failed', 'Failed'),
+    ]
+
+    cart = models.ForeignKey(Cart, on_delete=models.SET_NULL, null=True, related_name='abandoned_notices')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='abandoned_cart_notices')
+    cart_updated_at = models.DateTimeField()
+    item_count = models.PositiveIntegerField()
+    value = models.DecimalField(max_digits=12, decimal_places=2)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    detail = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'cart_updated_at'], name='abandonedcartnotice_once_idx'),
+        ]
+        indexes = [
+            # The sender only scans what's still queued
+            models.Index(fields=['id'], name='abandonedcartnotice_queue_idx', condition=models.Q(status='queued')),
+        ]
+
+    def __str__(self):
+        return f"Abandoned cart {self.cart_id} ({self.status})"
+
+
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
     def __str__(self):
-        return f"{self.quantity} x {self.product.name}"
\ No newline at end of file
+        return f"{self.quantity} x {self.product.name}"
+
+
+class WishlistItem(models.Model):
+    """
+    A product a user saved for later (see orders.wishlist). Rows are narrow:
+    the price and availability the user last saw are the snapshot the
+    price-drop and back-in-stock job diffs against.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='wishlist_items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    added_at = models.DateTimeField(auto_now_add=True)
+    seen_price = models.DecimalField(max_digits=10, decimal_places=2)
+    seen_in_stock = models.BooleanField()
+
+    class Meta:
+        ordering = ['-added_at']
+        constraints = [
+            # Also serves every per-user wishlist read
+            models.UniqueConstraint(fields=['user', 'product'], name='wishlistitem_once_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} saved by {self.user_id}"
+
+
+class WishlistAlert(models.Model):
+    """
+    A price drop or restock of a saved product, found by
+    orders.wishlist.detect_wishlist_changes() and mailed in per-user digests.
+    """
+    KIND_CHOICES = [
+        ('price_drop', 'Price drop'),
+        ('back_in_stock', 'Back in stock'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('sent', 'Sent'),
+        ('skipped', 'Skipped'),
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='wishlist_alerts')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=15, choices=KIND_CHOICES)
+    old_price = models.DecimalField(max_digits=10, decimal_places=2)
+    new_price = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    detail = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # The sender only scans what's still queued
+            models.Index(fields=['id'], name='wishlistalert_queue_idx', condition=models.Q(status='queued')),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} of {self.product_id} for {self.user_id} ({self.status})"
+
+
+class Promotion(models.Model):
+    """
+    A discount rule (see orders.promotions). Rules with a code are coupons
+    and only apply once the code is entered; the others apply on their own.
+    A rule targets one product, one category, or with neither the whole cart.
+    """
+    KIND_CHOICES = [
+        ('percent', 'Percent off'),
+        ('fixed', 'Fixed amount off'),
+    ]
+
+    name = models.CharField(max_length=100)
+    code = models.CharField(max_length=40, unique=True, blank=True, null=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Percent, or an amount off each unit (product and category rules) or the cart
+    value = models.DecimalField(max_digits=10, decimal_places=2)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, blank=True, null=True, related_name='+')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, blank=True, null=True, related_name='+')
+    # Cart-wide rules only
+    min_subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    starts_at = models.DateTimeField(default=timezone.now)
+    ends_at = models.DateTimeField(blank=True, null=True)
+    is_active = models.BooleanField(default=True)
+    max_redemptions = models.PositiveIntegerField(blank=True, null=True)
+    redemption_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.CheckConstraint(
+                condition=~models.Q(product__isnull=False, category__isnull=False), name='promotion_one_target',
+            ),
+            models.CheckConstraint(
+                condition=~models.Q(kind='percent', value__gt=100), name='promotion_percent_max',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Codes are matched case-insensitively
+        self.code = (self.code or '').strip().upper() or None
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.name
+
+
+class PromotionRedemption(models.Model):
+    """
+    One promotion's share of an order's discount.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='redemptions')
+    # Redeemed promotions are switched off rather than deleted, so the history stays whole
+    promotion = models.ForeignKey(Promotion, on_delete=models.PROTECT, related_name='redemptions')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.promotion} on order {self.order_id}"
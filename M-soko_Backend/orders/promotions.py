@@ -0,0 +1,311 @@
+"""
+Promotions and coupons.
+
+The active Promotion rules are compiled into an in-process RuleIndex keyed by
+product and by category, with the cart-wide rules and the coupons (by code)
+alongside. The index carries the version number kept in the cache under
+INDEX_VERSION_KEY. Saving or deleting a promotion bumps it once the
+transaction commits, and every worker rebuilds its copy the next time it
+prices a cart, so an up-to-date index costs one cache read per evaluation.
+
+evaluate() prices a cart in one pass over its lines. Each line gets the best
+of the rules on its product and its category, or the entered coupon when it
+targets them. Then the best cart-wide rule whose minimum subtotal is met is
+taken off what's left. Rules never stack within a level, and the coupon
+competes with the automatic rules at its own level.
+
+Redemption limits are enforced at checkout by redeem_promotions(): one
+conditional UPDATE increments redemption_count of the applied promotions
+only while they're active and below max_redemptions, so concurrent
+checkouts can't overshoot a limit. When a promotion runs out or is switched
+off between pricing and checkout, the cart is priced again without it.
+Checkout only fails over a coupon that is invalid or used up; one that the
+automatic promotions beat is reported and left unused.
+"""
+import threading
+import time
+from bisect import bisect_right
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from products.models import Product
+from .models import Promotion, PromotionRedemption
+
+INDEX_VERSION_KEY = 'orders:promotions-version'
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+RULE_FIELDS = (
+    'pk', 'name', 'code', 'kind', 'value', 'product_id', 'category_id', 'min_subtotal', 'starts_at', 'ends_at',
+    'max_redemptions',
+)
+
+
+class PromotionError(Exception):
+    pass
+
+
+def normalize_code(code):
+    return (code or '').strip().upper()
+
+
+class Rule:
+    """
+    The part of a Promotion that pricing needs, kept in the index.
+    """
+    __slots__ = RULE_FIELDS
+
+    def __init__(self, **fields):
+        for name in RULE_FIELDS:
+            setattr(self, name, fields[name])
+
+    @property
+    def cart_wide(self):
+        return self.product_id is None and self.category_id is None
+
+    def is_live(self, now):
+        return self.starts_at <= now and (self.ends_at is None or now < self.ends_at)
+
+    def targets(self, product_id, category_id):
+        if self.product_id is not None:
+            return self.product_id == product_id
+        return self.category_id is not None and self.category_id == category_id
+
+    def discount(self, amount, units=1):
+        """
+        What the rule takes off ``amount``; fixed amounts are per unit.
+        """
+        if self.kind == 'percent':
+            off = (amount * self.value / 100).quantize(CENT, ROUND_HALF_UP)
+        else:
+            off = self.value * units
+        return min(off, amount)
+
+
+class RuleIndex:
+    def __init__(self, version, rules):
+        self.version = version
+        self.by_product = {}
+        self.by_category = {}
+        self.cart_wide = []
+        self.coupons = {}
+        boundaries = []
+        for rule in rules:
+            if rule.code:
+                self.coupons[rule.code] = rule
+            elif rule.product_id is not None:
+                self.by_product.setdefault(rule.product_id, []).append(rule)
+            elif rule.category_id is not None:
+                self.by_category.setdefault(rule.category_id, []).append(rule)
+            else:
+                self.cart_wide.append(rule)
+            boundaries.append(rule.starts_at)
+            if rule.ends_at is not None:
+                boundaries.append(rule.ends_at)
+        # Start and end times, so validators can tell when the set of live rules moves
+        self.boundaries = sorted(boundaries)
+        self.size = len(rules)
+
+    def __len__(self):
+        return self.size
+
+    def stamp(self, now=None):
+        """
+        Changes whenever a promotion is edited or one starts or ends.
+        """
+        return self.version, bisect_right(self.boundaries, now or timezone.now())
+
+
+def _index_version():
+    # Seeded from the clock, so an evicted version never comes back as one a worker already built
+    return cache.get_or_set(INDEX_VERSION_KEY, time.time_ns, None)
+
+
+def bump_index_version():
+    try:
+        cache.incr(INDEX_VERSION_KEY)
+    except ValueError:
+        cache.set(INDEX_VERSION_KEY, time.time_ns(), None)
+
+
+def build_index(version):
+    now = timezone.now()
+    rows = (
+        Promotion.objects.filter(is_active=True)
+        .filter(Q(ends_at__isnull=True) | Q(ends_at__gt=now))
+        .filter(Q(max_redemptions__isnull=True) | Q(redemption_count__lt=F('max_redemptions')))
+        .values(*RULE_FIELDS)
+    )
+    return RuleIndex(version, [Rule(**row) for row in rows])
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def rule_index():
+    """
+    This worker's index, rebuilt first if a promotion changed since it was built.
+    """
+    global _index
+    # Read before building, so a change that lands mid-build triggers another one
+    version = _index_version()
+    index = _index
+    if index is None or index.version != version:
+        with _index_lock:
+            if _index is None or _index.version != version:
+                _index = build_index(version)
+            index = _index
+    return index
+
+
+class Evaluation:
+    def __init__(self):
+        self.subtotal = ZERO
+        self.discount = ZERO
+        self.applied = {}         # promotion id -> [Rule, amount]
+        self.coupon = None        # the entered coupon's Rule, if it's usable
+        self.coupon_error = None
+        self.coupon_invalid = False  # the coupon can't be used at all, as opposed to being beaten
+
+    @property
+    def total(self):
+        return self.subtotal - self.discount
+
+    def _apply(self, rule, amount):
+        self.discount += amount
+        entry = self.applied.setdefault(rule.pk, [rule, ZERO])
+        entry[1] += amount
+
+    def promotions(self):
+        return [
+            {'id': rule.pk, 'name': rule.name, 'code': rule.code, 'amount': amount}
+            for rule, amount in self.applied.values()
+        ]
+
+
+def evaluate(lines, coupon_code='', exclude=(), now=None, index=None):
+    """
+    Prices cart lines, given as (product_id, category_id, quantity, unit
+    price) tuples, in one pass. A category_id of None is looked up when a
+    rule needs it. Promotions in ``exclude`` are left out. Returns an
+    Evaluation.
+    """
+    now = now or timezone.now()
+    index = index or rule_index()
+    evaluation = Evaluation()
+    lines = list(lines)
+
+    coupon_code = normalize_code(coupon_code)
+    if coupon_code:
+        coupon = index.coupons.get(coupon_code)
+        if coupon is None or not coupon.is_live(now):
+            evaluation.coupon_error, evaluation.coupon_invalid = "This coupon is not valid.", True
+        elif coupon.pk in exclude:
+            evaluation.coupon_error, evaluation.coupon_invalid = "This coupon has been used up.", True
+        else:
+            evaluation.coupon = coupon
+    coupon = evaluation.coupon
+
+    categories = {}
+    if index.by_category or (coupon is not None and coupon.category_id is not None):
+        missing = [product_id for product_id, category_id, _, _ in lines if category_id is None]
+        if missing:
+            categories = dict(Product.objects.filter(pk__in=missing).values_list('pk', 'category_id'))
+
+    by_product, by_category = index.by_product, index.by_category
+    for product_id, category_id, quantity, price in lines:
+        amount = price * quantity
+        evaluation.subtotal += amount
+        if category_id is None:
+            category_id = categories.get(product_id)
+        candidates = by_product.get(product_id, []) + by_category.get(category_id, [])
+        if coupon is not None and coupon.targets(product_id, category_id):
+            candidates.append(coupon)
+        best, best_off = None, ZERO
+        for rule in candidates:
+            if rule.pk in exclude or not rule.is_live(now):
+                continue
+            off = rule.discount(amount, quantity)
+            if off > best_off:
+                best, best_off = rule, off
+        if best is not None:
+            evaluation._apply(best, best_off)
+
+    remaining = evaluation.total
+    candidates = index.cart_wide + ([coupon] if coupon is not None and coupon.cart_wide else [])
+    best, best_off = None, ZERO
+    for rule in candidates:
+        if rule.pk in exclude or not rule.is_live(now) or remaining < rule.min_subtotal:
+            continue
+        off = rule.discount(remaining)
+        if off > best_off:
+            best, best_off = rule, off
+    if best is not None:
+        evaluation._apply(best, best_off)
+
+    if coupon is not None and coupon.pk not in evaluation.applied:
+        # Targets nothing in the cart, or an automatic promotion takes more off
+        evaluation.coupon_error = "This coupon doesn't apply to your cart."
+    return evaluation
+
+
+def _claimable():
+    return Promotion.objects.filter(is_active=True).filter(
+        Q(max_redemptions__isnull=True) | Q(redemption_count__lt=F('max_redemptions'))
+    )
+
+
+def _claim(evaluation):
+    """
+    Counts one redemption of every applied promotion, in the caller's
+    transaction. The limits are checked against the database, not the
+    index, which may be a moment behind. Returns the ids of the promotions
+    that ran out or were switched off, in which case nothing is counted.
+    """
+    pks = sorted(evaluation.applied)
+    if not pks:
+        return set()
+    while True:
+        with transaction.atomic():
+            claimed = _claimable().filter(pk__in=pks).update(redemption_count=F('redemption_count') + 1)
+            if claimed == len(pks):
+                return set()
+            transaction.set_rollback(True)
+        exhausted = set(pks) - set(_claimable().filter(pk__in=pks).values_list('pk', flat=True))
+        if exhausted:
+            # This worker's index, and maybe others', still hold them
+            bump_index_version()
+            return exhausted
+        # Nothing is out now; a concurrent checkout's claim was rolled back in between
+
+
+def redeem_promotions(lines, coupon_code=''):
+    """
+    Prices a cart for checkout and redeems the promotions it uses, pricing
+    it again without any promotion that ran out in the meantime.
+    Must run inside the checkout transaction. Returns the Evaluation; raises
+    PromotionError if the coupon is invalid or used up. A coupon that doesn't
+    apply, or that the automatic promotions beat, is left unused.
+    """
+    lines = list(lines)
+    exclude = set()
+    while True:
+        evaluation = evaluate(lines, coupon_code, exclude)
+        if evaluation.coupon_invalid:
+            raise PromotionError(evaluation.coupon_error)
+        exhausted = _claim(evaluation)
+        if not exhausted:
+            return evaluation
+        exclude |= exhausted
+
+
+def record_redemptions(order, evaluation):
+    PromotionRedemption.objects.bulk_create([
+        PromotionRedemption(order=order, promotion_id=pk, amount=amount)
+        for pk, (_, amount) in evaluation.applied.items()
+    ])
@@ -0,0 +1,160 @@
+"""
+Retention for carts and orders.
+
+Checkout leaves the converted cart and its items behind, and customers
+abandon carts they never come back to. purge_carts() deletes both kinds
+once they're older than the retention windows. archive_orders() moves
+delivered and cancelled orders older than a cutoff into ArchivedOrder, one
+row per order with its lines, payment, status history, stock allocations
+and promotion redemptions inlined, and deletes the originals, so the hot
+order tables only hold recent and in-flight orders.
+
+Both walk their candidates in primary-key batches, each batch in its own
+short transaction, so they can run against a live database.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from m_soko.bulk import iter_pk_chunks
+from .models import (
+    ArchivedOrder, Cart, CartItem, Order, OrderAllocation, OrderItem, OrderStatusEvent, Payment, PromotionRedemption,
+)
+
+ARCHIVED_STATUSES = ('Delivered', 'Cancelled')
+# Carts that never got an item are dropped after a day
+EMPTY_CART_RETENTION = timedelta(days=1)
+
+
+def archive_cutoff(now=None, months=None):
+    months = settings.ORDER_ARCHIVE_MONTHS if months is None else months
+    return (now or timezone.now()) - timedelta(days=months * 30)
+
+
+def expired_carts(now=None, converted_days=None, abandoned_days=None):
+    """
+    Carts past retention: converted ones (inactive after checkout), active
+    ones nobody has touched for the abandoned window, and empty ones.
+    """
+    now = now or timezone.now()
+    converted_days = settings.CART_RETENTION_DAYS if converted_days is None else converted_days
+    abandoned_days = settings.ABANDONED_CART_RETENTION_DAYS if abandoned_days is None else abandoned_days
+    has_items = Exists(CartItem.objects.filter(cart=OuterRef('pk')))
+    return Cart.objects.filter(
+        Q(is_active=False, updated_at__lt=now - timedelta(days=converted_days))
+        | Q(is_active=True, updated_at__lt=now - timedelta(days=abandoned_days))
+        | Q(~has_items, is_active=True, updated_at__lt=now - EMPTY_CART_RETENTION)
+    )
+
+
+def purge_carts(carts, chunk_size=1000, progress=None):
+    """
+    Deletes the given carts and their items. Returns the number of carts deleted.
+    """
+    deleted = 0
+    for pks in iter_pk_chunks(carts, chunk_size):
+        with transaction.atomic():
+            # Items go with their cart, and orders keep their history with only the link to the cart cleared
+            deleted += Cart.objects.filter(pk__in=pks).delete()[1].get(Cart._meta.label, 0)
+        if progress is not None:
+            progress(deleted)
+    return deleted
+
+
+_encoder = DjangoJSONEncoder()
+
+
+def _by_order(rows, fields):
+    """
+    Groups (order_id, *values) rows into {order_id: [{field: value}]}, with
+    decimals and datetimes turned into strings for the JSON columns.
+    """
+    grouped = {}
+    for order_id, *values in rows:
+        grouped.setdefault(order_id, []).append({
+            field: value if value is None or isinstance(value, (str, int)) else _encoder.default(value)
+            for field, value in zip(fields, values)
+        })
+    return grouped
+
+
+def _archive_rows(orders):
+    """
+    ArchivedOrder rows for ``orders``, with everything that hangs off each
+    order read in one query per table.
+    """
+    ids = [order.pk for order in orders]
+    items = _by_order(
+        OrderItem.objects.filter(order_id__in=ids).values_list('order_id', 'product_id', 'quantity', 'price'),
+        ('product', 'quantity', 'price'),
+    )
+    payments = _by_order(
+        Payment.objects.filter(order_id__in=ids).values_list(
+            'order_id', 'payment_method', 'amount', 'transaction_id', 'status', 'created_at',
+        ),
+        ('method', 'amount', 'transaction_id', 'status', 'created_at'),
+    )
+    events = _by_order(
+        OrderStatusEvent.objects.filter(order_id__in=ids).order_by('created_at', 'pk').values_list(
+            'order_id', 'from_status', 'to_status', 'actor_id', 'created_at',
+        ),
+        ('from_status', 'to_status', 'actor', 'created_at'),
+    )
+    allocations = _by_order(
+        OrderAllocation.objects.filter(order_id__in=ids).values_list('order_id', 'product_id', 'location_id', 'quantity'),
+        ('product', 'location', 'quantity'),
+    )
+    redemptions = _by_order(
+        PromotionRedemption.objects.filter(order_id__in=ids).values_list('order_id', 'promotion_id', 'amount', 'created_at'),
+        ('promotion', 'amount', 'created_at'),
+    )
+    return [
+        ArchivedOrder(
+            id=order.pk,
+            user_id=order.user_id,
+            status=order.status,
+            total_amount=order.total_amount,
+            discount_amount=order.discount_amount,
+            shipping_address_id=order.shipping_address_id,
+            shipping_snapshot=order.shipping_snapshot,
+            items=items.get(order.pk, []),
+            payment=payments.get(order.pk, [None])[0],
+            status_events=events.get(order.pk, []),
+            allocations=allocations.get(order.pk, []),
+            redemptions=redemptions.get(order.pk, []),
+            created_at=order.created_at,
+        )
+        for order in orders
+    ]
+
+
+def archive_orders(before, chunk_size=500, progress=None):
+    """
+    Moves delivered and cancelled orders created before ``before`` into
+    ArchivedOrder. Returns the number of orders archived.
+    """
+    candidates = Order.objects.filter(status__in=ARCHIVED_STATUSES, created_at__lt=before)
+    archived = 0
+    for pks in iter_pk_chunks(candidates, chunk_size):
+        with transaction.atomic():
+            orders = list(
+                Order.objects.select_for_update(skip_locked=True)
+                .filter(pk__in=pks, status__in=ARCHIVED_STATUSES)
+                .only(
+                    'id', 'user_id', 'status', 'total_amount', 'discount_amount', 'shipping_address_id',
+                    'shipping_snapshot', 'created_at',
+                )
+            )
+            if not orders:
+                continue
+            ArchivedOrder.objects.bulk_create(_archive_rows(orders), ignore_conflicts=True)
+            # Everything hanging off the orders is in the archive now; the sales rollups already hold their totals
+            Order.objects.filter(pk__in=[order.pk for order in orders]).delete()
+            archived += len(orders)
+        if progress is not None:
+            progress(archived)
+    return archived
@@ -1,12 +1,34 @@
 # orders/serializers.py
 
+from decimal import Decimal
+
 from rest_framework import serializers
 from django.db.models import Sum 
 
 from products.serializers import ProductSerializer
 from products.models import Product 
+from products.pricing import active_prices
+
+from .carts import active_cart
+from .lifecycle import TRANSITIONS
+from .promotions import evaluate
+from .models import ArchivedOrder, Cart, CartItem, Order, OrderItem, OrderStatusEvent, WishlistItem
+
+def _active_price(context, product_id):
+    """
+    Looks a product's price up in the active-price map shared through the
+    serializer context, loading it on first use.
+    """
+    prices = context.setdefault('active_prices', {})
+    if product_id not in prices:
+        prices.update(active_prices([product_id]))
+    return prices[product_id]
 
-from .models import Cart, CartItem, Order, OrderItem
+def _sideload_product(serializer, fields):
+    # Sideloaded responses reference the product by id (see products.sideload)
+    if serializer.context.get('sideload'):
+        fields['product'] = serializers.IntegerField(source='product_id', read_only=True)
+    return fields
 
 # --- Nested Serializers for Items ---
 
@@ -26,8 +48,11 @@ class CartItemSerializer(serializers.ModelSerializer):
             'product_id': {'required': True} # Explicitly make product_id required
         }
 
+    def get_fields(self):
+        return _sideload_product(self, super().get_fields())
+
     def get_total_price(self, obj):
-        return obj.quantity * obj.product.price
+        return obj.quantity * _active_price(self.context, obj.product_id)
     
     def update(self, instance, validated_data):
         instance.quantity = validated_data.get('quantity', instance.quantity)
@@ -39,7 +64,6 @@ class CartItemSerializer(serializers.ModelSerializer):
         Handles creation of new cart items or updating existing ones.
         Ensures product exists and item is linked to an active cart.
         """
-        user = self.context['request'].user
         product_id = validated_data.get('product_id')
         quantity = validated_data.get('quantity')
         
@@ -49,9 +73,8 @@ class CartItemSerializer(serializers.ModelSerializer):
             # Raise a validation error if the product is not found
             raise serializers.ValidationError({"product_id": "Product with this ID does not exist."})
         
-        # Get or create the user's active cart
-        # This mirrors the logic in CartItemViewSet's get_queryset and perform_create
-        cart, _ = Cart.objects.get_or_create(user=user, is_active=True)
+        # The view passes the active cart in; it's memoized on the request either way
+        cart = validated_data.get('cart') or active_cart(self.context['request'], create=True)
         
         # Check if this product already exists in the cart
         existing_item = CartItem.objects.filter(cart=cart, product=product).first()
@@ -75,6 +98,9 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'quantity', 'price', 'total_price']
         read_only_fields = ['price', 'total_price']
 
+    def get_fields(self):
+        return _sideload_product(self, super().get_fields())
+
     def get_total_price(self, obj):
         return obj.quantity * obj.price
 
@@ -84,14 +110,57 @@ class OrderItemSerializer(serializers.ModelSerializer):
 class CartSerializer(serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
     total_price = serializers.SerializerMethodField()
+    discount_amount = serializers.SerializerMethodField()
+    total_amount = serializers.SerializerMethodField()
+    promotions = serializers.SerializerMethodField()
+    coupon_error = serializers.SerializerMethodField()
 
     class Meta:
         model = Cart
-        fields = ['id', 'user', 'items', 'total_price', 'is_active', 'created_at', 'updated_at']
-        read_only_fields = ['user', 'is_active', 'created_at', 'updated_at']
+        fields = [
+            'id', 'user', 'items', 'total_price', 'coupon_code', 'coupon_error', 'promotions', 'discount_amount',
+            'total_amount', 'is_active', 'created_at', 'updated_at',
+        ]
+        read_only_fields = ['user', 'coupon_code', 'is_active', 'created_at', 'updated_at']
+
+    def to_representation(self, instance):
+        # Load the prices for every line in one lookup before the items render
+        items = list(instance.items.all())
+        prices = self.context.setdefault('active_prices', {})
+        prices.update(active_prices(item.product_id for item in items))
+        # Embedded products already carry their category; sideloaded items don't
+        self._evaluation = evaluate(
+            (
+                (
+                    item.product_id,
+                    item.product.category_id if 'product' in item._state.fields_cache else None,
+                    item.quantity,
+                    prices[item.product_id],
+                )
+                for item in items
+            ),
+            instance.coupon_code,
+        )
+        return super().to_representation(instance)
 
     def get_total_price(self, obj):
-        return sum(item.quantity * item.product.price for item in obj.items.all())
+        return sum(item.quantity * _active_price(self.context, item.product_id) for item in obj.items.all())
+
+    def get_discount_amount(self, obj):
+        return self._evaluation.discount
+
+    def get_total_amount(self, obj):
+        return self._evaluation.total
+
+    def get_promotions(self, obj):
+        return self._evaluation.promotions()
+
+    def get_coupon_error(self, obj):
+        return self._evaluation.coupon_error
+
+
+class CartCouponSerializer(serializers.Serializer):
+    code = serializers.CharField(max_length=40)
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -110,11 +179,118 @@ class OrderHistorySerializer(serializers.ModelSerializer):
     """
     items = OrderItemSerializer(many=True, read_only=True)
     total_price = serializers.SerializerMethodField() 
+    # The snapshot taken at checkout, so history never joins the address book
+    shipping_address = serializers.JSONField(source='shipping_snapshot', read_only=True)
     
     class Meta:
         model = Order
-        fields = ['id', 'items', 'total_price', 'status', 'created_at'] # Include total_price here
+        # total_price is after discount_amount
+        fields = ['id', 'items', 'discount_amount', 'total_price', 'shipping_address', 'status', 'created_at']
         
 
     def get_total_price(self, obj):
-        return sum(item.price * item.quantity for item in obj.items.all())
\ No newline at end of file
+        return sum(item.price * item.quantity for item in obj.items.all()) - obj.discount_amount
+
+
+class ArchivedOrderListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # Archived lines only hold product ids; load every product on the page in one query
+        orders = list(data.all() if hasattr(data, 'all') else data)
+        if not self.context.get('sideload'):
+            product_ids = {item['product'] for order in orders for item in order.items}
+            self.context['archived_products'] = Product.objects.select_related('category').in_bulk(product_ids)
+        return super().to_representation(orders)
+
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    """
+    Renders an archived order in the same shape as OrderHistorySerializer.
+    """
+    items = serializers.SerializerMethodField()
+    total_price = serializers.SerializerMethodField()
+    archived = serializers.SerializerMethodField()
+    shipping_address = serializers.JSONField(source='shipping_snapshot', read_only=True)
+
+    class Meta:
+        model = ArchivedOrder
+        fields = [
+            'id', 'items', 'discount_amount', 'total_price', 'shipping_address', 'status', 'created_at', 'archived',
+        ]
+        list_serializer_class = ArchivedOrderListSerializer
+
+    def _product(self, product_id):
+        if self.context.get('sideload'):
+            return product_id
+        product = self.context.get('archived_products', {}).get(product_id)
+        # The product may have been deleted since the order was archived
+        return ProductSerializer(product, context=self.context).data if product else None
+
+    def get_items(self, obj):
+        return [
+            {
+                'product': self._product(item['product']),
+                'quantity': item['quantity'],
+                'price': item['price'],
+                'total_price': Decimal(item['price']) * item['quantity'],
+            }
+            for item in obj.items
+        ]
+
+    def get_total_price(self, obj):
+        return sum(Decimal(item['price']) * item['quantity'] for item in obj.items) - obj.discount_amount
+
+    def get_archived(self, obj):
+        return True
+
+
+class OrderStatusEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderStatusEvent
+        fields = ['id', 'from_status', 'to_status', 'created_at']
+
+
+class OrderTransitionSerializer(serializers.Serializer):
+    order_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=10000
+    )
+    status = serializers.ChoiceField(choices=list(TRANSITIONS))
+
+
+class WishlistItemListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # Load the prices for the whole page in one lookup
+        items = list(data.all() if hasattr(data, 'all') else data)
+        self.context.setdefault('active_prices', {}).update(active_prices(item.product_id for item in items))
+        return super().to_representation(items)
+
+
+class WishlistItemSerializer(serializers.ModelSerializer):
+    """
+    A saved product with its current price and the price it was saved at
+    (or last alerted about).
+    """
+    product = ProductSerializer(read_only=True)
+    price = serializers.SerializerMethodField()
+
+    class Meta:
+        model = WishlistItem
+        fields = ['id', 'product', 'price', 'seen_price', 'added_at']
+        list_serializer_class = WishlistItemListSerializer
+
+    def get_fields(self):
+        return _sideload_product(self, super().get_fields())
+
+    def get_price(self, obj):
+        return _active_price(self.context, obj.product_id)
+
+
+class WishlistProductsSerializer(serializers.Serializer):
+    product_ids = serializers.ListField(
+        child=serializers.IntegerField(), max_length=500, required=False, allow_empty=False,
+    )
+
+
+class WishlistCartItemsSerializer(serializers.Serializer):
+    item_ids = serializers.ListField(
+        child=serializers.IntegerField(), max_length=500, required=False, allow_empty=False,
+    )
@@ -0,0 +1,40 @@
+from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from m_soko.outbox import track_model
+from .carts import forget_active_carts
+from .models import Cart, CartItem, Order, Payment, Promotion
+from .promotions import bump_index_version
+
+
+@receiver([post_save, post_delete], sender=CartItem)
+def cart_item_changed(sender, instance, origin=None, **kwargs):
+    # Items deleted along with their cart leave no cart to move on
+    if isinstance(origin, Cart) or getattr(origin, 'model', None) is Cart:
+        return
+    # Item edits count as a change to the cart, so its validators move on
+    Cart.objects.filter(pk=instance.cart_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Cart)
+def cart_saved(sender, instance, **kwargs):
+    # After commit, so a concurrent request can't re-remember the cart while it's still active
+    if not instance.is_active:
+        transaction.on_commit(lambda: forget_active_carts([instance.user_id]))
+
+
+@receiver(post_delete, sender=Cart)
+def cart_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: forget_active_carts([instance.user_id]))
+
+
+@receiver([post_save, post_delete], sender=Promotion)
+def promotion_changed(sender, instance, **kwargs):
+    # Every worker rebuilds its rule index on its next evaluation
+    transaction.on_commit(bump_index_version)
+
+
+track_model(Order, 'order')
+track_model(Payment, 'payment')
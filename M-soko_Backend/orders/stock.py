@@ -0,0 +1,122 @@
+"""
+Stock reservation for orders.
+
+Both operations are a single UPDATE over all the products involved, so a
+checkout or a bulk cancellation costs one statement regardless of how many
+lines it has. Location-tracked products are also taken from (and put back
+into) the stock locations the order was allocated to; see products.inventory.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When
+from django.utils import timezone
+
+from products.inventory import (
+    invalidate_availability, plan_allocation, release_levels, reserve_levels, sync_product_stock,
+)
+from m_soko.outbox import record_changes
+from products.models import Product
+from .models import OrderAllocation, OrderItem
+
+
+def _quantity_case(quantities):
+    return Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def reserve_stock(quantities):
+    """
+    Takes {product_id: quantity} out of stock, all or nothing. Each product is
+    only decremented if it still has enough stock; returns False (and changes
+    nothing, when run inside the caller's transaction and rolled back) if any
+    product came up short.
+    """
+    if not quantities:
+        return True
+    enough = reduce(or_, [Q(pk=product_id, stock__gte=quantity) for product_id, quantity in quantities.items()])
+    updated = Product.objects.filter(enough).update(
+        stock=F('stock') - _quantity_case(quantities), updated_at=timezone.now(),
+    )
+    record_changes('product', quantities)
+    return updated == len(quantities)
+
+
+def order_quantities(order_ids):
+    """
+    {product_id: total quantity} over the lines of the given orders.
+    """
+    rows = (
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .values('product_id')
+        .annotate(quantity=Sum('quantity'))
+        .order_by()
+    )
+    return {row['product_id']: row['quantity'] for row in rows}
+
+
+def release_stock(quantities):
+    """
+    Puts {product_id: quantity} back into stock.
+    """
+    if not quantities:
+        return
+    Product.objects.filter(pk__in=quantities).update(
+        stock=F('stock') + _quantity_case(quantities), updated_at=timezone.now(),
+    )
+    record_changes('product', quantities)
+
+
+def allocate_stock(quantities, address=None):
+    """
+    Reserves {product_id: quantity} for an order shipping to ``address``,
+    taking location-tracked products from the nearest locations that have
+    them. Must run inside the checkout transaction. Returns the allocation
+    plan ({(product_id, location_id): quantity}, empty when nothing is
+    location-tracked) or None if the order can't be filled; nothing is
+    changed in that case.
+    """
+    # The first plan comes from cached availability; if it's stale, re-plan from fresh rows once
+    for refresh in (False, True):
+        plan = plan_allocation(quantities, address, refresh=refresh)
+        if plan is None:
+            continue
+        savepoint = transaction.savepoint()
+        if reserve_levels(plan) and reserve_stock(quantities):
+            transaction.savepoint_commit(savepoint)
+            transaction.on_commit(lambda: invalidate_availability(quantities))
+            return plan
+        transaction.savepoint_rollback(savepoint)
+    return None
+
+
+def save_allocation(order, plan):
+    OrderAllocation.objects.bulk_create([
+        OrderAllocation(order=order, product_id=product_id, location_id=location_id, quantity=quantity)
+        for (product_id, location_id), quantity in plan.items()
+    ])
+
+
+def release_orders(order_ids):
+    """
+    Puts back everything the given orders reserved: Product.stock for every
+    line and the stock levels of the locations they were allocated to.
+    """
+    quantities = order_quantities(order_ids)
+    release_stock(quantities)
+    rows = (
+        OrderAllocation.objects.filter(order_id__in=order_ids)
+        .values('product_id', 'location_id')
+        .annotate(quantity=Sum('quantity'))
+        .order_by()
+    )
+    released = {(row['product_id'], row['location_id']): row['quantity'] for row in rows}
+    release_levels(released)
+    if released:
+        # A location deactivated since checkout takes the stock back without adding it to the total
+        sync_product_stock({product_id for product_id, _ in released})
+    transaction.on_commit(lambda: invalidate_availability(quantities))
@@ -1,3 +1,542 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.http import HttpRequest
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from analytics.models import DailyProductSales, DailyUserSales
+from analytics.rollups import record_orders
+from products.models import Category, PriceSchedule, Product, StockLevel, StockLocation
+from . import abandoned, promotions, retention, wishlist
+from .carts import active_cart, active_cart_id
+from .lifecycle import transition
+from .models import (
+    AbandonedCartNotice, ArchivedOrder, Cart, CartItem, Order, OrderAllocation, OrderItem, OrderStatusEvent, Payment,
+    Promotion, PromotionRedemption, WishlistAlert, WishlistItem,
+)
+from .promotions import bump_index_version
+from .stock import allocate_stock, release_orders, save_allocation
+
+
+class AbandonedCartTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('shopper', 'shopper@example.com', 'pw')
+        category = Category.objects.create(name='Shoes')
+        self.product = Product.objects.create(name='Runner', description='d', price=100, stock=5, category=category)
+        self.cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=2)
+        stale = timezone.now() - timedelta(hours=48)
+        Cart.objects.filter(pk=self.cart.pk).update(updated_at=stale)
+
+    def test_cart_values_use_the_active_price(self):
+        PriceSchedule.objects.create(product=self.product, price=80, starts_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(abandoned.cart_values([self.cart.pk]), {self.cart.pk: (2, 160)})
+
+    def test_notice_is_queued_once_and_sent(self):
+        self.assertEqual(abandoned.detect_abandoned_carts(after_hours=24), (1, 1))
+        self.assertEqual(abandoned.detect_abandoned_carts(after_hours=24), (1, 0))
+        self.assertEqual(abandoned.send_notices(), {'sent': 1})
+        self.assertEqual(len(mail.outbox), 1)
+        notice = AbandonedCartNotice.objects.get()
+        self.assertEqual((notice.status, notice.value), ('sent', 200))
+
+    def test_changed_cart_is_skipped(self):
+        abandoned.detect_abandoned_carts(after_hours=24)
+        CartItem.objects.filter(cart=self.cart).update(quantity=3)
+        Cart.objects.filter(pk=self.cart.pk).update(updated_at=timezone.now())
+        self.assertEqual(abandoned.send_notices(), {'skipped': 1})
+        self.assertEqual(len(mail.outbox), 0)
+
+
+class OrderTimelineTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('shopper', 'shopper@example.com', 'pw')
+        self.order = Order.objects.create(user=self.user, total_amount=10)
+        OrderStatusEvent.objects.create(order=self.order, to_status='Pending', actor=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_own_order(self):
+        response = self.client.get(f'/api/orders/{self.order.pk}/events/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([event['to_status'] for event in response.json()], ['Pending'])
+
+    def test_missing_or_foreign_order_is_not_found(self):
+        other = get_user_model().objects.create_user('other', 'other@example.com', 'pw')
+        foreign = Order.objects.create(user=other, total_amount=10)
+        for pk in (foreign.pk, foreign.pk + 100):
+            self.assertEqual(self.client.get(f'/api/orders/{pk}/events/').status_code, 404)
+
+
+class OrderAdminTests(TestCase):
+    def setUp(self):
+        admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin)
+        category = Category.objects.create(name='Shoes')
+        self.product = Product.objects.create(name='Runner', description='d', price=50, stock=5, category=category)
+        self.order = Order.objects.create(user=admin, cart=Cart.objects.create(user=admin), total_amount=100)
+        OrderItem.objects.create(order=self.order, product=self.product, quantity=2, price=50)
+        record_orders([self.order.pk])
+        self.url = f'/admin/orders/order/{self.order.pk}/change/'
+
+    def post_change(self, quantity):
+        """
+        Posts the change form back as rendered, with the one order line set to ``quantity``.
+        """
+        response = self.client.get(self.url)
+        data = {
+            field.html_name: field.value() if field.value() is not None else ''
+            for field in response.context['adminform'].form
+        }
+        for inline in response.context['inline_admin_formsets']:
+            formset = inline.formset
+            # Only the existing rows go back; the blank extra forms are left out
+            data.update({
+                f'{formset.prefix}-TOTAL_FORMS': formset.initial_form_count(),
+                f'{formset.prefix}-INITIAL_FORMS': formset.initial_form_count(),
+            })
+            for form in formset.initial_forms:
+                for field in form:
+                    data[field.html_name] = field.value() if field.value() is not None else ''
+        item = OrderItem.objects.get(order=self.order)
+        prefix = next(
+            inline.formset.prefix for inline in response.context['inline_admin_formsets']
+            if inline.formset.model is OrderItem
+        )
+        self.assertEqual(data[f'{prefix}-0-id'], item.pk)
+        data[f'{prefix}-0-quantity'] = quantity
+        return self.client.post(self.url, data)
+
+    def product_units(self):
+        return DailyProductSales.objects.get(product=self.product).units
+
+    def test_editing_lines_keeps_rollups_in_step(self):
+        self.assertEqual(self.post_change(3).status_code, 302)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, 150)
+        self.assertEqual(self.product_units(), 3)
+
+    def test_editing_a_cancelled_order_leaves_rollups_alone(self):
+        transition([self.order.pk], 'Cancelled')
+        self.assertEqual(self.product_units(), 0)
+        self.assertEqual(self.post_change(3).status_code, 302)
+        self.assertEqual(self.product_units(), 0)
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('shopper', 'shopper@example.com', 'pw')
+        category = Category.objects.create(name='Shoes')
+        self.product = Product.objects.create(name='Runner', description='d', price=50, stock=5, category=category)
+
+    def test_archive_keeps_everything_hanging_off_the_order(self):
+        location = StockLocation.objects.create(name='Depot', code='depot', city='Nairobi', country='Kenya')
+        promotion = Promotion.objects.create(name='Tenner', kind='fixed', value=10)
+        order = Order.objects.create(user=self.user, status='Delivered', total_amount=90, discount_amount=10)
+        OrderItem.objects.create(order=order, product=self.product, quantity=2, price=50)
+        OrderAllocation.objects.create(order=order, product=self.product, location=location, quantity=2)
+        OrderStatusEvent.objects.create(order=order, to_status='Pending', actor=self.user)
+        OrderStatusEvent.objects.create(order=order, from_status='Pending', to_status='Delivered')
+        Payment.objects.create(order=order, payment_method='Mpesa', amount=90, transaction_id='TX1', status='Completed')
+        PromotionRedemption.objects.create(order=order, promotion=promotion, amount=10)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=400))
+
+        self.assertEqual(retention.archive_orders(retention.archive_cutoff(months=6)), 1)
+        self.assertFalse(Order.objects.exists())
+        archived = ArchivedOrder.objects.get(pk=order.pk)
+        self.assertEqual(archived.items, [{'product': self.product.pk, 'quantity': 2, 'price': '50.00'}])
+        self.assertEqual(
+            (archived.payment['method'], archived.payment['amount'], archived.payment['transaction_id']),
+            ('Mpesa', '90.00', 'TX1'),
+        )
+        self.assertEqual([event['to_status'] for event in archived.status_events], ['Pending', 'Delivered'])
+        self.assertEqual(archived.status_events[0]['actor'], self.user.pk)
+        self.assertEqual(archived.allocations, [{'product': self.product.pk, 'location': location.pk, 'quantity': 2}])
+        self.assertEqual(
+            [(r['promotion'], r['amount']) for r in archived.redemptions], [(promotion.pk, '10.00')],
+        )
+
+    def test_recent_and_open_orders_stay(self):
+        Order.objects.create(user=self.user, status='Delivered', total_amount=10)
+        old = Order.objects.create(user=self.user, status='Shipped', total_amount=10)
+        Order.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=400))
+        self.assertEqual(retention.archive_orders(retention.archive_cutoff(months=6)), 0)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_purge_carts(self):
+        converted = Cart.objects.create(user=self.user, is_active=False)
+        CartItem.objects.create(cart=converted, product=self.product)
+        order = Order.objects.create(user=self.user, cart=converted, total_amount=10)
+        kept = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=kept, product=self.product)
+        Cart.objects.filter(pk=converted.pk).update(updated_at=timezone.now() - timedelta(days=400))
+
+        self.assertEqual(retention.purge_carts(retention.expired_carts()), 1)
+        self.assertEqual(list(Cart.objects.values_list('pk', flat=True)), [kept.pk])
+        self.assertEqual(CartItem.objects.count(), 1)
+        order.refresh_from_db()
+        self.assertIsNone(order.cart_id)
+
+
+class ActiveCartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user('shopper', 'shopper@example.com', 'pw')
+        self.cart = Cart.objects.create(user=self.user)
+
+    def request(self):
+        request = HttpRequest()
+        request.user = self.user
+        return request
+
+    def test_lookup_is_memoized_per_request_and_remembered_across_them(self):
+        request = self.request()
+        with self.assertNumQueries(2):
+            self.assertEqual(active_cart(request), self.cart)
+            self.assertEqual(active_cart_id(request), self.cart.pk)
+            self.assertEqual(active_cart(request), self.cart)
+        # The next request knows the id without asking Cart for it
+        with self.assertNumQueries(0):
+            self.assertEqual(active_cart_id(self.request()), self.cart.pk)
+
+    def test_checked_out_cart_is_forgotten(self):
+        active_cart_id(self.request())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cart.is_active = False
+            self.cart.save()
+        self.assertIsNone(active_cart_id(self.request()))
+        created = active_cart(self.request(), create=True)
+        self.assertNotEqual(created.pk, self.cart.pk)
+        self.assertEqual(active_cart_id(self.request()), created.pk)
+
+    def test_stale_remembered_id_is_dropped(self):
+        active_cart_id(self.request())
+        # A bulk UPDATE skips the signals, like a worker with its own cache would
+        Cart.objects.filter(pk=self.cart.pk).update(is_active=False)
+        request = self.request()
+        self.assertIsNone(active_cart(request))
+        self.assertIsNone(active_cart_id(request))
+        self.assertIsNone(active_cart_id(self.request()))
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('shopper', 'shopper@example.com', 'pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Shoes')
+        self.shoe = Product.objects.create(name='Runner', description='d', price=100, stock=5, category=category)
+        self.sock = Product.objects.create(name='Sock', description='d', price=10, stock=5, category=category)
+        self.client.post('/api/orders/cart-items/', {'product_id': self.shoe.pk, 'quantity': 2})
+        self.client.post('/api/orders/cart-items/', {'product_id': self.sock.pk, 'quantity': 1})
+
+    def promotions(self, *promotions):
+        created = [Promotion.objects.create(**fields) for fields in promotions]
+        # The index is rebuilt on commit, which never comes inside a test case
+        bump_index_version()
+        return created
+
+    def checkout(self, **data):
+        return self.client.post('/api/checkout/', data)
+
+    def test_totals_and_stock(self):
+        response = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(user=self.user)
+        self.assertEqual((order.total_amount, order.discount_amount), (210, 0))
+        self.assertEqual(
+            sorted(order.items.values_list('product__name', 'quantity', 'price')),
+            [('Runner', 2, 100), ('Sock', 1, 10)],
+        )
+        self.shoe.refresh_from_db()
+        self.assertEqual(self.shoe.stock, 3)
+        self.assertFalse(Cart.objects.get(pk=order.cart_id).is_active)
+        self.assertEqual(self.checkout().status_code, 404)
+
+    def test_discounts_are_recorded(self):
+        shoe_sale, cart_wide = self.promotions(
+            {'name': '10% off runners', 'kind': 'percent', 'value': 10, 'product': self.shoe},
+            {'name': '5 off over 150', 'kind': 'fixed', 'value': 5, 'min_subtotal': 150},
+        )
+        self.assertEqual(self.checkout().status_code, 201)
+        order = Order.objects.get(user=self.user)
+        # 20 off the runners, then 5 off the 190 left
+        self.assertEqual((order.total_amount, order.discount_amount), (185, 25))
+        self.assertEqual(
+            sorted(order.redemptions.values_list('promotion_id', 'amount')), [(shoe_sale.pk, 20), (cart_wide.pk, 5)],
+        )
+        shoe_sale.refresh_from_db()
+        self.assertEqual(shoe_sale.redemption_count, 1)
+
+    def test_invalid_coupon_blocks_checkout(self):
+        response = self.checkout(coupon='NOPE')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.shoe.refresh_from_db()
+        self.assertEqual(self.shoe.stock, 5)
+
+    def test_used_up_coupon_blocks_checkout(self):
+        coupon, = self.promotions(
+            {'name': 'Once', 'code': 'ONCE', 'kind': 'fixed', 'value': 15, 'max_redemptions': 1},
+        )
+        Promotion.objects.filter(pk=coupon.pk).update(redemption_count=1)
+        self.assertEqual(self.checkout(coupon='once').status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_beaten_coupon_is_reported_not_blocking(self):
+        sale, coupon = self.promotions(
+            {'name': 'Half off runners', 'kind': 'percent', 'value': 50, 'product': self.shoe},
+            {'name': 'Runner coupon', 'code': 'RUN5', 'kind': 'fixed', 'value': 5, 'product': self.shoe},
+        )
+        response = self.checkout(coupon='RUN5')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['coupon_error'], "This coupon doesn't apply to your cart.")
+        order = Order.objects.get(user=self.user)
+        self.assertEqual((order.total_amount, order.discount_amount), (110, 100))
+        self.assertEqual(list(order.redemptions.values_list('promotion_id', flat=True)), [sale.pk])
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.redemption_count, 0)
+
+
+class StockAllocationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Shoes')
+        self.shoe = Product.objects.create(name='Runner', description='d', price=100, stock=0, category=category)
+        self.near = StockLocation.objects.create(name='Near', code='near', city='Nairobi', country='Kenya', priority=1)
+        self.far = StockLocation.objects.create(name='Far', code='far', city='Mombasa', country='Kenya', priority=2)
+        self.closed = StockLocation.objects.create(
+            name='Closed', code='closed', city='Kisumu', country='Kenya', priority=0, is_active=False,
+        )
+        for location, quantity in ((self.near, 1), (self.far, 2), (self.closed, 10)):
+            StockLevel.objects.create(product=self.shoe, location=location, quantity=quantity)
+
+    def levels(self):
+        return dict(StockLevel.objects.filter(product=self.shoe).values_list('location__code', 'quantity'))
+
+    def stock(self):
+        self.shoe.refresh_from_db()
+        return self.shoe.stock
+
+    def test_stock_only_counts_active_locations(self):
+        self.assertEqual(self.stock(), 3)
+        self.closed.is_active = True
+        self.closed.save()
+        self.assertEqual(self.stock(), 13)
+        self.closed.is_active = False
+        self.closed.save()
+        self.assertEqual(self.stock(), 3)
+
+    def test_order_is_split_across_active_locations(self):
+        plan = allocate_stock({self.shoe.pk: 3})
+        self.assertEqual(plan, {(self.shoe.pk, self.near.pk): 1, (self.shoe.pk, self.far.pk): 2})
+        self.assertEqual(self.levels(), {'near': 0, 'far': 0, 'closed': 10})
+        self.assertEqual(self.stock(), 0)
+        # The inactive location's stock can't fill the next order
+        self.assertIsNone(allocate_stock({self.shoe.pk: 1}))
+
+    def test_release_to_a_deactivated_location_keeps_the_total(self):
+        user = get_user_model().objects.create_user('shopper', 'shopper@example.com', 'pw')
+        order = Order.objects.create(user=user, total_amount=200)
+        OrderItem.objects.create(order=order, product=self.shoe, quantity=2, price=100)
+        save_allocation(order, allocate_stock({self.shoe.pk: 2}))
+        self.assertEqual(self.stock(), 1)
+        self.far.is_active = False
+        self.far.save()
+        release_orders([order.pk])
+        self.assertEqual(self.levels()['far'], 2)
+        self.assertEqual(self.stock(), 1)
+
+
+class OrderHistorySideloadTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('shopper', 'shopper@example.com', 'pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Shoes')
+        self.shoe = Product.objects.create(name='Runner', description='d', price=100, stock=5, category=category)
+        self.sock = Product.objects.create(name='Sock', description='d', price=10, stock=5, category=category)
+        for _ in range(3):
+            order = Order.objects.create(user=self.user, total_amount=110)
+            OrderItem.objects.create(order=order, product=self.shoe, quantity=1, price=100)
+            OrderItem.objects.create(order=order, product=self.sock, quantity=1, price=10)
+
+    def test_products_are_included_once(self):
+        payload = self.client.get('/api/orders/history/', {'sideload': 1}).json()
+        self.assertEqual(len(payload['results']), 3)
+        items = [item for order in payload['results'] for item in order['items']]
+        self.assertEqual(sorted({item['product'] for item in items}), sorted([self.shoe.pk, self.sock.pk]))
+        self.assertEqual(sorted(payload['included']['products']), sorted([str(self.shoe.pk), str(self.sock.pk)]))
+        self.assertEqual(len(payload['included']['categories']), 1)
+
+    def test_embedded_format_is_unchanged(self):
+        orders = self.client.get('/api/orders/history/').json()
+        self.assertEqual(len(orders), 3)
+        self.assertEqual(
+            sorted(item['product']['name'] for item in orders[0]['items']), ['Runner', 'Sock'],
+        )
+
+
+class PromotionClaimTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Shoes')
+        self.product = Product.objects.create(name='Runner', description='d', price=100, stock=5, category=category)
+        self.promotion = Promotion.objects.create(
+            name='Tenner', kind='fixed', value=10, product=self.product, max_redemptions=5,
+        )
+        bump_index_version()
+        self.lines = [(self.product.pk, None, 1, Decimal('100.00'))]
+
+    def test_claim_retries_when_a_concurrent_claim_was_rolled_back(self):
+        evaluation = promotions.evaluate(self.lines)
+        claimable = promotions._claimable
+        calls = []
+
+        def busy_once():
+            calls.append(1)
+            # The first claim comes up short, as if another checkout held the last redemption for a moment
+            return claimable().none() if len(calls) == 1 else claimable()
+
+        with mock.patch.object(promotions, '_claimable', busy_once):
+            self.assertEqual(promotions._claim(evaluation), set())
+        self.assertEqual(len(calls), 3)
+        self.promotion.refresh_from_db()
+        self.assertEqual(self.promotion.redemption_count, 1)
+
+    def test_exhausted_promotion_is_priced_out(self):
+        # This worker's index is built before another one uses up the promotion
+        evaluation = promotions.evaluate(self.lines)
+        Promotion.objects.filter(pk=self.promotion.pk).update(redemption_count=5)
+        self.assertEqual(promotions._claim(evaluation), {self.promotion.pk})
+        evaluation = promotions.redeem_promotions(self.lines)
+        self.assertEqual((evaluation.discount, evaluation.applied), (0, {}))
+        self.promotion.refresh_from_db()
+        self.assertEqual(self.promotion.redemption_count, 5)
+
+
+class OrderLifecycleTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('shopper', 'shopper@example.com', 'pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Shoes')
+        self.product = Product.objects.create(name='Runner', description='d', price=100, stock=5, category=category)
+        self.client.post('/api/orders/cart-items/', {'product_id': self.product.pk, 'quantity': 2})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post('/api/checkout/', {}).status_code, 201)
+        self.order = Order.objects.get(user=self.user)
+
+    def units_sold(self):
+        return DailyProductSales.objects.get(product=self.product).units
+
+    def test_checkout_feeds_the_rollups(self):
+        self.assertEqual(self.units_sold(), 2)
+        self.assertEqual(DailyProductSales.objects.get(product=self.product).revenue, 200)
+
+    def test_rollup_revenue_is_net_of_discounts(self):
+        sock = Product.objects.create(name='Sock', description='d', price=40, stock=5, category=self.product.category)
+        order = Order.objects.create(user=self.user, total_amount=90, discount_amount=10)
+        OrderItem.objects.create(order=order, product=self.product, quantity=2, price=30)
+        OrderItem.objects.create(order=order, product=sock, quantity=1, price=40)
+        record_orders([order.pk])
+        self.assertEqual(DailyProductSales.objects.get(product=self.product).revenue, 254)
+        self.assertEqual(DailyProductSales.objects.get(product=sock).revenue, 36)
+        self.assertEqual(DailyUserSales.objects.get(user=self.user).revenue, 290)
+
+    def test_transitions_follow_the_lifecycle(self):
+        for status in ('Processing', 'Shipped', 'Delivered'):
+            self.assertEqual(transition([self.order.pk], status).changed, [self.order.pk])
+        result = transition([self.order.pk, self.order.pk + 100], 'Cancelled')
+        self.assertEqual((result.changed, result.skipped), ([], [self.order.pk, self.order.pk + 100]))
+        self.assertEqual(
+            list(self.order.status_events.values_list('from_status', 'to_status')),
+            [('', 'Pending'), ('Pending', 'Processing'), ('Processing', 'Shipped'), ('Shipped', 'Delivered')],
+        )
+        self.assertEqual(self.units_sold(), 2)
+
+    def test_customer_cancel_restocks_and_leaves_the_rollups(self):
+        response = self.client.post(f'/api/orders/{self.order.pk}/cancel/')
+        self.assertEqual(response.status_code, 200)
+        self.order.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.stock_reserved), ('Cancelled', False))
+        self.assertEqual(self.product.stock, 5)
+        self.assertEqual(self.units_sold(), 0)
+        self.assertEqual(self.client.post(f'/api/orders/{self.order.pk}/cancel/').status_code, 409)
+
+    def test_staff_bulk_transition(self):
+        staff = get_user_model().objects.create_user('staff', 'staff@example.com', 'pw', is_staff=True)
+        self.client.force_authenticate(staff)
+        response = self.client.post(
+            '/api/orders/transitions/', {'order_ids': [self.order.pk], 'status': 'Shipped'}, format='json',
+        )
+        self.assertEqual(response.json(), {'changed': 0, 'skipped': [self.order.pk]})
+        response = self.client.post(
+            '/api/orders/transitions/', {'order_ids': [self.order.pk], 'status': 'Processing'}, format='json',
+        )
+        self.assertEqual(response.json(), {'changed': 1, 'skipped': []})
+        self.assertEqual(self.order.status_events.last().actor, staff)
+
+
+class WishlistTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('shopper', 'shopper@example.com', 'pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Shoes')
+        self.shoe = Product.objects.create(name='Runner', description='d', price=100, stock=5, category=category)
+        self.sock = Product.objects.create(name='Sock', description='d', price=10, stock=0, category=category)
+
+    def save(self, *products):
+        return self.client.post('/api/orders/wishlist/', {'product_ids': [product.pk for product in products]})
+
+    def test_saving_twice_keeps_one_row_and_the_first_snapshot(self):
+        self.assertEqual(self.save(self.shoe).status_code, 201)
+        self.shoe.price = 80
+        self.shoe.save()
+        self.assertEqual(self.save(self.shoe, self.shoe).json(), {'saved': 1})
+        item = WishlistItem.objects.get(user=self.user)
+        self.assertEqual((item.product_id, item.seen_price), (self.shoe.pk, 100))
+
+    def test_unknown_products_are_reported(self):
+        self.save(self.shoe)
+        response = self.client.post('/api/orders/wishlist/', {'product_ids': [self.sock.pk, 999999]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['unknown'], [999999])
+        self.assertEqual(WishlistItem.objects.filter(user=self.user).count(), 2)
+
+    def test_moves_between_cart_and_wishlist(self):
+        self.client.post('/api/orders/cart-items/', {'product_id': self.shoe.pk, 'quantity': 2})
+        self.save(self.shoe, self.sock)
+        self.assertEqual(self.client.post('/api/orders/wishlist/move-to-cart/', {}).json(), {'moved': 2})
+        self.assertFalse(WishlistItem.objects.exists())
+        # The runner already in the cart keeps its quantity
+        self.assertEqual(
+            sorted(CartItem.objects.values_list('product__name', 'quantity')), [('Runner', 2), ('Sock', 1)],
+        )
+        self.assertEqual(self.client.post('/api/orders/wishlist/move-from-cart/', {}).json(), {'moved': 2})
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(WishlistItem.objects.count(), 2)
+
+    def test_price_drops_and_restocks_are_mailed_once(self):
+        self.save(self.shoe, self.sock)
+        # save() rather than update(), so the cached active price is invalidated
+        self.shoe.price = 80
+        self.shoe.save()
+        Product.objects.filter(pk=self.sock.pk).update(stock=3)
+        self.assertEqual(wishlist.detect_wishlist_changes(), (2, 2))
+        self.assertEqual(wishlist.detect_wishlist_changes(), (2, 0))
+        self.assertEqual(
+            sorted(WishlistAlert.objects.values_list('kind', flat=True)), ['back_in_stock', 'price_drop'],
+        )
 
-# Create your tests here.
+        self.assertEqual(wishlist.send_alerts(), {'sent': 2})
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Runner dropped from 100.00 to 80.00', mail.outbox[0].body)
+        self.assertEqual(wishlist.send_alerts(), {})
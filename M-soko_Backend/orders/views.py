@@ -1,15 +1,49 @@
-from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework import generics
 from django.db import transaction
-from .models import Cart, CartItem, Order, OrderItem
-from .serializers import CartSerializer, CartItemSerializer, OrderHistorySerializer
+from django.db.models import Count, Max
+from django.utils import timezone
+from analytics.rollups import record_orders
+from products.models import Product
+from products.pricing import active_prices
+from products.recommendations import record_order as record_related_products
+from products.sideload import SideloadListMixin, sideload_requested
+from m_soko.conditional import ConditionalGetMixin
+from users.addresses import address_snapshot, default_address, user_address
+from .carts import active_cart, active_cart_id, forget_request_cart
+from .lifecycle import transition
+from .promotions import PromotionError, normalize_code, record_redemptions, redeem_promotions, rule_index
+from .models import ArchivedOrder, Cart, CartItem, Order, OrderItem, OrderStatusEvent, WishlistItem
+from .serializers import (
+    ArchivedOrderSerializer, CartCouponSerializer, CartSerializer, CartItemSerializer, OrderHistorySerializer,
+    OrderStatusEventSerializer, OrderTransitionSerializer, WishlistCartItemsSerializer,
+    WishlistItemSerializer, WishlistProductsSerializer,
+)
+from .stock import allocate_stock, save_allocation
+from . import wishlist
 from rest_framework.mixins import DestroyModelMixin, ListModelMixin, RetrieveModelMixin
 
-class CartViewSet(viewsets.ReadOnlyModelViewSet):
+class ActiveCartValidatorsMixin(ConditionalGetMixin):
+    """
+    Validators for the user's active cart: the cart's own timestamp (moved by
+    item changes), the newest timestamp of the products it embeds and the
+    promotions in effect.
+    """
+    cache_scope = 'private'
+
+    def get_validators(self, detail):
+        stats = Cart.objects.filter(pk=active_cart_id(self.request), is_active=True).aggregate(
+            cart=Max('updated_at'), products=Max('items__product__updated_at'), count=Count('items'),
+        )
+        last_modified = max(filter(None, [stats['cart'], stats['products']]), default=None)
+        return (stats['cart'], stats['products'], stats['count'], rule_index().stamp()), last_modified
+
+class CartViewSet(ActiveCartValidatorsMixin, SideloadListMixin, viewsets.ReadOnlyModelViewSet):
     """
     A viewset for viewing and creating a user's cart.
     """
@@ -17,9 +51,39 @@ class CartViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user, is_active=True)
+        carts = Cart.objects.filter(pk=active_cart_id(self.request), is_active=True)
+        if sideload_requested(self.request):
+            return carts.prefetch_related('items')
+        return carts.prefetch_related('items__product__category')
 
-class CartItemViewSet(viewsets.ModelViewSet):
+    def get_sideload_ids(self, objects):
+        return {'product_ids': {item.product_id for cart in objects for item in cart.items.all()}}
+
+    @action(detail=False, methods=['post', 'delete'])
+    def coupon(self, request):
+        """
+        Enters a coupon code on the active cart (POST {"code"}), or removes it (DELETE).
+        """
+        cart = active_cart(request)
+        if cart is None:
+            return Response({'detail': 'No active cart found for this user.'}, status=status.HTTP_404_NOT_FOUND)
+        if request.method == 'DELETE':
+            cart.coupon_code = ''
+            cart.save(update_fields=['coupon_code', 'updated_at'])
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        serializer = CartCouponSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        code = normalize_code(serializer.validated_data['code'])
+        coupon = rule_index().coupons.get(code)
+        if coupon is None or not coupon.is_live(timezone.now()):
+            return Response({'code': ['This coupon is not valid.']}, status=status.HTTP_400_BAD_REQUEST)
+        cart.coupon_code = code
+        cart.save(update_fields=['coupon_code', 'updated_at'])
+        cart = Cart.objects.prefetch_related('items__product__category').get(pk=cart.pk)
+        return Response(self.get_serializer(cart).data, status=status.HTTP_200_OK)
+
+class CartItemViewSet(ActiveCartValidatorsMixin, SideloadListMixin, viewsets.ModelViewSet):
     """
     A viewset for managing items in a user's cart.
     """
@@ -29,14 +93,24 @@ class CartItemViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         # Ensure we only work with the current user's cart items
         if self.request.user.is_authenticated:
-            cart, created = Cart.objects.get_or_create(user=self.request.user, is_active=True)
-            return CartItem.objects.filter(cart=cart)
+            # Reads never create a cart; one is made when the first item is added
+            cart_id = active_cart_id(self.request)
+            if cart_id is None:
+                return CartItem.objects.none()
+            # The id comes from the cache, which may not have heard the cart was checked out yet
+            items = CartItem.objects.filter(cart_id=cart_id, cart__is_active=True)
+            if sideload_requested(self.request):
+                return items
+            return items.select_related('product__category')
         return CartItem.objects.none()
 
+    def get_sideload_ids(self, objects):
+        return {'product_ids': {item.product_id for item in objects}}
+
     # 👇 FIX: Add this method to link the new item to the user's cart
     def perform_create(self, serializer):
         # Find or create the user's active cart
-        cart, created = Cart.objects.get_or_create(user=self.request.user, is_active=True)
+        cart = active_cart(self.request, create=True)
         # Save the new cart item with the correct cart foreign key
         serializer.save(cart=cart)
         
@@ -48,39 +122,93 @@ class CheckoutView(generics.CreateAPIView):
         
         try:
             # 1. Get the user's active cart
-            cart = get_object_or_404(Cart, user=user, is_active=True)
+            cart = active_cart(request)
+            if cart is None:
+                return Response(
+                    {'detail': 'No active cart found for this user.'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
 
-            if not cart.items.exists():
+            cart_items = list(cart.items.all())
+            if not cart_items:
                 return Response({'detail': 'Your cart is empty.'}, status=status.HTTP_400_BAD_REQUEST)
 
+            # Price every line from the active-price map (honours scheduled sales)
+            prices = active_prices(item.product_id for item in cart_items)
+            quantities = {}
+            for item in cart_items:
+                quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+
+            # Ship to the chosen address, or the default one; it decides which locations fulfil the order
+            address_id = request.data.get('shipping_address')
+            if address_id is not None:
+                address = user_address(request, int(address_id)) if str(address_id).isdigit() else None
+                if address is None:
+                    return Response({'detail': 'Unknown shipping address.'}, status=status.HTTP_400_BAD_REQUEST)
+            else:
+                address = default_address(request)
+
             with transaction.atomic():
+                # Take the items out of stock first; a short line rolls everything back
+                plan = allocate_stock(quantities, address)
+                if plan is None:
+                    transaction.set_rollback(True)
+                    return Response(
+                        {'detail': 'Some items in your cart are out of stock.'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+
+                # Discounts, with redemption limits counted in this transaction
+                try:
+                    evaluation = redeem_promotions(
+                        ((item.product_id, None, item.quantity, prices[item.product_id]) for item in cart_items),
+                        request.data.get('coupon', cart.coupon_code),
+                    )
+                except PromotionError as e:
+                    transaction.set_rollback(True)
+                    return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
                 # 2. Create a new order for the user
-                new_order = Order.objects.create(user=user)
+                new_order = Order.objects.create(
+                    user=user,
+                    cart=cart,
+                    shipping_address=address,
+                    shipping_snapshot=address_snapshot(address),
+                    total_amount=evaluation.total,
+                    discount_amount=evaluation.discount,
+                    stock_reserved=True,
+                )
+                record_redemptions(new_order, evaluation)
+                OrderStatusEvent.objects.create(order=new_order, to_status=new_order.status, actor=user)
+                save_allocation(new_order, plan)
 
                 # 3. Move cart items to the new order as order items
-                for cart_item in cart.items.all():
-                    OrderItem.objects.create(
+                OrderItem.objects.bulk_create([
+                    OrderItem(
                         order=new_order,
-                        product=cart_item.product,
+                        product_id=cart_item.product_id,
                         quantity=cart_item.quantity,
-                        price=cart_item.product.price # Save the price at the time of purchase
+                        price=prices[cart_item.product_id] # Save the price at the time of purchase
                     )
+                    for cart_item in cart_items
+                ])
                 
+                # Feed the sales rollups once the order is committed
+                transaction.on_commit(lambda: record_orders([new_order.pk]))
+                transaction.on_commit(lambda: record_related_products(new_order.pk))
+
                 # 4. Deactivate the old cart
                 cart.is_active = False
                 cart.save()
+                forget_request_cart(request)
 
                 # 5. Return success response
-                return Response(
-                    {'detail': 'Checkout successful! Your order has been placed.'},
-                    status=status.HTTP_201_CREATED
-                )
+                data = {'detail': 'Checkout successful! Your order has been placed.'}
+                if evaluation.coupon_error:
+                    # The coupon was valid but the order got a better discount without it
+                    data['coupon_error'] = evaluation.coupon_error
+                return Response(data, status=status.HTTP_201_CREATED)
 
-        except Cart.DoesNotExist:
-            return Response(
-                {'detail': 'No active cart found for this user.'},
-                status=status.HTTP_404_NOT_FOUND
-            )
         except Exception as e:
             # Catch any other unexpected errors during the process
             print(f"Checkout error: {e}")
@@ -90,10 +218,154 @@ class CheckoutView(generics.CreateAPIView):
             )
         
 
-class OrderHistoryView(generics.ListAPIView):
-    # ... (rest of your OrderHistoryView)
+class OrderHistoryView(ConditionalGetMixin, SideloadListMixin, generics.ListAPIView):
+    """
+    The user's orders, newest first. ``?archived=1`` lists the orders that
+    have been moved to the archive table instead (see orders.retention).
+    """
     serializer_class = OrderHistorySerializer
     permission_classes = [IsAuthenticated]
+    cache_scope = 'private'
+
+    def archived_requested(self):
+        return self.request.query_params.get('archived', '').lower() in ('1', 'true', 'yes')
+
+    def get_serializer_class(self):
+        if self.archived_requested():
+            return ArchivedOrderSerializer
+        return super().get_serializer_class()
+
+    def get_queryset(self):
+        if self.archived_requested():
+            return ArchivedOrder.objects.filter(user=self.request.user)
+        orders = Order.objects.filter(user=self.request.user).order_by('-created_at')
+        if sideload_requested(self.request):
+            return orders.prefetch_related('items')
+        return orders.prefetch_related('items__product__category')
+
+    def get_sideload_ids(self, objects):
+        if self.archived_requested():
+            return {'product_ids': {item['product'] for order in objects for item in order.items}}
+        return {'product_ids': {item.product_id for order in objects for item in order.items.all()}}
+
+    def get_validators(self, detail):
+        if self.archived_requested():
+            # Archived rows never change, but the products they embed can
+            archived = ArchivedOrder.objects.filter(user=self.request.user)
+            stats = archived.aggregate(orders=Max('archived_at'), count=Count('id'))
+            product_ids = {item['product'] for items in archived.values_list('items', flat=True) for item in items}
+            stats['products'] = Product.objects.filter(pk__in=product_ids).aggregate(last=Max('updated_at'))['last']
+        else:
+            stats = Order.objects.filter(user=self.request.user).aggregate(
+                orders=Max('updated_at'), products=Max('items__product__updated_at'), count=Count('id', distinct=True),
+            )
+        last_modified = max(filter(None, [stats['orders'], stats['products']]), default=None)
+        return (stats['orders'], stats['products'], stats['count']), last_modified
+
+class OrderTransitionView(APIView):
+    """
+    Staff endpoint for moving many orders to a new status at once.
+    """
+    permission_classes = [IsAdminUser]
+    chunk_size = 1000
+
+    def post(self, request):
+        serializer = OrderTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        order_ids = serializer.validated_data['order_ids']
+        to_status = serializer.validated_data['status']
+
+        changed = 0
+        skipped = []
+        for start in range(0, len(order_ids), self.chunk_size):
+            result = transition(order_ids[start:start + self.chunk_size], to_status, actor=request.user)
+            changed += len(result.changed)
+            skipped.extend(result.skipped)
+        return Response({'changed': changed, 'skipped': skipped}, status=status.HTTP_200_OK)
+
+class OrderCancelView(APIView):
+    """
+    Lets a customer cancel their own order while it hasn't shipped yet.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        if not Order.objects.filter(pk=pk, user=request.user).exists():
+            return Response({'detail': 'Order not found.'}, status=status.HTTP_404_NOT_FOUND)
+        result = transition([pk], 'Cancelled', actor=request.user)
+        if not result.changed:
+            return Response(
+                {'detail': 'This order can no longer be cancelled.'},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response({'detail': 'Your order has been cancelled.'}, status=status.HTTP_200_OK)
+
+class OrderTimelineView(generics.ListAPIView):
+    """
+    Status history of one order, oldest first.
+    """
+    serializer_class = OrderStatusEventSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).order_by('-created_at')
\ No newline at end of file
+        orders = Order.objects.filter(pk=self.kwargs['pk'])
+        if not self.request.user.is_staff:
+            orders = orders.filter(user=self.request.user)
+        if not orders.exists():
+            raise NotFound('Order not found.')
+        return OrderStatusEvent.objects.filter(order_id=self.kwargs['pk'])
+
+
+class WishlistViewSet(SideloadListMixin, ListModelMixin, DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    The user's saved products. POST adds products by id, DELETE
+    ``<product_id>/`` removes one, and the move actions shift products
+    between the wishlist and the active cart in bulk (see orders.wishlist).
+    """
+    serializer_class = WishlistItemSerializer
+    permission_classes = [IsAuthenticated]
+    lookup_field = 'product_id'
+
+    def get_queryset(self):
+        items = WishlistItem.objects.filter(user=self.request.user)
+        if sideload_requested(self.request):
+            return items
+        return items.select_related('product__category')
+
+    def get_sideload_ids(self, objects):
+        return {'product_ids': {item.product_id for item in objects}}
+
+    def create(self, request):
+        serializer = WishlistProductsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product_ids = set(serializer.validated_data.get('product_ids', ()))
+        if not product_ids:
+            return Response({'product_ids': ['This field is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        saved = wishlist.save_for_later(request.user, product_ids)
+        if product_ids - saved:
+            return Response(
+                {'detail': 'Some products do not exist.', 'unknown': sorted(product_ids - saved), 'saved': len(saved)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({'saved': len(saved)}, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='move-to-cart')
+    def move_to_cart(self, request):
+        """
+        Moves the given saved products, or all of them, into the active cart.
+        """
+        serializer = WishlistProductsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        moved = wishlist.move_to_cart(request, serializer.validated_data.get('product_ids'))
+        return Response({'moved': moved}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='move-from-cart')
+    def move_from_cart(self, request):
+        """
+        Moves the given cart items, or the whole cart, to the wishlist.
+        """
+        serializer = WishlistCartItemsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        moved = wishlist.move_from_cart(request, serializer.validated_data.get('item_ids'))
+        return Response({'moved': moved}, status=status.HTTP_200_OK)
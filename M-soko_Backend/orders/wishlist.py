@@ -0,0 +1,211 @@
+"""
+Wishlists ("saved for later").
+
+Saved products live in WishlistItem, one narrow row per (user, product),
+instead of lingering in the active cart where every cart read and checkout
+would have to carry them. move_to_cart() and move_from_cart() shift any
+number of products between the two in one transaction, with one bulk
+insert and one delete.
+
+Each row keeps the price and availability the user last saw.
+detect_wishlist_changes() walks the rows in keyset batches and diffs each
+batch against the current prices (products.pricing.active_prices) and
+stock, one lookup per batch, queueing a WishlistAlert for every price drop
+or restock and moving the snapshot on. Rows whose products didn't change
+aren't written. send_alerts() then mails the queued alerts as one digest
+per user, claiming each batch first (m_soko.bulk.claim_batch) so no
+transaction stays open while mail goes out.
+"""
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from m_soko.bulk import claim_batch
+from products.models import Product
+from products.pricing import active_prices
+from .carts import active_cart, active_cart_id
+from .models import Cart, CartItem, WishlistAlert, WishlistItem
+
+
+def product_snapshots(product_ids):
+    """
+    {product_id: (active price, in stock)} for the products that exist.
+    """
+    prices = active_prices(product_ids)
+    stock = dict(Product.objects.filter(pk__in=prices.keys()).values_list('pk', 'stock'))
+    return {pk: (price, stock[pk] > 0) for pk, price in prices.items() if pk in stock}
+
+
+def save_for_later(user, product_ids):
+    """
+    Adds products to the user's wishlist; ones already on it keep their
+    snapshot. Returns the ids of the products that exist.
+    """
+    snapshots = product_snapshots(product_ids)
+    WishlistItem.objects.bulk_create(
+        [
+            WishlistItem(user=user, product_id=pk, seen_price=price, seen_in_stock=in_stock)
+            for pk, (price, in_stock) in snapshots.items()
+        ],
+        ignore_conflicts=True,
+    )
+    return set(snapshots)
+
+
+def move_to_cart(request, product_ids=None):
+    """
+    Moves saved products (all of them without ``product_ids``) into the
+    active cart, one of each; products already in the cart keep their
+    quantity. Returns the number of products moved.
+    """
+    with transaction.atomic():
+        saved = WishlistItem.objects.select_for_update().filter(user=request.user)
+        if product_ids is not None:
+            saved = saved.filter(product_id__in=product_ids)
+        moving = set(saved.values_list('product_id', flat=True))
+        if not moving:
+            return 0
+        cart = active_cart(request, create=True)
+        in_cart = set(CartItem.objects.filter(cart=cart, product_id__in=moving).values_list('product_id', flat=True))
+        CartItem.objects.bulk_create([CartItem(cart=cart, product_id=pk) for pk in moving - in_cart])
+        WishlistItem.objects.filter(user=request.user, product_id__in=moving).delete()
+        # bulk_create skips the CartItem signals, so the cart's validators are moved on here
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+    return len(moving)
+
+
+def move_from_cart(request, item_ids=None):
+    """
+    Moves cart items (the whole cart without ``item_ids``) to the wishlist.
+    Returns the number of items moved.
+    """
+    cart_id = active_cart_id(request)
+    if cart_id is None:
+        return 0
+    with transaction.atomic():
+        items = CartItem.objects.filter(cart_id=cart_id, cart__is_active=True)
+        if item_ids is not None:
+            items = items.filter(pk__in=item_ids)
+        product_ids = set(items.values_list('product_id', flat=True))
+        if not product_ids:
+            return 0
+        save_for_later(request.user, product_ids)
+        moved, _ = CartItem.objects.filter(cart_id=cart_id, product_id__in=product_ids).delete()
+    return moved
+
+
+def iter_saved(chunk_size=1000):
+    """
+    Yields batches of (pk, user_id, product_id, seen_price, seen_in_stock),
+    each read inside its own transaction with the rows locked. Rows another
+    run has locked are skipped, so concurrent runs never alert twice.
+    """
+    rows = WishlistItem.objects.order_by('pk').values_list(
+        'pk', 'user_id', 'product_id', 'seen_price', 'seen_in_stock',
+    )
+    last = 0
+    while True:
+        with transaction.atomic():
+            batch = list(rows.select_for_update(skip_locked=True).filter(pk__gt=last)[:chunk_size])
+            if not batch:
+                return
+            yield batch
+        last = batch[-1][0]
+
+
+def detect_wishlist_changes(chunk_size=1000, progress=None):
+    """
+    Queues an alert for every saved product that came back in stock or got
+    cheaper since its user last saw it, and updates the snapshots.
+    Returns (rows scanned, alerts queued).
+    """
+    scanned = queued = 0
+    for batch in iter_saved(chunk_size):
+        snapshots = product_snapshots({row[2] for row in batch})
+        alerts = []
+        changed = []
+        for pk, user_id, product_id, seen_price, seen_in_stock in batch:
+            if product_id not in snapshots or snapshots[product_id] == (seen_price, seen_in_stock):
+                continue
+            price, in_stock = snapshots[product_id]
+            # A drop on something that can't be bought isn't worth a mail; the restock alert covers it
+            kind = None
+            if in_stock and not seen_in_stock:
+                kind = 'back_in_stock'
+            elif in_stock and price < seen_price:
+                kind = 'price_drop'
+            if kind is not None:
+                alerts.append(WishlistAlert(
+                    user_id=user_id, product_id=product_id, kind=kind, old_price=seen_price, new_price=price,
+                ))
+            changed.append(WishlistItem(pk=pk, seen_price=price, seen_in_stock=in_stock))
+        WishlistAlert.objects.bulk_create(alerts)
+        WishlistItem.objects.bulk_update(changed, ['seen_price', 'seen_in_stock'])
+        queued += len(alerts)
+        scanned += len(batch)
+        if progress is not None:
+            progress(scanned, queued)
+    return scanned, queued
+
+
+def _digest(user, alerts):
+    lines = []
+    for alert in alerts:
+        if alert.kind == 'back_in_stock':
+            lines.append(f"- {alert.product.name} is back in stock at {alert.new_price}.")
+        else:
+            lines.append(f"- {alert.product.name} dropped from {alert.old_price} to {alert.new_price}.")
+    return EmailMessage(
+        subject="Good news about your saved items",
+        body=f"Hi {user.get_username()},\n\n" + "\n".join(lines) + "\n",
+        to=[user.email],
+    )
+
+
+def send_alerts(chunk_size=200, progress=None):
+    """
+    Sends the queued alerts in batches, one digest per user and batch, over
+    a single mail connection. Alerts for products that are no longer saved
+    are skipped. Returns {status: count} for the alerts processed.
+    """
+    outcomes = {}
+    queued = WishlistAlert.objects.filter(status='queued').select_related('user', 'product')
+    with get_connection() as connection:
+        while True:
+            # The claim lets several senders share the queue without sending twice
+            alerts = claim_batch(queued, chunk_size)
+            if not alerts:
+                break
+            still_saved = set(
+                WishlistItem.objects.filter(
+                    user_id__in={alert.user_id for alert in alerts},
+                    product_id__in={alert.product_id for alert in alerts},
+                ).values_list('user_id', 'product_id')
+            )
+            by_user = {}
+            for alert in alerts:
+                if (alert.user_id, alert.product_id) not in still_saved:
+                    alert.status, alert.detail = 'skipped', "No longer saved."
+                elif not alert.user.email:
+                    alert.status, alert.detail = 'skipped', "User has no email address."
+                else:
+                    by_user.setdefault(alert.user_id, []).append(alert)
+
+            for user_alerts in by_user.values():
+                try:
+                    connection.send_messages([_digest(user_alerts[0].user, user_alerts)])
+                    status, detail = 'sent', ''
+                except Exception as e:
+                    status, detail = 'failed', str(e)[:255]
+                for alert in user_alerts:
+                    alert.status, alert.detail = status, detail
+
+            now = timezone.now()
+            for alert in alerts:
+                alert.processed_at = now
+            WishlistAlert.objects.bulk_update(alerts, ['status', 'detail', 'processed_at'])
+            for alert in alerts:
+                outcomes[alert.status] = outcomes.get(alert.status, 0) + 1
+            if progress is not None:
+                progress(outcomes)
+    return outcomes
@@ -1,29 +1,162 @@
-from django.contrib import admin
-from .models import Product, Category, Review
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from m_soko.bulk import chunked_update
+from m_soko.outbox import record_changes
+from .models import Product, Category, Review, PriceSchedule, StockLevel, StockLocation
+from .pricing import bump_price_version
+from .reviews import refresh_review_stats_for
+
+
+class ProductActionForm(ActionForm):
+    """
+    Adds an amount input next to the admin action dropdown, used by the
+    bulk price/stock actions.
+    """
+    amount = forms.DecimalField(required=False, max_digits=10, decimal_places=2)
+
+
+def _action_amount(modeladmin, request, integral=False):
+    """
+    The amount input, validated by ProductActionForm's field; with
+    ``integral``, as an int. Returns None after telling the user what's
+    wrong with it.
+    """
+    try:
+        amount = ProductActionForm.base_fields['amount'].clean(request.POST.get('amount', ''))
+    except forms.ValidationError:
+        amount = None
+    if amount is None:
+        modeladmin.message_user(request, "Enter a valid amount for this action.", messages.ERROR)
+        return None
+    if integral:
+        if amount != amount.to_integral_value():
+            modeladmin.message_user(request, "Stock amounts must be whole numbers.", messages.ERROR)
+            return None
+        return int(amount)
+    return amount
+
+
+def _record_products(pks):
+    record_changes('product', pks)
+
+
+def _untracked(queryset):
+    # Location-tracked products get their stock from StockLevel rows, not these actions
+    return queryset.filter(~Exists(StockLevel.objects.filter(product=OuterRef('pk'))))
+
+
+class StockLevelInline(admin.TabularInline):
+    model = StockLevel
+    fields = ['location', 'quantity', 'updated_at']
+    readonly_fields = ['updated_at']
+    extra = 0
+
 
 class ProductAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'price', 'stock', 'category', 'created_at')
     list_filter = ('category',)
-    search_fields = ('name', 'description')
+    list_select_related = ('category',)
+    # Exact id and name-prefix lookups can use the primary key and name indexes;
+    # a free-text match on description would scan the whole table.
+    search_fields = ('=id', '^name')
+    show_full_result_count = False
+    action_form = ProductActionForm
+    inlines = [StockLevelInline]
+    actions = ['set_price', 'set_stock', 'add_stock']
+
+    def set_price(self, request, queryset):
+        amount = _action_amount(self, request)
+        if amount is None:
+            return
+        if amount < 0:
+            self.message_user(request, "Price cannot be negative.", messages.ERROR)
+            return
+        updated, batches = chunked_update(
+            queryset, {'price': amount, 'updated_at': timezone.now()}, on_batch=_record_products,
+        )
+        bump_price_version()
+        self.message_user(request, f"Price set to {amount} on {updated} products ({batches} batches).")
+    set_price.short_description = "Set price of selected products to amount"
+
+    def set_stock(self, request, queryset):
+        amount = _action_amount(self, request, integral=True)
+        if amount is None:
+            return
+        if amount < 0:
+            self.message_user(request, "Stock cannot be negative.", messages.ERROR)
+            return
+        updated, batches = chunked_update(
+            _untracked(queryset), {'stock': amount, 'updated_at': timezone.now()}, on_batch=_record_products,
+        )
+        self.message_user(request, f"Stock set to {amount} on {updated} products ({batches} batches).")
+    set_stock.short_description = "Set stock of selected products to amount"
+
+    def add_stock(self, request, queryset):
+        amount = _action_amount(self, request, integral=True)
+        if amount is None:
+            return
+        # F() keeps the increment inside the UPDATE, so concurrent checkouts aren't overwritten
+        updated, batches = chunked_update(
+            _untracked(queryset), {'stock': F('stock') + amount, 'updated_at': timezone.now()},
+            on_batch=_record_products,
+        )
+        self.message_user(request, f"Stock adjusted by {amount} on {updated} products ({batches} batches).")
+    add_stock.short_description = "Add amount to stock of selected products"
+
 
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name',)
 
+
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ('product', 'user', 'rating', 'status', 'is_visible', 'created_at')
     list_filter = ('status', 'is_visible')
+    list_select_related = ('product', 'user')
+    raw_id_fields = ('product', 'user')
+    search_fields = ('^product__name', '^user__username')
+    # COUNT(*) over the whole table on every changelist load doesn't scale to 1M rows
+    show_full_result_count = False
     actions = ['approve_reviews', 'reject_reviews']
 
+    def _moderate(self, queryset, values):
+        def on_batch(pks):
+            record_changes('review', pks)
+            refresh_review_stats_for(pks)
+        return chunked_update(queryset, values, on_batch=on_batch)
+
     def approve_reviews(self, request, queryset):
-        queryset.update(status='approved', is_visible=True)
-        self.message_user(request, f"{queryset.count()} reviews have been approved.")
+        updated, batches = self._moderate(queryset, {'status': 'approved', 'is_visible': True})
+        self.message_user(request, f"{updated} reviews have been approved ({batches} batches).")
     approve_reviews.short_description = "Approve selected reviews"
 
     def reject_reviews(self, request, queryset):
-        queryset.update(status='rejected', is_visible=False)
-        self.message_user(request, f"{queryset.count()} reviews have been rejected.")
+        updated, batches = self._moderate(queryset, {'status': 'rejected', 'is_visible': False})
+        self.message_user(request, f"{updated} reviews have been rejected ({batches} batches).")
     reject_reviews.short_description = "Reject selected reviews"
 
+
+@admin.register(PriceSchedule)
+class PriceScheduleAdmin(admin.ModelAdmin):
+    list_display = ('product', 'price', 'starts_at', 'ends_at', 'applied_at', 'reverted_at')
+    list_filter = ('starts_at', 'ends_at')
+    list_select_related = ('product',)
+    raw_id_fields = ('product',)
+    readonly_fields = ('previous_price', 'applied_at', 'reverted_at')
+    search_fields = ('=product__id', '^product__name')
+    show_full_result_count = False
+
+
+@admin.register(StockLocation)
+class StockLocationAdmin(admin.ModelAdmin):
+    list_display = ('name', 'code', 'city', 'country', 'priority', 'is_active')
+    list_filter = ('is_active', 'country')
+    list_editable = ('priority', 'is_active')
+    search_fields = ('^name', '=code', '^city')
+
 admin.site.register(Product, ProductAdmin)
-admin.site.register(Category, CategoryAdmin)
\ No newline at end of file
+admin.site.register(Category, CategoryAdmin)
@@ -0,0 +1,189 @@
+"""
+Pre-rendered product detail documents.
+
+A product page needs the product, its category path, image variants, the
+rating aggregate, the first page of approved reviews and the related
+products. product_document() assembles all of it once, renders it to JSON
+bytes and caches the bytes together with their ETag and their Brotli and
+gzip encodings, so a hit is two cache reads and no ORM or compression work
+at all. The document holds nothing secret, so the encodings skip the
+BREACH padding the middleware adds to gzip.
+
+Documents are never deleted when their inputs change. Instead, product and
+category changes recorded in the outbox (m_soko.outbox) stamp the affected
+products as stale once the transaction commits. The next request for a
+stale document takes a short rebuild lock and rebuilds it; concurrent
+requests keep serving the previous bytes in the meantime, so a busy product
+never has a cache miss stampede. build_product_documents pre-builds the
+documents of the most popular products after a deploy or cache flush.
+
+Related products come from the cached neighbour list and are only refreshed
+when the document is rebuilt or expires (PRODUCT_DOCUMENT_TIMEOUT).
+"""
+import gzip
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpRequest
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from m_soko.middleware import BROTLI_QUALITY, brotli
+from .models import Product, Review
+from .pagination import ReviewCursorPagination
+from .recommendations import related_product_ids
+
+RELATED_LIMIT = 8
+REBUILD_LOCK_TIMEOUT = 30
+IMAGE_VARIANTS = {
+    'thumbnail': 'c_fill,w_96,h_96',
+    'medium': 'c_limit,w_480',
+    'large': 'c_limit,w_1200',
+}
+
+
+def _document_key(product_id):
+    return f'products:document:{product_id}'
+
+
+def _stale_key(product_id):
+    return f'products:document-stale:{product_id}'
+
+
+def _lock_key(product_id):
+    return f'products:document-lock:{product_id}'
+
+
+def image_variants(image):
+    cloud_name = getattr(settings, 'CLOUDINARY_CLOUD_NAME', None)
+    if not image or not cloud_name:
+        return None
+    base = f"https://res.cloudinary.com/{cloud_name}/image/upload"
+    variants = {name: f"{base}/{transformation}/{image.public_id}" for name, transformation in IMAGE_VARIANTS.items()}
+    variants['original'] = f"{base}/{image.public_id}"
+    return variants
+
+
+class _DocumentRequest(HttpRequest):
+    # Documents are shared by every host the API is served on, so their links stay relative
+    def build_absolute_uri(self, location=None):
+        return location or self.get_full_path()
+
+
+def _first_review_page(product_id):
+    from .serializers import ReviewSerializer
+
+    request = _DocumentRequest()
+    request.path = f'/api/products/{product_id}/reviews/'
+    paginator = ReviewCursorPagination()
+    reviews = paginator.paginate_queryset(
+        Review.objects.select_related('user').filter(product_id=product_id, status='approved', is_visible=True),
+        Request(request),
+    )
+    return {'results': ReviewSerializer(reviews, many=True).data, 'next': paginator.get_next_link()}
+
+
+def build_document(product_id):
+    """
+    Assembles the detail document of a product. Returns None if it doesn't exist.
+    """
+    from .serializers import ProductSerializer
+
+    product = Product.objects.select_related('category').filter(pk=product_id).first()
+    if product is None:
+        return None
+    related_ids = related_product_ids(product_id, RELATED_LIMIT)
+    related = Product.objects.select_related('category').in_bulk(related_ids)
+    return {
+        'product': ProductSerializer(product).data,
+        # Categories are flat today; the path is there so nesting them doesn't change the shape
+        'category_path': [{'id': product.category_id, 'name': product.category.name}],
+        'images': image_variants(product.image),
+        'rating': {
+            'count': product.review_count,
+            'average': round(product.rating_total / product.review_count, 2) if product.review_count else None,
+        },
+        'reviews': _first_review_page(product_id),
+        'related': ProductSerializer([related[pk] for pk in related_ids if pk in related], many=True).data,
+    }
+
+
+def encode_body(body):
+    """
+    {content coding: bytes} for the codings that make ``body`` smaller.
+    """
+    encoded = {'gzip': gzip.compress(body, mtime=0)}
+    if brotli is not None:
+        encoded['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+    return {coding: data for coding, data in encoded.items() if len(data) < len(body)}
+
+
+def render_document(product_id):
+    """
+    Builds, renders and caches the document of a product. Returns the cached
+    entry, {'body', 'encoded', 'etag', 'built_at'}, or None if the product
+    doesn't exist. The ETag is weak, since it's shared by every encoding.
+    """
+    built_at = time.time()
+    document = build_document(product_id)
+    if document is None:
+        cache.delete(_document_key(product_id))
+        return None
+    body = JSONRenderer().render(document)
+    entry = {
+        'body': body,
+        'encoded': encode_body(body),
+        'etag': 'W/"%s"' % hashlib.md5(body).hexdigest(),
+        'built_at': built_at,
+    }
+    cache.set(_document_key(product_id), entry, settings.PRODUCT_DOCUMENT_TIMEOUT)
+    return entry
+
+
+def product_document(product_id):
+    """
+    The cached document of a product, rebuilt first if it's missing, or
+    stale and no other request is already rebuilding it.
+    """
+    found = cache.get_many([_document_key(product_id), _stale_key(product_id)])
+    entry = found.get(_document_key(product_id))
+    stale_at = found.get(_stale_key(product_id))
+    if entry is None:
+        return render_document(product_id)
+    if stale_at is None or stale_at < entry['built_at']:
+        return entry
+    if not cache.add(_lock_key(product_id), 1, REBUILD_LOCK_TIMEOUT):
+        return entry
+    try:
+        return render_document(product_id)
+    finally:
+        cache.delete(_lock_key(product_id))
+
+
+def hot_product_ids(percent=None):
+    """
+    Ids of the top ``percent`` of products by popularity, most popular first.
+    """
+    from .suggest import popularity
+
+    percent = settings.PRODUCT_DOCUMENT_TOP_PERCENT if percent is None else percent
+    count = math.ceil(Product.objects.count() * percent / 100)
+    weights = popularity()
+    return sorted(weights, key=weights.get, reverse=True)[:count]
+
+
+def mark_stale(product_ids):
+    """
+    Flags the documents of the given products for rebuilding. The stamp is
+    compared with the build start time, so a change that lands while a
+    document is being rebuilt still makes it stale.
+    """
+    now = time.time()
+    cache.set_many({_stale_key(pk): now for pk in product_ids}, settings.PRODUCT_DOCUMENT_TIMEOUT)
+
+
+def mark_category_stale(category_ids):
+    mark_stale(Product.objects.filter(category_id__in=category_ids).values_list('pk', flat=True))
@@ -0,0 +1,183 @@
+"""
+Per-location inventory and fulfilment allocation.
+
+Products with StockLevel rows are location-tracked. At checkout the
+allocator ranks the active locations by distance from the shipping address
+(same city, then same country, then the rest), tries to fill the whole order
+from the nearest single location and otherwise splits it, line by line,
+across the nearest locations that have stock.
+
+Planning reads a cached {location: quantity} map per product, fetched with
+one get_many() and filled with one query for the misses, so a checkout makes
+no per-item queries. The cache is only a hint: reserve_levels() applies the
+plan with one conditional UPDATE that fails if any location came up short,
+and the caller re-plans from fresh rows before giving up.
+"""
+from functools import reduce
+from operator import or_
+
+from django.core.cache import cache
+from django.db.models import Case, Exists, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from m_soko.outbox import record_changes
+from .models import Product, StockLevel, StockLocation
+
+AVAILABILITY_TIMEOUT = 300
+LOCATIONS_KEY = 'inventory:locations'
+
+
+def _availability_key(product_id):
+    return f'inventory:availability:{product_id}'
+
+
+def active_locations():
+    """
+    The active locations as dicts of id, city, country and priority. Cached
+    until a location changes.
+    """
+    locations = cache.get(LOCATIONS_KEY)
+    if locations is None:
+        locations = list(StockLocation.objects.filter(is_active=True).values('id', 'city', 'country', 'priority'))
+        cache.set(LOCATIONS_KEY, locations, None)
+    return locations
+
+
+def invalidate_locations():
+    cache.delete(LOCATIONS_KEY)
+
+
+def availability(product_ids, refresh=False):
+    """
+    Returns {product_id: {location_id: quantity}} for the given products. An
+    empty map means the product isn't location-tracked. ``refresh`` skips the
+    cache and reloads every product from the database.
+    """
+    product_ids = set(product_ids)
+    levels = {}
+    if not refresh:
+        cached = cache.get_many([_availability_key(pk) for pk in product_ids])
+        levels = {pk: cached[_availability_key(pk)] for pk in product_ids if _availability_key(pk) in cached}
+
+    missing = product_ids - levels.keys()
+    if missing:
+        loaded = {pk: {} for pk in missing}
+        rows = StockLevel.objects.filter(product_id__in=missing).values_list('product_id', 'location_id', 'quantity')
+        for product_id, location_id, quantity in rows:
+            loaded[product_id][location_id] = quantity
+        cache.set_many({_availability_key(pk): value for pk, value in loaded.items()}, AVAILABILITY_TIMEOUT)
+        levels.update(loaded)
+    return levels
+
+
+def invalidate_availability(product_ids):
+    cache.delete_many([_availability_key(pk) for pk in product_ids])
+
+
+def rank_locations(address=None):
+    """
+    Ids of the active locations, nearest to ``address`` first.
+    """
+    city = (address.city.strip().lower() if address else '')
+    country = (address.country.strip().lower() if address else '')
+
+    def distance(location):
+        same_country = bool(country) and location['country'].strip().lower() == country
+        same_city = same_country and location['city'].strip().lower() == city
+        return (0 if same_city else 1 if same_country else 2, location['priority'], location['id'])
+
+    return [location['id'] for location in sorted(active_locations(), key=distance)]
+
+
+def plan_allocation(quantities, address=None, refresh=False):
+    """
+    Plans where each line of {product_id: quantity} ships from. Returns a
+    {(product_id, location_id): quantity} map covering the location-tracked
+    products, or None if they can't all be filled from active locations.
+    """
+    ranked = rank_locations(address)
+    tracked = {pk: levels for pk, levels in availability(quantities, refresh).items() if levels}
+    if not tracked:
+        return {}
+
+    # One shipment is cheaper than several, so a location that has everything wins
+    for location_id in ranked:
+        if all(levels.get(location_id, 0) >= quantities[pk] for pk, levels in tracked.items()):
+            return {(pk, location_id): quantities[pk] for pk in tracked}
+
+    plan = {}
+    used = []
+    for product_id, levels in tracked.items():
+        remaining = quantities[product_id]
+        # Locations already shipping part of this order go first, to keep the split small
+        for location_id in used + [pk for pk in ranked if pk not in used]:
+            take = min(remaining, levels.get(location_id, 0))
+            if take <= 0:
+                continue
+            plan[(product_id, location_id)] = take
+            if location_id not in used:
+                used.append(location_id)
+            remaining -= take
+            if not remaining:
+                break
+        if remaining:
+            return None
+    return plan
+
+
+def _level_case(plan):
+    return Case(
+        *[
+            When(product_id=product_id, location_id=location_id, then=Value(quantity))
+            for (product_id, location_id), quantity in plan.items()
+        ],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def reserve_levels(plan):
+    """
+    Applies an allocation plan with one conditional UPDATE. Returns False if
+    any location no longer had enough; the caller rolls back in that case.
+    """
+    if not plan:
+        return True
+    enough = reduce(or_, [
+        Q(product_id=product_id, location_id=location_id, quantity__gte=quantity)
+        for (product_id, location_id), quantity in plan.items()
+    ])
+    updated = StockLevel.objects.filter(enough).update(
+        quantity=F('quantity') - _level_case(plan), updated_at=timezone.now(),
+    )
+    return updated == len(plan)
+
+
+def release_levels(plan):
+    """
+    Puts a {(product_id, location_id): quantity} allocation back into stock.
+    """
+    if not plan:
+        return
+    rows = reduce(or_, [
+        Q(product_id=product_id, location_id=location_id) for product_id, location_id in plan
+    ])
+    StockLevel.objects.filter(rows).update(quantity=F('quantity') + _level_case(plan), updated_at=timezone.now())
+
+
+def sync_product_stock(product_ids):
+    """
+    Sets Product.stock of location-tracked products to the sum of their
+    stock levels at active locations; stock at an inactive location can't
+    be allocated, so it isn't counted.
+    """
+    total = (
+        StockLevel.objects.filter(product=OuterRef('pk'), location__is_active=True)
+        .order_by().values('product').annotate(total=Sum('quantity')).values('total')
+    )
+    tracked = Exists(StockLevel.objects.filter(product=OuterRef('pk')))
+    Product.objects.filter(tracked, pk__in=product_ids).update(
+        stock=Coalesce(Subquery(total), 0), updated_at=timezone.now(),
+    )
+    record_changes('product', product_ids)
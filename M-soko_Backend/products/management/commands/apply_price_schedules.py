@@ -0,0 +1,133 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, When, Value, DecimalField, Q
+from django.utils import timezone
+
+from m_soko.bulk import chunked_update, iter_pk_chunks
+from m_soko.outbox import record_changes
+from products.models import Product, PriceSchedule
+from products.pricing import bump_price_version
+
+
+def _price_case(prices):
+    return Case(
+        *[When(pk=pk, then=Value(price)) for pk, price in prices.items()],
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes due PriceSchedule windows onto Product.price. When a window ends, "
+        "the price goes back to that of a window still running, or to the base "
+        "price, unless it was changed by hand meanwhile. Windows that started and "
+        "ended between two runs are marked applied and reverted without touching "
+        "the price. Runs in small batches, "
+        "each in its own short transaction, so the catalog stays readable during "
+        "large flips."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        now = timezone.now()
+
+        # Windows that came and went since the last run would otherwise wait in the pending index forever
+        missed, _ = chunked_update(
+            PriceSchedule.objects.filter(applied_at__isnull=True, ends_at__lte=now),
+            {'applied_at': now, 'reverted_at': now}, chunk_size=batch_size,
+        )
+
+        due = PriceSchedule.objects.filter(applied_at__isnull=True, starts_at__lte=now).exclude(ends_at__lte=now)
+        applied = 0
+        for pks in iter_pk_chunks(due, batch_size):
+            applied += self._apply(pks, now)
+            bump_price_version()
+
+        ended = PriceSchedule.objects.filter(applied_at__isnull=False, reverted_at__isnull=True, ends_at__lte=now)
+        reverted = 0
+        for pks in iter_pk_chunks(ended, batch_size):
+            reverted += self._revert(pks, now)
+            bump_price_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Applied {applied} price schedules and reverted {reverted}; "
+            f"{missed} ended before they could be applied."
+        ))
+
+    def _active(self, product_ids, exclude, now=None):
+        """
+        Applied windows of these products that haven't been reverted,
+        leaving out ``exclude``; with ``now``, only those still covering it.
+        """
+        active = PriceSchedule.objects.filter(
+            product_id__in=product_ids, applied_at__isnull=False, reverted_at__isnull=True,
+        ).exclude(pk__in=exclude)
+        if now is not None:
+            active = active.filter(starts_at__lte=now).filter(Q(ends_at__isnull=True) | Q(ends_at__gt=now))
+        return active
+
+    def _apply(self, pks, now):
+        with transaction.atomic():
+            schedules = list(
+                PriceSchedule.objects.select_for_update(skip_locked=True)
+                .filter(pk__in=pks, applied_at__isnull=True)
+                .order_by('starts_at')
+            )
+            if not schedules:
+                return 0
+            # Later windows override earlier ones for the same product
+            new_prices = {s.product_id: s.price for s in schedules}
+            current = dict(Product.objects.filter(pk__in=new_prices).values_list('pk', 'price'))
+            # A window overlapping one that's still applied keeps that one's base price, not its sale price
+            bases = {}
+            for product_id, previous_price in (
+                self._active(new_prices, [s.pk for s in schedules])
+                .order_by('-applied_at', '-pk').values_list('product_id', 'previous_price')
+            ):
+                bases[product_id] = previous_price
+            Product.objects.filter(pk__in=new_prices).update(price=_price_case(new_prices), updated_at=now)
+            record_changes('product', new_prices)
+            for schedule in schedules:
+                schedule.previous_price = bases.get(schedule.product_id, current.get(schedule.product_id))
+                schedule.applied_at = now
+            PriceSchedule.objects.bulk_update(schedules, ['previous_price', 'applied_at'])
+        return len(schedules)
+
+    def _revert(self, pks, now):
+        with transaction.atomic():
+            schedules = list(
+                PriceSchedule.objects.select_for_update(skip_locked=True)
+                .filter(pk__in=pks, reverted_at__isnull=True)
+                .order_by('applied_at', 'pk')
+            )
+            if not schedules:
+                return 0
+            ended = {}
+            for schedule in schedules:
+                ended.setdefault(schedule.product_id, []).append(schedule)
+            current = dict(Product.objects.filter(pk__in=ended).values_list('pk', 'price'))
+            # Overlapping windows that are still running; the one that started last wins
+            running = dict(
+                self._active(ended, [s.pk for s in schedules], now)
+                .order_by('starts_at', 'pk').values_list('product_id', 'price')
+            )
+
+            new_prices = {}
+            for product_id, product_schedules in ended.items():
+                if current.get(product_id) not in {s.price for s in product_schedules}:
+                    # Someone changed the price by hand during the window; theirs stays
+                    continue
+                if product_id in running:
+                    new_prices[product_id] = running[product_id]
+                elif product_schedules[0].previous_price is not None:
+                    new_prices[product_id] = product_schedules[0].previous_price
+            if new_prices:
+                Product.objects.filter(pk__in=new_prices).update(price=_price_case(new_prices), updated_at=now)
+                record_changes('product', new_prices)
+            for schedule in schedules:
+                schedule.reverted_at = now
+            PriceSchedule.objects.bulk_update(schedules, ['reverted_at'])
+        return len(schedules)
@@ -0,0 +1,66 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.utils.text import compress_string
+from rest_framework.authtoken.models import Token
+
+from m_soko import middleware
+
+DEFAULT_PATHS = ['/api/products/', '/api/categories/', '/api/orders/carts/', '/api/orders/history/']
+
+
+class Command(BaseCommand):
+    help = (
+        "Reports bytes on the wire and compression CPU time per endpoint for "
+        "JSON, gzip, Brotli and MessagePack encodings, using the current database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', default=DEFAULT_PATHS)
+        parser.add_argument('--username', help="Authenticate as this user for per-user endpoints.")
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        host = next((h for h in settings.ALLOWED_HOSTS if h and '*' not in h and not h.startswith('.')), 'localhost')
+        headers = {'HTTP_HOST': host}
+        if options['username']:
+            user = get_user_model().objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(f"No user named {options['username']!r}.")
+            token, _ = Token.objects.get_or_create(user=user)
+            headers['HTTP_AUTHORIZATION'] = f'Token {token.key}'
+        client = Client(**headers)
+        repeat = options['repeat']
+
+        self.stdout.write(f"{'endpoint':32} {'json':>9} {'gzip':>9} {'br':>9} {'msgpack':>9} {'gzip us':>9} {'br us':>9}")
+        for path in options['paths']:
+            response = client.get(path)
+            if response.status_code != 200:
+                self.stdout.write(f"{path:32} skipped (HTTP {response.status_code})")
+                continue
+            body = response.content
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                gzipped = compress_string(body)
+            gzip_us = (time.perf_counter() - start) / repeat * 1e6
+
+            if middleware.brotli is not None:
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    brotlied = middleware.brotli.compress(body, quality=middleware.BROTLI_QUALITY)
+                br_us = (time.perf_counter() - start) / repeat * 1e6
+                br_size, br_time = f"{len(brotlied):,}", f"{br_us:,.0f}"
+            else:
+                br_size = br_time = 'n/a'
+
+            packed = client.get(path, HTTP_ACCEPT='application/msgpack')
+            msgpack_size = f"{len(packed.content):,}" if packed['Content-Type'].startswith('application/msgpack') else 'n/a'
+
+            self.stdout.write(
+                f"{path:32} {len(body):>9,} {len(gzipped):>9,} {br_size:>9} {msgpack_size:>9} "
+                f"{gzip_us:>9,.0f} {br_time:>9}"
+            )
@@ -0,0 +1,51 @@
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+from products.suggest import SuggestIndex, normalize
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds the suggest index from the current database and reports build "
+        "time, memory and lookup latency for prefixes of product names."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=5000)
+        parser.add_argument('--limit', type=int, default=8)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        index = SuggestIndex()
+        tracemalloc.start()
+        start = time.perf_counter()
+        index.build()
+        build_ms = (time.perf_counter() - start) * 1000
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        self.stdout.write(f"Indexed {len(index):,} products in {build_ms:,.0f} ms, {memory / 2**20:,.1f} MiB.")
+
+        names = [normalize(name) for name in Product.objects.values_list('name', flat=True)[:10000]]
+        names = [name for name in names if name]
+        if not names:
+            self.stdout.write("No products to query.")
+            return
+        rng = random.Random(options['seed'])
+        prefixes = []
+        for _ in range(options['queries']):
+            name = rng.choice(names)
+            prefixes.append(name[:rng.randint(1, min(len(name), 8))])
+
+        timings = []
+        for prefix in prefixes:
+            start = time.perf_counter()
+            index.suggest(prefix, options['limit'])
+            timings.append((time.perf_counter() - start) * 1e6)
+        timings.sort()
+        p50 = timings[len(timings) // 2]
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        self.stdout.write(f"{len(timings):,} lookups: p50 {p50:,.0f} us, p99 {p99:,.0f} us, max {timings[-1]:,.0f} us.")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from products.documents import hot_product_ids, render_document
+
+
+class Command(BaseCommand):
+    help = "Pre-builds the cached detail documents of the most popular products."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--percent', type=float,
+            help="Share of the catalog to build, most popular first (default PRODUCT_DOCUMENT_TOP_PERCENT).",
+        )
+        parser.add_argument('product_ids', nargs='*', type=int, help="Build these products instead.")
+
+    def handle(self, *args, **options):
+        product_ids = options['product_ids'] or hot_product_ids(options['percent'])
+        built = 0
+        for product_id in product_ids:
+            if render_document(product_id) is not None:
+                built += 1
+            if built and built % 100 == 0:
+                self.stdout.write(f"Built {built} documents...")
+        self.stdout.write(self.style.SUCCESS(f"Built {built} product documents."))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from products.recommendations import TOP_K, build_related_products
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the \"customers also bought\" table from order co-occurrence."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=TOP_K)
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument(
+            '--max-pairs', type=int, default=2_000_000,
+            help="Upper bound on product pairs counted in memory before pruning.",
+        )
+
+    def handle(self, *args, **options):
+        written = build_related_products(
+            top_k=options['top_k'],
+            chunk_size=options['chunk_size'],
+            max_pairs=options['max_pairs'],
+            progress=lambda processed: self.stdout.write(f"Processed {processed} orders..."),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} related product rows."))
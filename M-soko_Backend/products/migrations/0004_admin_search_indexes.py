@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_review_is_visible_review_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='name',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['status', '-created_at'], name='review_status_created_idx'),
+        ),
+    ]
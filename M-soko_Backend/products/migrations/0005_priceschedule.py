@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('starts_at', models.DateTimeField()),
+                ('ends_at', models.DateTimeField(blank=True, null=True)),
+                ('previous_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('applied_at', models.DateTimeField(blank=True, null=True)),
+                ('reverted_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_schedules', to='products.product')),
+            ],
+            options={
+                'ordering': ['-starts_at'],
+                'indexes': [models.Index(fields=['product', '-starts_at'], name='priceschedule_product_idx'), models.Index(condition=models.Q(('applied_at__isnull', True)), fields=['starts_at'], name='priceschedule_pending_idx'), models.Index(condition=models.Q(('applied_at__isnull', False), ('reverted_at__isnull', True)), fields=['ends_at'], name='priceschedule_active_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:58
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_review_stats(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Review = apps.get_model('products', 'Review')
+    stats = (
+        Review.objects.filter(status='approved', is_visible=True)
+        .values('product_id')
+        .annotate(count=Count('id'), total=Sum('rating'))
+        .order_by()
+    )
+    for row in stats:
+        Product.objects.filter(pk=row['product_id']).update(review_count=row['count'], rating_total=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_relatedproduct'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'status', 'is_visible', '-created_at'], name='review_listing_idx'),
+        ),
+        migrations.RunPython(backfill_review_stats, migrations.RunPython.noop),
+    ]
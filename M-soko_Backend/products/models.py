@@ -1,3 +1,4 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth import get_user_model
 from cloudinary.models import CloudinaryField
@@ -14,7 +15,7 @@ class Category(models.Model):
         return self.name
 
 class Product(models.Model):
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, db_index=True)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.IntegerField(default=0)
@@ -23,9 +24,92 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Denormalized from approved, visible reviews (see products.reviews)
+    review_count = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return self.name
 
+    @property
+    def average_rating(self):
+        if not self.review_count:
+            return None
+        return round(self.rating_total / self.review_count, 2)
+
+class StockLocation(models.Model):
+    """
+    A depot or warehouse that holds stock. Orders are fulfilled from the
+    locations nearest the shipping address first; ``priority`` breaks ties
+    between equally near locations (lower goes first).
+    """
+    name = models.CharField(max_length=100)
+    code = models.SlugField(max_length=20, unique=True)
+    city = models.CharField(max_length=100)
+    country = models.CharField(max_length=100)
+    priority = models.PositiveSmallIntegerField(default=100)
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ['priority', 'id']
+
+    def __str__(self):
+        return f"{self.name} ({self.city})"
+
+class StockLevel(models.Model):
+    """
+    Stock of one product at one location. Products with stock levels are
+    location-tracked: their Product.stock is kept equal to the sum of these rows.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_levels')
+    location = models.ForeignKey(StockLocation, on_delete=models.CASCADE, related_name='stock_levels')
+    quantity = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('product', 'location')
+
+    def __str__(self):
+        return f"{self.quantity} of {self.product_id} at {self.location_id}"
+
+class PriceSchedule(models.Model):
+    """
+    A price that takes effect for a product between starts_at and ends_at
+    (open-ended when ends_at is empty). Applied schedules keep the price
+    they replaced, so the table doubles as the product's price history.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='price_schedules')
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField(blank=True, null=True)
+    previous_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    applied_at = models.DateTimeField(blank=True, null=True)
+    reverted_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-starts_at']
+        indexes = [
+            # Point-in-time lookup: latest window for a product starting before a given moment
+            models.Index(fields=['product', '-starts_at'], name='priceschedule_product_idx'),
+            # Scheduler scans only the rows still waiting to be applied or reverted
+            models.Index(
+                fields=['starts_at'], name='priceschedule_pending_idx',
+                condition=models.Q(applied_at__isnull=True),
+            ),
+            models.Index(
+                fields=['ends_at'], name='priceschedule_active_idx',
+                condition=models.Q(applied_at__isnull=False, reverted_at__isnull=True),
+            ),
+        ]
+
+    def clean(self):
+        if self.ends_at and self.ends_at <= self.starts_at:
+            raise ValidationError({'ends_at': "The end of a price window must be after its start."})
+
+    def __str__(self):
+        return f"{self.product.name} at {self.price} from {self.starts_at:%Y-%m-%d %H:%M}"
+
 class Review(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -52,6 +136,31 @@ class Review(models.Model):
     class Meta:
         unique_together = ('user', 'product')
         ordering = ['-created_at']
+        indexes = [
+            # Serves the moderation changelist: filter by status, newest first
+            models.Index(fields=['status', '-created_at'], name='review_status_created_idx'),
+            # Serves the public listing: a product's approved reviews, newest first
+            models.Index(fields=['product', 'status', 'is_visible', '-created_at'], name='review_listing_idx'),
+        ]
+
+    def __str__(self):
+        return f"Review by {self.user.username} for {self.product.name}"
+
+
+class RelatedProduct(models.Model):
+    """
+    "Customers also bought" neighbours of a product, scored by how many
+    orders contained both. Only the top neighbours per product are kept.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    score = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('product', 'related')
+        indexes = [
+            models.Index(fields=['product', '-score'], name='relatedproduct_score_idx'),
+        ]
 
     def __str__(self):
-        return f"Review by {self.user.username} for {self.product.name}"
\ No newline at end of file
+        return f"{self.product_id} -> {self.related_id} ({self.score})"
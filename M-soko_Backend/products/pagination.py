@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ReviewCursorPagination(CursorPagination):
+    """
+    Keyset pagination for reviews: every page is an index range scan on
+    (product, status, is_visible, created_at), however deep the client pages.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    ordering = '-created_at'
@@ -0,0 +1,115 @@
+"""
+Active price lookups backed by the cache.
+
+The effective price of a product is the latest PriceSchedule window that
+covers the current moment, falling back to Product.price. Cart and checkout
+totals read prices through active_prices() so a sale is honoured from its
+start time, even before the scheduler has written it onto the product row.
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Product, PriceSchedule
+
+PRICE_CACHE_TIMEOUT = 300
+PRICE_VERSION_KEY = 'products:price-version'
+
+
+def _price_key(product_id):
+    return f'products:active-price:{product_id}'
+
+
+def _price_version():
+    return cache.get_or_set(PRICE_VERSION_KEY, 1, None)
+
+
+def bump_price_version():
+    """
+    Invalidates every cached active price at once. Used after bulk price
+    writes, where deleting the keys one by one would cost more than the flip.
+    """
+    try:
+        cache.incr(PRICE_VERSION_KEY)
+    except ValueError:
+        cache.set(PRICE_VERSION_KEY, 1, None)
+
+
+def invalidate_price(product_id):
+    cache.delete(_price_key(product_id), version=_price_version())
+
+
+def _open_windows(product_ids, now, horizon):
+    """
+    Schedule windows relevant to product_ids between now and horizon. Applied
+    open-ended schedules are already written onto Product.price, so they're skipped.
+    """
+    return (
+        PriceSchedule.objects
+        .filter(product_id__in=product_ids, starts_at__lte=horizon, reverted_at__isnull=True)
+        .filter(Q(ends_at__isnull=True) | Q(ends_at__gt=now))
+        .exclude(applied_at__isnull=False, ends_at__isnull=True)
+        .values_list('product_id', 'price', 'starts_at', 'ends_at')
+    )
+
+
+def active_prices(product_ids, now=None):
+    """
+    Returns a {product_id: Decimal} map of the prices in effect right now.
+    Cached per product until the next window boundary, or PRICE_CACHE_TIMEOUT.
+    """
+    product_ids = set(product_ids)
+    if not product_ids:
+        return {}
+
+    version = _price_version()
+    keys = {_price_key(pk): pk for pk in product_ids}
+    cached = cache.get_many(keys.keys(), version=version)
+    prices = {keys[key]: price for key, price in cached.items()}
+
+    missing = product_ids - prices.keys()
+    if not missing:
+        return prices
+
+    now = now or timezone.now()
+    horizon = now + timedelta(seconds=PRICE_CACHE_TIMEOUT)
+    base = dict(Product.objects.filter(pk__in=missing).values_list('pk', 'price'))
+    current = {}
+    boundaries = {}
+    for product_id, price, starts_at, ends_at in _open_windows(missing, now, horizon):
+        if starts_at <= now:
+            # Overlapping windows: the one that started last wins
+            if product_id not in current or starts_at > current[product_id][1]:
+                current[product_id] = (price, starts_at)
+            boundary = ends_at
+        else:
+            boundary = starts_at
+        if boundary is not None:
+            boundaries[product_id] = min(boundary, boundaries.get(product_id, boundary))
+
+    for product_id, price in base.items():
+        if product_id in current:
+            price = current[product_id][0]
+        prices[product_id] = price
+        timeout = PRICE_CACHE_TIMEOUT
+        if product_id in boundaries:
+            timeout = max(1, min(timeout, int((boundaries[product_id] - now).total_seconds())))
+        cache.set(_price_key(product_id), price, timeout, version=version)
+    return prices
+
+
+def price_at(product_id, when):
+    """
+    Point-in-time lookup: the scheduled price covering `when`, or None if no
+    schedule window covered it.
+    """
+    return (
+        PriceSchedule.objects
+        .filter(product_id=product_id, starts_at__lte=when)
+        .filter(Q(ends_at__isnull=True) | Q(ends_at__gt=when))
+        .order_by('-starts_at')
+        .values_list('price', flat=True)
+        .first()
+    )
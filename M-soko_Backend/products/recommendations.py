@@ -0,0 +1,140 @@
+"""
+"Customers also bought" recommendations from order co-occurrence.
+
+The batch build streams OrderItem rows in order-id chunks, turns each order
+into a basket of distinct product ids and counts every pair in a sparse
+{product: Counter(related)} map. As soon as the map grows past the memory
+budget each product's counter is pruned to its strongest candidates, fewer
+the more products there are, so the job holds at most the budget or top-K
+per product, whichever is larger, however many order lines there are. The
+top-K neighbours per product are then written to RelatedProduct.
+
+New orders bump those scores incrementally. A product keeps at most
+CANDIDATES neighbours between rebuilds: the top-K plus a margin that
+newcomers can climb out of, so the table, and the work per order, stays
+bounded.
+"""
+from collections import Counter, defaultdict
+from itertools import permutations
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+
+from m_soko.bulk import iter_pk_chunks
+from orders.models import Order, OrderItem
+from .models import RelatedProduct
+
+TOP_K = 12
+# Neighbours kept per product between rebuilds, so late-rising ones can still catch up
+CANDIDATES = TOP_K * 4
+RELATED_CACHE_TIMEOUT = 600
+# Products past this many in one order add little signal and cost O(n^2) pairs
+MAX_BASKET_SIZE = 50
+
+
+def _related_key(product_id):
+    return f'products:related:{product_id}'
+
+
+def _baskets(order_ids):
+    rows = (
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .values_list('order_id', 'product_id')
+        .order_by('order_id')
+        .distinct()
+    )
+    baskets = defaultdict(list)
+    for order_id, product_id in rows:
+        baskets[order_id].append(product_id)
+    return [basket[:MAX_BASKET_SIZE] for basket in baskets.values() if len(basket) > 1]
+
+
+def _prune(counts, keep):
+    for product_id, related in counts.items():
+        if len(related) > keep:
+            counts[product_id] = Counter(dict(related.most_common(keep)))
+
+
+def build_related_products(top_k=TOP_K, chunk_size=5000, max_pairs=2_000_000, progress=None):
+    """
+    Rebuilds the RelatedProduct table from the whole order history.
+    ``max_pairs`` bounds the number of (product, related) counters held in
+    memory at once, down to ``top_k`` per product. Returns the number of
+    neighbour rows written.
+    """
+    counts = defaultdict(Counter)
+    pairs = 0
+    limit = max_pairs
+    processed = 0
+    for order_ids in iter_pk_chunks(Order.objects.exclude(status='Cancelled'), chunk_size):
+        for basket in _baskets(order_ids):
+            for product_id, related_id in permutations(basket, 2):
+                related = counts[product_id]
+                if related_id not in related:
+                    pairs += 1
+                related[related_id] += 1
+            if pairs > limit:
+                # Prune to half the budget, keeping a margin over top_k while there's room for one
+                keep = max(top_k, min(top_k * 4, max_pairs // (2 * len(counts))))
+                _prune(counts, keep)
+                pairs = sum(len(related) for related in counts.values())
+                # With more products than the budget fits at top_k each, don't prune again right away
+                limit = max(max_pairs, 2 * pairs)
+        processed += len(order_ids)
+        if progress is not None:
+            progress(processed)
+
+    rows = [
+        RelatedProduct(product_id=product_id, related_id=related_id, score=score)
+        for product_id, related in counts.items()
+        for related_id, score in related.most_common(top_k)
+    ]
+    with transaction.atomic():
+        RelatedProduct.objects.all().delete()
+        RelatedProduct.objects.bulk_create(rows, batch_size=1000)
+    cache.delete_many([_related_key(product_id) for product_id in counts])
+    return len(rows)
+
+
+def record_order(order_id):
+    """
+    Bumps the co-occurrence scores for the products of a newly placed order.
+    Every pair inside one basket co-occurs, so existing pairs are bumped with
+    a single UPDATE and the missing ones are inserted in one batch, as long
+    as their product has fewer than CANDIDATES neighbours.
+    """
+    for basket in _baskets([order_id]):
+        pairs = RelatedProduct.objects.filter(product_id__in=basket, related_id__in=basket)
+        existing = set(pairs.values_list('product_id', 'related_id'))
+        pairs.update(score=F('score') + 1)
+        room = {product_id: CANDIDATES for product_id in basket}
+        for product_id, neighbours in (
+            RelatedProduct.objects.filter(product_id__in=basket)
+            .values_list('product_id').annotate(neighbours=Count('pk')).order_by()
+        ):
+            room[product_id] -= neighbours
+        new_pairs = []
+        for product_id, related_id in permutations(basket, 2):
+            # A new pair scores 1, as low as any; a full product waits for the next rebuild to let it in
+            if (product_id, related_id) not in existing and room[product_id] > 0:
+                room[product_id] -= 1
+                new_pairs.append(RelatedProduct(product_id=product_id, related_id=related_id, score=1))
+        RelatedProduct.objects.bulk_create(new_pairs, ignore_conflicts=True)
+        cache.delete_many([_related_key(product_id) for product_id in basket])
+
+
+def related_product_ids(product_id, limit=TOP_K):
+    """
+    Ids of the strongest neighbours of a product, strongest first. Cached.
+    """
+    key = _related_key(product_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(
+            RelatedProduct.objects.filter(product_id=product_id)
+            .order_by('-score')
+            .values_list('related_id', flat=True)[:TOP_K]
+        )
+        cache.set(key, ids, RELATED_CACHE_TIMEOUT)
+    return ids[:limit]
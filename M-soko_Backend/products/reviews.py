@@ -0,0 +1,80 @@
+"""
+Keeps the denormalized review aggregates on Product in step with moderation.
+"""
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from m_soko.outbox import record_changes
+
+from .models import Product, Review
+
+
+def refresh_review_stats(product_ids):
+    """
+    Recomputes review_count and rating_total for the given products from
+    their approved, visible reviews with one grouped query.
+    """
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+    stats = {
+        row['product_id']: row
+        for row in Review.objects.filter(product_id__in=product_ids, status='approved', is_visible=True)
+        .values('product_id')
+        .annotate(count=Count('id'), total=Sum('rating'))
+        .order_by()
+    }
+    Product.objects.bulk_update(
+        [
+            Product(
+                pk=product_id,
+                review_count=stats.get(product_id, {}).get('count', 0),
+                rating_total=stats.get(product_id, {}).get('total', 0),
+            )
+            for product_id in product_ids
+        ],
+        ['review_count', 'rating_total'],
+        batch_size=500,
+    )
+    record_changes('product', product_ids)
+
+
+def refresh_review_stats_for(review_pks):
+    """
+    Refreshes the stats of the products behind a batch of review pks; the
+    admin moderation actions call it once per chunk.
+    """
+    refresh_review_stats(
+        Review.objects.filter(pk__in=review_pks).order_by().values_list('product_id', flat=True).distinct()
+    )
+
+
+class _PendingStats:
+    """
+    The on_commit callback of one transaction, collecting its product ids.
+    """
+    def __init__(self):
+        self.product_ids = set()
+
+    def __call__(self):
+        refresh_review_stats(self.product_ids)
+
+
+def schedule_review_stats(product_ids):
+    """
+    Refreshes the stats of ``product_ids`` when the current transaction
+    commits, so a delete or save of many reviews in one transaction
+    recomputes each product once instead of once per review.
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        refresh_review_stats(product_ids)
+        return
+    # A rollback drops the callback along with the ids queued on it
+    for entry in connection.run_on_commit:
+        if isinstance(entry[1], _PendingStats):
+            entry[1].product_ids.update(product_ids)
+            return
+    pending = _PendingStats()
+    pending.product_ids.update(product_ids)
+    transaction.on_commit(pending)
@@ -22,8 +22,16 @@ class ProductSerializer(serializers.ModelSerializer):
         model = Product
         # Include 'stock' in the fields list so it can be serialized and deserialized
         fields = ['id', 'name', 'description', 'price', 'stock', 'image', 'image_url', 'category', 'category_id']
-        # 'id', 'category' (nested object), and 'image_url' (calculated) are read-only
-        read_only_fields = ['id', 'category', 'image_url']
+        # 'id', 'category' (nested object), and 'image_url' (calculated) are read-only;
+        # images are uploaded directly to storage (see m_soko.uploads)
+        read_only_fields = ['id', 'category', 'image', 'image_url']
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # Sideloaded responses reference the category by id (see products.sideload)
+        if self.context.get('sideload'):
+            fields['category'] = serializers.IntegerField(source='category_id', read_only=True)
+        return fields
 
     def get_image_url(self, obj):
         if obj.image:
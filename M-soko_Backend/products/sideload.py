@@ -0,0 +1,81 @@
+"""
+Sideloaded ("normalized") list responses.
+
+With ``?sideload=1`` a list endpoint returns its primary records with plain
+ids in place of embedded products and categories, plus an ``included`` map
+holding each referenced product and category exactly once:
+
+    {"results": [...], "included": {"products": {"3": {...}}, "categories": {"1": {...}}}}
+
+Each included type is fetched with a single in_bulk() query, so a large
+order history serializes every product and category only once.
+"""
+from rest_framework.response import Response
+
+from .models import Category, Product
+
+SIDELOAD_PARAM = 'sideload'
+
+
+def sideload_requested(request):
+    return request.query_params.get(SIDELOAD_PARAM, '').lower() in ('1', 'true', 'yes')
+
+
+def build_included(product_ids=(), category_ids=(), context=None):
+    """
+    Serializes the referenced products and categories, one query per type.
+    """
+    from .serializers import CategorySerializer, ProductSerializer
+
+    context = dict(context or {}, sideload=True)
+    included = {}
+    category_ids = set(category_ids)
+    if product_ids:
+        products = Product.objects.in_bulk(set(product_ids))
+        category_ids.update(product.category_id for product in products.values())
+        included['products'] = {
+            pk: data for pk, data in zip(
+                products, ProductSerializer(products.values(), many=True, context=context).data
+            )
+        }
+    if category_ids:
+        categories = Category.objects.in_bulk(category_ids)
+        included['categories'] = {
+            pk: data for pk, data in zip(
+                categories, CategorySerializer(categories.values(), many=True, context=context).data
+            )
+        }
+    return included
+
+
+class SideloadListMixin:
+    """
+    Adds the ``?sideload=1`` format to list(). Views override
+    get_sideload_ids(objects), returning the product and category ids the
+    page refers to as a dict of keyword arguments for build_included();
+    by default nothing is included.
+    """
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['sideload'] = sideload_requested(self.request)
+        return context
+
+    def get_sideload_ids(self, objects):
+        return {}
+
+    def list(self, request, *args, **kwargs):
+        if not sideload_requested(request):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        objects = list(page if page is not None else queryset)
+        results = self.get_serializer(objects, many=True).data
+        included = build_included(context=self.get_serializer_context(), **self.get_sideload_ids(objects))
+
+        if page is not None:
+            response = self.get_paginated_response(results)
+            response.data['included'] = included
+            return response
+        return Response({'results': results, 'included': included})
@@ -0,0 +1,58 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from m_soko.conditional import bump_collection_version
+from m_soko.outbox import subscribe, track_model
+from .documents import mark_category_stale, mark_stale
+from .inventory import invalidate_availability, invalidate_locations, sync_product_stock
+from .models import Category, Product, PriceSchedule, Review, StockLevel, StockLocation
+from .pricing import invalidate_price
+from .reviews import schedule_review_stats
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_price_changed(sender, instance, **kwargs):
+    invalidate_price(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=PriceSchedule)
+def price_schedule_changed(sender, instance, **kwargs):
+    invalidate_price(instance.product_id)
+
+
+@receiver([post_save, post_delete], sender=Review)
+def review_changed(sender, instance, origin=None, **kwargs):
+    # Reviews deleted along with their product have no stats left to keep
+    if isinstance(origin, Product) or getattr(origin, 'model', None) is Product:
+        return
+    schedule_review_stats([instance.product_id])
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    bump_collection_version('categories')
+
+
+@receiver([post_save, post_delete], sender=StockLevel)
+def stock_level_changed(sender, instance, **kwargs):
+    # Checkout adjusts levels with bulk UPDATEs that skip this; it keeps the total itself
+    sync_product_stock([instance.product_id])
+    invalidate_availability([instance.product_id])
+
+
+@receiver([post_save, post_delete], sender=StockLocation)
+def stock_location_changed(sender, instance, **kwargs):
+    invalidate_locations()
+    # Product.stock only counts active locations, so (de)activating one changes the totals
+    if kwargs.get('signal') is post_save:
+        sync_product_stock(StockLevel.objects.filter(location=instance).values_list('product_id', flat=True))
+
+
+# Outbox events for saves and deletes; bulk UPDATEs record theirs where they run
+track_model(Product, 'product')
+track_model(Category, 'category')
+track_model(Review, 'review')
+
+# Detail documents go stale on any recorded product or category change, bulk UPDATEs included
+subscribe('product', mark_stale)
+subscribe('category', mark_category_stale)
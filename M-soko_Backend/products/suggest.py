@@ -0,0 +1,291 @@
+"""
+In-process prefix index for search-box suggestions.
+
+Every worker keeps a sorted array of (key, product_id) entries, where the
+keys are the normalized product name, the name starting at each later word
+("red running shoe" is also found as "running shoe" and "shoe") and the
+category name. A lookup is a bisect to the first key with the typed prefix
+and a bounded forward scan, ranked by a popularity weight (units sold in the
+last SUGGEST_POPULARITY_DAYS plus approved reviews). The top results of one-
+and two-character prefixes, whose ranges are the widest, are memoized.
+
+The index is built at worker start (see m_soko.wsgi) from at most
+SUGGEST_MAX_PRODUCTS of the most popular products, which bounds the
+per-worker memory. A background thread then follows the outbox
+(m_soko.outbox): every SUGGEST_REFRESH_SECONDS it reads the product and
+category change events since the last one it saw and re-indexes just those
+products, and every SUGGEST_REBUILD_SECONDS it rebuilds the index to pick
+up new popularity weights. Requests never touch the database; they read an
+immutable snapshot that the thread replaces in one assignment, and get no
+suggestions until the first build has finished.
+"""
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.db.models import Sum
+from django.utils import timezone
+
+from m_soko.models import ChangeEvent
+from .models import Product
+
+MAX_WORD_KEYS = 5
+MEMO_PREFIX_LENGTH = 2
+MEMO_SIZE = 20
+SCAN_LIMIT = 5000
+# More pending changes than this and a full rebuild is cheaper than patching
+MAX_INCREMENTAL_CHANGES = 2000
+
+logger = logging.getLogger(__name__)
+
+_non_word = re.compile(r'[^0-9a-z]+')
+
+
+def normalize(text):
+    """
+    Lowercases, strips accents and collapses punctuation to single spaces.
+    """
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _non_word.sub(' ', text.casefold()).strip()
+
+
+def _keys(name, category):
+    name = normalize(name)
+    words = name.split(' ')
+    keys = {name, normalize(category)}
+    keys.update(' '.join(words[i:]) for i in range(1, min(len(words), MAX_WORD_KEYS)))
+    keys.discard('')
+    return keys
+
+
+def thumbnail_url(image):
+    cloud_name = getattr(settings, 'CLOUDINARY_CLOUD_NAME', None)
+    if not image or not cloud_name:
+        return None
+    return f"https://res.cloudinary.com/{cloud_name}/image/upload/c_fill,w_96,h_96/{image.public_id}"
+
+
+def popularity(product_ids=None):
+    """
+    {product_id: weight} from recent units sold and approved reviews.
+    """
+    from analytics.models import DailyProductSales
+
+    since = timezone.localdate() - timedelta(days=settings.SUGGEST_POPULARITY_DAYS)
+    sales = DailyProductSales.objects.filter(day__gte=since)
+    products = Product.objects.all()
+    if product_ids is not None:
+        sales = sales.filter(product_id__in=product_ids)
+        products = products.filter(pk__in=product_ids)
+    weights = dict(products.filter(review_count__gt=0).values_list('pk', 'review_count'))
+    for product_id, units in sales.values('product_id').annotate(units=Sum('units')).values_list('product_id', 'units'):
+        weights[product_id] = weights.get(product_id, 0) + max(units, 0)
+    return weights
+
+
+def _products(product_ids=None):
+    products = Product.objects.select_related('category').only('id', 'name', 'image', 'category__name')
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    return products
+
+
+class _Snapshot:
+    """
+    One version of the index. It is never changed once published; updates
+    build a new snapshot, so a lookup sees either the old or the new one.
+    """
+    __slots__ = ('entries', 'keys', 'items', 'weights', 'memo')
+
+    def __init__(self, entries=(), keys=None, items=None, weights=None):
+        self.entries = entries   # sorted (key, product_id)
+        self.keys = keys or {}   # product_id -> keys it is indexed under
+        self.items = items or {}  # product_id -> {'id', 'name', 'thumbnail'}
+        self.weights = weights or {}
+        # Only ever filled for this snapshot, so it can't serve stale results
+        self.memo = {}
+
+
+class SuggestIndex:
+    def __init__(self):
+        self._refresh_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._snapshot = _Snapshot()
+        self._cursor = None      # last ChangeEvent id applied
+        self._checked_at = 0.0
+        self._built_at = 0.0
+        self._thread = None
+        self._pid = None
+
+    def __len__(self):
+        return len(self._snapshot.items)
+
+    def build(self):
+        """
+        Loads the index from scratch, keeping only the most popular products
+        when there are more than SUGGEST_MAX_PRODUCTS.
+        """
+        cursor = ChangeEvent.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        limit = settings.SUGGEST_MAX_PRODUCTS
+        weights = popularity()
+        products = _products()
+        if products.count() > limit:
+            # Popular products first, then the newest ones to fill the budget
+            ranked = sorted(weights, key=weights.get, reverse=True)[:limit]
+            ids = set(ranked) | set(
+                Product.objects.exclude(pk__in=ranked).order_by('-pk').values_list('pk', flat=True)[:limit - len(ranked)]
+            )
+            products = products.filter(pk__in=ids)
+
+        entries, keys, items = [], {}, {}
+        for product in products.iterator(chunk_size=2000):
+            product_keys = _keys(product.name, product.category.name)
+            keys[product.pk] = product_keys
+            entries.extend((key, product.pk) for key in product_keys)
+            items[product.pk] = {'id': product.pk, 'name': product.name, 'thumbnail': thumbnail_url(product.image)}
+        entries.sort()
+
+        self._snapshot = _Snapshot(entries, keys, items, weights)
+        self._cursor = cursor
+        self._checked_at = self._built_at = time.monotonic()
+
+    def _apply(self, events):
+        product_ids = {object_id for topic, object_id in events if topic == 'product'}
+        category_ids = {object_id for topic, object_id in events if topic == 'category'}
+        if category_ids:
+            product_ids.update(Product.objects.filter(category_id__in=category_ids).values_list('pk', flat=True))
+        fresh = {product.pk: product for product in _products(product_ids)}
+        weights = popularity(product_ids)
+
+        # Patch copies and publish them together; readers keep the old snapshot meanwhile
+        current = self._snapshot
+        entries, keys = list(current.entries), dict(current.keys)
+        items, all_weights = dict(current.items), dict(current.weights)
+        for product_id in product_ids:
+            for key in keys.pop(product_id, ()):
+                i = bisect_left(entries, (key, product_id))
+                if i < len(entries) and entries[i] == (key, product_id):
+                    del entries[i]
+            items.pop(product_id, None)
+            product = fresh.get(product_id)
+            # Only products already indexed or new ones are patched; the rest wait for the next rebuild
+            if product is None or (product_id not in all_weights and len(items) >= settings.SUGGEST_MAX_PRODUCTS):
+                continue
+            product_keys = _keys(product.name, product.category.name)
+            keys[product_id] = product_keys
+            for key in product_keys:
+                insort(entries, (key, product_id))
+            items[product_id] = {'id': product_id, 'name': product.name, 'thumbnail': thumbnail_url(product.image)}
+            all_weights[product_id] = weights.get(product_id, 0)
+        self._snapshot = _Snapshot(entries, keys, items, all_weights)
+
+    def refresh(self):
+        """
+        Builds the index on first use, rebuilds it when it's due and otherwise
+        applies the product/category changes recorded since the last refresh.
+        Only one thread refreshes at a time; a second caller returns at once
+        unless there is no index yet.
+        """
+        if not self._refresh_lock.acquire(blocking=self._cursor is None):
+            return
+        try:
+            self._refresh()
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._cursor is None or now - self._built_at > settings.SUGGEST_REBUILD_SECONDS:
+            self.build()
+            return
+        if now - self._checked_at < settings.SUGGEST_REFRESH_SECONDS:
+            return
+        self._checked_at = now
+        events = list(
+            ChangeEvent.objects.filter(pk__gt=self._cursor, topic__in=('product', 'category'))
+            .order_by('pk')
+            .values_list('pk', 'topic', 'object_id')[:MAX_INCREMENTAL_CHANGES + 1]
+        )
+        if len(events) > MAX_INCREMENTAL_CHANGES:
+            self.build()
+            return
+        if events:
+            self._apply({(topic, object_id) for _, topic, object_id in events})
+            self._cursor = events[-1][0]
+
+    def start(self):
+        """
+        Starts the refresh thread of this process if it isn't running. A
+        thread started before a fork doesn't exist in the child, so the pid
+        is checked too.
+        """
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='suggest-refresh', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except DatabaseError:
+                logger.warning("Suggest index refresh failed; retrying.", exc_info=True)
+            finally:
+                close_old_connections()
+            time.sleep(settings.SUGGEST_REFRESH_SECONDS)
+
+    def suggest(self, query, limit=8):
+        """
+        Up to ``limit`` products whose name or category starts with ``query``
+        (at a word boundary), most popular first.
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        snapshot = self._snapshot
+        memoize = len(prefix) <= MEMO_PREFIX_LENGTH and limit <= MEMO_SIZE
+        ids = snapshot.memo.get(prefix) if memoize else None
+        if ids is None:
+            entries = snapshot.entries
+            seen = set()
+            i = bisect_left(entries, (prefix,))
+            end = min(len(entries), i + SCAN_LIMIT)
+            while i < end and entries[i][0].startswith(prefix):
+                seen.add(entries[i][1])
+                i += 1
+            weights = snapshot.weights
+            ids = sorted(seen, key=lambda pk: (-weights.get(pk, 0), pk))[:MEMO_SIZE if memoize else limit]
+            if memoize:
+                snapshot.memo[prefix] = ids
+        items = snapshot.items
+        return [items[pk] for pk in ids[:limit] if pk in items]
+
+
+suggest_index = SuggestIndex()
+
+
+def preload():
+    """
+    Builds the index as a worker starts and starts its refresh thread. A
+    database that isn't reachable or migrated yet only leaves the build to
+    the thread.
+    """
+    try:
+        suggest_index.refresh()
+    except DatabaseError:
+        logger.warning("Suggest index not preloaded; the refresh thread will build it.", exc_info=True)
+    finally:
+        close_old_connections()
+    suggest_index.start()
@@ -1,3 +1,306 @@
+import gzip
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+
+from analytics.models import DailyProductSales
+from orders.models import Order, OrderItem
+from . import recommendations
+from .models import Category, PriceSchedule, Product, RelatedProduct, Review
+from .reviews import _PendingStats
+from .suggest import SuggestIndex
+
+
+class ProductAdminActionTests(TestCase):
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(self.admin)
+        category = Category.objects.create(name='Shoes')
+        self.product = Product.objects.create(name='Runner', description='d', price=50, stock=5, category=category)
+
+    def run_action(self, action, amount):
+        return self.client.post('/admin/products/product/', {
+            'action': action, '_selected_action': [self.product.pk], 'amount': amount,
+        }, follow=True)
+
+    def test_set_stock(self):
+        self.run_action('set_stock', '12')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 12)
+
+    def test_add_stock(self):
+        self.run_action('add_stock', '-2')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+    def test_set_stock_rejects_negative_amounts(self):
+        response = self.run_action('set_stock', '-1')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+        self.assertContains(response, "Stock cannot be negative.")
+
+    def test_stock_actions_reject_fractions(self):
+        for action in ('set_stock', 'add_stock'):
+            response = self.run_action(action, '2.5')
+            self.assertContains(response, "Stock amounts must be whole numbers.")
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+
+    def test_set_price_requires_an_amount(self):
+        for amount in ('', 'abc'):
+            self.run_action('set_price', amount)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.price, 50)
+
+
+class ReviewStatsTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        category = Category.objects.create(name='Shoes')
+        self.product = Product.objects.create(name='Runner', description='d', price=50, stock=5, category=category)
+        # bulk_create skips the signals, so no refresh is queued before each test
+        self.reviews = Review.objects.bulk_create([
+            Review(user=User.objects.create_user(f'u{i}', password='pw'), product=self.product, rating=rating)
+            for i, rating in enumerate((5, 4, 1))
+        ])
+
+    def test_moderation_actions_refresh_stats(self):
+        self.client.force_login(self.admin)
+        self.client.post('/admin/products/review/', {
+            'action': 'approve_reviews', '_selected_action': [r.pk for r in self.reviews[:2]],
+        })
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.review_count, self.product.rating_total), (2, 9))
+
+        self.client.post('/admin/products/review/', {
+            'action': 'reject_reviews', '_selected_action': [self.reviews[0].pk],
+        })
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.review_count, self.product.rating_total), (1, 4))
+
+    def test_deletes_in_one_transaction_refresh_once(self):
+        Review.objects.update(status='approved', is_visible=True)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Review.objects.filter(rating__gte=4).delete()
+        self.assertEqual(sum(isinstance(callback, _PendingStats) for callback in callbacks), 1)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.review_count, self.product.rating_total), (1, 1))
+
+    def test_product_cascade_skips_stats(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.product.delete()
+        self.assertFalse(any(isinstance(callback, _PendingStats) for callback in callbacks))
+        self.assertFalse(Review.objects.exists())
+
+
+class PriceScheduleTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Shoes')
+        self.product = Product.objects.create(name='Runner', description='d', price=100, stock=5, category=category)
+        self.now = timezone.now()
+
+    def schedule(self, price, starts, ends=None):
+        return PriceSchedule.objects.create(
+            product=self.product, price=price,
+            starts_at=self.now + timedelta(hours=starts),
+            ends_at=None if ends is None else self.now + timedelta(hours=ends),
+        )
+
+    def end(self, schedule):
+        PriceSchedule.objects.filter(pk=schedule.pk).update(ends_at=timezone.now() - timedelta(seconds=1))
+
+    def price(self):
+        call_command('apply_price_schedules', stdout=StringIO())
+        self.product.refresh_from_db()
+        return self.product.price
+
+    def test_window_is_applied_and_reverted(self):
+        sale = self.schedule(80, -1, 1)
+        self.assertEqual(self.price(), 80)
+        self.end(sale)
+        self.assertEqual(self.price(), 100)
+
+    def test_window_missed_between_runs_leaves_the_queue(self):
+        missed = self.schedule(80, -3, -2)
+        self.assertEqual(self.price(), 100)
+        missed.refresh_from_db()
+        self.assertIsNotNone(missed.applied_at)
+        self.assertEqual(missed.applied_at, missed.reverted_at)
+        self.assertIsNone(missed.previous_price)
+
+    def test_revert_falls_back_to_a_window_still_running(self):
+        season = self.schedule(90, -3, 5)
+        self.assertEqual(self.price(), 90)
+        flash = self.schedule(70, -1, 1)
+        self.assertEqual(self.price(), 70)
+        self.end(flash)
+        self.assertEqual(self.price(), 90)
+        self.end(season)
+        self.assertEqual(self.price(), 100)
+
+    def test_base_price_survives_a_window_ending_before_the_next(self):
+        season = self.schedule(90, -3, 5)
+        self.price()
+        flash = self.schedule(70, -1, 1)
+        self.price()
+        self.end(season)
+        # The flash sale started last, so it keeps its price
+        self.assertEqual(self.price(), 70)
+        self.end(flash)
+        self.assertEqual(self.price(), 100)
+
+    def test_manual_edit_during_window_is_kept(self):
+        sale = self.schedule(80, -1, 1)
+        self.price()
+        Product.objects.filter(pk=self.product.pk).update(price=85)
+        self.end(sale)
+        self.assertEqual(self.price(), 85)
+        self.assertIsNotNone(PriceSchedule.objects.get(pk=sale.pk).reverted_at)
+
+
+class RecordOrderTests(TestCase):
+    def test_new_pairs_stop_at_the_candidate_cap(self):
+        category = Category.objects.create(name='Shoes')
+        products = Product.objects.bulk_create([
+            Product(name=f'P{i}', description='d', price=1, stock=1, category=category)
+            for i in range(recommendations.CANDIDATES + 3)
+        ])
+        user = get_user_model().objects.create_user('buyer', 'buyer@example.com', 'pw')
+
+        def place(basket):
+            order = Order.objects.create(user=user, total_amount=1)
+            OrderItem.objects.bulk_create([OrderItem(order=order, product=p, quantity=1, price=1) for p in basket])
+            recommendations.record_order(order.pk)
+
+        place(products[:recommendations.CANDIDATES + 1])
+        place([products[0], products[-1]])
+        place([products[0], products[1]])
+        neighbours = RelatedProduct.objects.filter(product=products[0])
+        self.assertEqual(neighbours.count(), recommendations.CANDIDATES)
+        self.assertEqual(neighbours.get(related=products[1]).score, 2)
+        self.assertTrue(RelatedProduct.objects.filter(product=products[-1], related=products[0]).exists())
+
+
+class SuggestTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Sports')
+        self.runner = Product.objects.create(name='Red Runner', description='d', price=10, stock=1, category=category)
+        self.shoe = Product.objects.create(
+            name='Running shoe', description='d', price=10, stock=1, category=category, review_count=3,
+        )
+        self.ball = Product.objects.create(name='Rugby ball', description='d', price=10, stock=1, category=category)
+        DailyProductSales.objects.create(day=timezone.localdate(), product=self.ball, units=10)
+        self.index = SuggestIndex()
+        self.index.build()
+
+    def names(self, query, limit=8):
+        return [item['name'] for item in self.index.suggest(query, limit)]
+
+    def test_matches_rank_by_popularity(self):
+        self.assertEqual(self.names('ru'), ['Rugby ball', 'Running shoe', 'Red Runner'])
+        self.assertEqual(self.names('RUN'), ['Running shoe', 'Red Runner'])
+        self.assertEqual(self.names('sports', limit=1), ['Rugby ball'])
+        self.assertEqual(self.names('shoes'), [])
+
+    def test_changes_publish_a_new_snapshot(self):
+        before = self.index._snapshot
+        Product.objects.filter(pk=self.runner.pk).update(name='Blue trainer')
+        self.index._apply({('product', self.runner.pk)})
+        self.assertEqual(self.names('run'), ['Running shoe'])
+        self.assertEqual(self.names('trainer'), ['Blue trainer'])
+        # Lookups that already hold the old snapshot keep a consistent view
+        self.assertIn(('red runner', self.runner.pk), before.entries)
+
+
+class ProductDocumentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Shoes')
+        self.product = Product.objects.create(
+            name='Runner', description='A light running shoe. ' * 50, price=50, stock=5, category=category,
+        )
+        self.url = f'/api/products/{self.product.pk}/document/'
+
+    def test_stale_document_is_rebuilt(self):
+        first = self.client.get(self.url)
+        self.assertEqual(json.loads(first.content)['product']['name'], 'Runner')
+        etag = first['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=f'W/"other", {etag}').status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Trail runner'
+            self.product.save()
+        second = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(json.loads(second.content)['product']['name'], 'Trail runner')
+        self.assertNotEqual(second['ETag'], etag)
+
+    def test_if_none_match_is_parsed(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='*').status_code, 304)
+        # Weak comparison: the strong form of the same tag matches too
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag[2:]).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"nope"').status_code, 200)
+
+    def test_serves_the_cached_gzip_encoding(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(response['ETag'], plain['ETag'])
+
+    def test_missing_product_is_404(self):
+        self.assertEqual(self.client.get('/api/products/999999/document/').status_code, 404)
+
+
+class ProductListCachingTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Shoes')
+        self.runner = Product.objects.create(name='Runner', description='d', price=50, stock=5, category=self.category)
+        Product.objects.create(name='Trainer', description='d', price=60, stock=5, category=self.category)
+
+    def test_not_modified_round_trip(self):
+        first = self.client.get('/api/products/')
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first['ETag'].startswith('W/"'))
+        self.assertIn('Last-Modified', first)
+
+        cached = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+        self.assertEqual(cached['ETag'], first['ETag'])
+
+        # Another query string is another representation
+        self.assertEqual(
+            self.client.get('/api/products/?search=run', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200,
+        )
+
+        self.runner.price = 45
+        self.runner.save()
+        changed = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    def test_category_rename_changes_the_etag(self):
+        etag = self.client.get(f'/api/products/{self.runner.pk}/')['ETag']
+        self.assertEqual(self.client.get(f'/api/products/{self.runner.pk}/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.category.name = 'Footwear'
+        self.category.save()
+        response = self.client.get(f'/api/products/{self.runner.pk}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['category']['name'], 'Footwear')
 
-# Create your tests here.
+    def test_sideload_includes_each_category_once(self):
+        response = self.client.get('/api/products/', {'sideload': 1})
+        payload = json.loads(response.content)
+        self.assertEqual([product['category'] for product in payload['results']], [self.category.pk] * 2)
+        self.assertEqual(list(payload['included']['categories']), [str(self.category.pk)])
+        self.assertEqual(payload['included']['categories'][str(self.category.pk)]['name'], 'Shoes')
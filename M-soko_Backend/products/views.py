@@ -1,14 +1,26 @@
 from rest_framework import viewsets, mixins, status, filters
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAdminUser
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly, IsAdminUser
 from django_filters.rest_framework import DjangoFilterBackend # 👈 New: Import for filtering
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
 
+from m_soko.conditional import ConditionalGetMixin, collection_version
+from m_soko.middleware import accepted_encodings
+from m_soko.uploads import DirectUploadMixin
+from .documents import product_document
 from .models import Product, Category, Review
 from .serializers import ProductSerializer, CategorySerializer, ReviewSerializer
 from .filters import ProductFilter
+from .pagination import ReviewCursorPagination
+from .recommendations import related_product_ids
+from .sideload import SideloadListMixin
+from .suggest import suggest_index
 
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all().order_by('id')
+class ProductViewSet(ConditionalGetMixin, SideloadListMixin, DirectUploadMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.select_related('category').order_by('id')
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     
@@ -17,21 +29,93 @@ class ProductViewSet(viewsets.ModelViewSet):
     filterset_class = ProductFilter
     search_fields = ['name', 'description']
 
-class CategoryViewSet(viewsets.ModelViewSet):
+    def get_validators(self, detail):
+        parts, last_modified = super().get_validators(detail)
+        # Products embed their category, which has no timestamp of its own
+        return (parts, collection_version('categories')), last_modified
+
+    def get_sideload_ids(self, objects):
+        return {'category_ids': {product.category_id for product in objects}}
+
+    @action(detail=True, methods=['get'], pagination_class=None)
+    def related(self, request, pk=None):
+        """
+        "Customers also bought" products, served from the cached neighbour list.
+        """
+        try:
+            ids = related_product_ids(int(pk))
+        except ValueError:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        products = Product.objects.select_related('category').in_bulk(ids)
+        ordered = [products[product_id] for product_id in ids if product_id in products]
+        return Response(self.get_serializer(ordered, many=True).data)
+
+    @action(detail=True, methods=['get'], permission_classes=[AllowAny], authentication_classes=[])
+    def document(self, request, pk=None):
+        """
+        Everything the product page shows, served as pre-rendered JSON from
+        the cache (see products.documents). Anonymous and identical for every
+        user, so authentication is skipped along with the ORM.
+        """
+        try:
+            entry = product_document(int(pk))
+        except ValueError:
+            entry = None
+        if entry is None:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        response = get_conditional_response(request, etag=entry['etag'])
+        if response is None:
+            response = HttpResponse(entry['body'], content_type='application/json')
+            # Pre-compressed when the document was built; the middleware leaves encoded bodies alone
+            codings = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+            encoded = entry.get('encoded', {})
+            for coding in ('br', 'gzip'):
+                if coding in codings and coding in encoded:
+                    response.content = encoded[coding]
+                    response['Content-Encoding'] = coding
+                    break
+        patch_vary_headers(response, ('Accept-Encoding',))
+        response['ETag'] = entry['etag']
+        patch_cache_control(response, public=True, max_age=self.cache_max_age)
+        return response
+
+    @action(detail=False, methods=['get'], pagination_class=None, permission_classes=[AllowAny])
+    def suggest(self, request):
+        """
+        Typeahead for the search box: ``?q=<prefix>&limit=<n>`` returns the
+        id, name and thumbnail of the best matches from the in-memory index,
+        which a background thread keeps up to date.
+        """
+        try:
+            limit = min(max(int(request.query_params.get('limit', 8)), 1), 20)
+        except ValueError:
+            limit = 8
+        suggest_index.start()
+        response = Response(suggest_index.suggest(request.query_params.get('q', ''), limit))
+        patch_cache_control(response, public=True, max_age=60)
+        return response
+
+class CategoryViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    def get_validators(self, detail):
+        return collection_version('categories'), None
+
 class ReviewViewSet(viewsets.ModelViewSet):
     # 👈 New: Add a base queryset here. It's required for ModelViewSet.
-    queryset = Review.objects.all()
+    queryset = Review.objects.select_related('user')
     serializer_class = ReviewSerializer
+    pagination_class = ReviewCursorPagination
     
     # 👈 New: Use a more idiomatic way to handle permissions based on action
     def get_permissions(self):
         # Admins can update or delete reviews
         if self.action in ['update', 'partial_update', 'destroy']:
             return [IsAdminUser()]
+        if self.action == 'mine':
+            return [IsAuthenticated()]
         # Authenticated users can create reviews, all can view
         return [IsAuthenticatedOrReadOnly()]
 
@@ -48,8 +132,41 @@ class ReviewViewSet(viewsets.ModelViewSet):
             is_visible=True
         ).order_by('-created_at')
 
+    def _own_review_id(self):
+        # Single lookup on the (user, product) unique key
+        return Review.objects.filter(
+            user=self.request.user, product_id=self.kwargs['product_pk']
+        ).values_list('id', flat=True).first()
+
+    def list(self, request, *args, **kwargs):
+        # The approved count comes from the denormalized aggregate, not a COUNT(*)
+        approved_count = Product.objects.filter(pk=self.kwargs['product_pk']).values_list('review_count', flat=True).first()
+        if approved_count is None:
+            raise NotFound("Product not found.")
+        response = super().list(request, *args, **kwargs)
+        response['X-Approved-Count'] = approved_count
+        if request.user.is_authenticated:
+            response['X-User-Review-Id'] = self._own_review_id() or ''
+        return response
+
+    def mine(self, request, *args, **kwargs):
+        """
+        The current user's review of this product, whatever its status.
+        """
+        review_id = self._own_review_id()
+        if review_id is None:
+            raise NotFound("You have not reviewed this product.")
+        return Response(self.get_serializer(Review.objects.select_related('user').get(pk=review_id)).data)
+
     def perform_create(self, serializer):
-        product = Product.objects.get(pk=self.kwargs['product_pk'])
+        if not Product.objects.filter(pk=self.kwargs['product_pk']).exists():
+            raise NotFound("Product not found.")
+        if self._own_review_id() is not None:
+            raise ValidationError({'detail': "You have already reviewed this product."})
         # Set initial status to 'pending'
-        serializer.save(user=self.request.user, product=product, status='pending', is_visible=False)
-
+        serializer.save(
+            user=self.request.user,
+            product_id=self.kwargs['product_pk'],
+            status='pending',
+            is_visible=False
+        )
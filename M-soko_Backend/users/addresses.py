@@ -0,0 +1,91 @@
+"""
+The address book.
+
+A user has at most one default address, enforced by the partial unique
+index address_one_default_per_user, which is also what the default lookup
+at checkout reads. set_default() moves the flag inside one transaction.
+
+Lookups are memoized for the length of a request (see m_soko.memo); views
+that write addresses call forget_addresses() afterwards.
+"""
+from django.db import transaction
+
+from m_soko.memo import memoized, request_memo
+from .models import Address
+
+SNAPSHOT_FIELDS = (
+    'full_name', 'phone_number', 'address_line_1', 'address_line_2',
+    'city', 'state_province', 'country', 'postal_code',
+)
+
+
+def address_snapshot(address):
+    """
+    The address as a plain dict, for embedding in an order.
+    """
+    if address is None:
+        return None
+    return {field: getattr(address, field) for field in SNAPSHOT_FIELDS}
+
+
+def set_default(user, address_id):
+    """
+    Makes one of the user's addresses their default. Returns False if the
+    address isn't theirs.
+
+    The partial unique index is checked row by row and can't be deferred,
+    so the flag can't be swapped by a single UPDATE: the old default is
+    cleared first, then the new one set, with the user's addresses locked
+    so concurrent switches queue up instead of colliding.
+    """
+    with transaction.atomic():
+        ids = set(Address.objects.select_for_update().filter(user=user).values_list('pk', flat=True))
+        if address_id not in ids:
+            return False
+        Address.objects.filter(user=user, is_default=True).exclude(pk=address_id).update(is_default=False)
+        Address.objects.filter(pk=address_id, is_default=False).update(is_default=True)
+    return True
+
+
+def ensure_default(user):
+    """
+    Makes the user's oldest address the default if they have none, so there's
+    always a default while they have any address at all. Returns the id of
+    the default address, or None if they have no addresses.
+    """
+    with transaction.atomic():
+        rows = list(Address.objects.select_for_update().filter(user=user).order_by('pk').values_list('pk', 'is_default'))
+        if not rows:
+            return None
+        default = next((pk for pk, is_default in rows if is_default), None)
+        if default is None:
+            default = rows[0][0]
+            Address.objects.filter(pk=default).update(is_default=True)
+        return default
+
+
+def default_address(request):
+    """
+    The user's default address, or None.
+    """
+    return memoized(
+        request, 'default_address', lambda: Address.objects.filter(user=request.user, is_default=True).first(),
+    )
+
+
+def user_address(request, address_id):
+    """
+    One of the user's addresses by id, or None if it isn't theirs.
+    """
+    default = request_memo(request).get('default_address')
+    if default is not None and default.pk == address_id:
+        return default
+    return memoized(
+        request, ('address', address_id), lambda: Address.objects.filter(user=request.user, pk=address_id).first(),
+    )
+
+
+def forget_addresses(request):
+    memo = request_memo(request)
+    for key in [key for key in memo if key == 'default_address' or (isinstance(key, tuple) and key[0] == 'address')]:
+        del memo[key]
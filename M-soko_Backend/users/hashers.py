@@ -0,0 +1,110 @@
+"""
+Password hashers.
+
+The preferred hasher is picked by PASSWORD_HASHER_PROFILE and its cost comes
+from settings, so each deployment can trade login CPU time against
+brute-force resistance (benchmark_password_hashing measures both). The
+tunable hashers keep Django's algorithm names, so existing hashes keep
+verifying and any hash at a different cost is rehashed on the next
+successful login.
+
+The legacy hashers only verify the unsalted MD5/SHA-1 digests carried over
+by import_users. They are never used to hash, and a successful login moves
+the user onto the preferred hasher.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher, BasePasswordHasher, PBKDF2PasswordHasher, identify_hasher, mask_hash,
+)
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import gettext_noop as _
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+class TunableArgon2PasswordHasher(Argon2PasswordHasher):
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST
+
+
+class _UnsaltedDigestPasswordHasher(BasePasswordHasher):
+    digest = None
+
+    def salt(self):
+        return ''
+
+    def encode(self, password, salt):
+        if salt != '':
+            raise ValueError("Legacy digests are unsalted.")
+        return f'{self.algorithm}$${self.digest(password.encode()).hexdigest()}'
+
+    def decode(self, encoded):
+        algorithm, _, digest = encoded.split('$', 2)
+        assert algorithm == self.algorithm
+        return {'algorithm': algorithm, 'hash': digest, 'salt': None}
+
+    def verify(self, password, encoded):
+        return constant_time_compare(encoded, self.encode(password, ''))
+
+    def safe_summary(self, encoded):
+        decoded = self.decode(encoded)
+        return {_('algorithm'): decoded['algorithm'], _('hash'): mask_hash(decoded['hash'])}
+
+    def must_update(self, encoded):
+        return True
+
+    def harden_runtime(self, password, encoded):
+        pass
+
+
+class LegacyMD5PasswordHasher(_UnsaltedDigestPasswordHasher):
+    algorithm = 'legacy_md5'
+    digest = hashlib.md5
+
+
+class LegacySHA1PasswordHasher(_UnsaltedDigestPasswordHasher):
+    algorithm = 'legacy_sha1'
+    digest = hashlib.sha1
+
+
+def _is_hex(value, length):
+    return len(value) == length and all(ch in '0123456789abcdef' for ch in value)
+
+
+def import_password(value):
+    """
+    Converts a password hash exported from the old platform into Django's
+    encoded form. Accepts Django-encoded hashes of any configured algorithm,
+    bcrypt modular-crypt hashes ($2a$, $2b$, $2y$) and unsalted MD5/SHA-1
+    hex digests. Raises ValueError for anything else, or when the hasher's
+    library (bcrypt, argon2-cffi) isn't installed.
+    """
+    value = value.strip()
+    if value.startswith(('$2a$', '$2b$', '$2y$')):
+        # Django's bcrypt hasher stores the modular-crypt string behind its prefix
+        encoded = 'bcrypt$' + value
+    elif _is_hex(value.lower(), 32):
+        encoded = f'legacy_md5$${value.lower()}'
+    elif _is_hex(value.lower(), 40):
+        encoded = f'legacy_sha1$${value.lower()}'
+    else:
+        encoded = value
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        raise ValueError("unrecognised password hash")
+    if hasher.library:
+        # Fail on import rather than at the user's first login
+        hasher._load_library()
+    return encoded
@@ -0,0 +1,159 @@
+"""
+Bulk import of customers from the old platform.
+
+import_users() takes an iterable of CSV rows (dicts) and works through it in
+batches: each batch is checked against the existing usernames and emails
+with two indexed IN queries, then the new users and their addresses are
+written with one bulk INSERT each, in their own transaction. Rows stream
+through, so memory stays flat however big the export is.
+
+Passwords are imported as hashes (see users.hashers.import_password) and
+never rehashed here; the registration path's validators and per-user token
+are skipped too. Users log in with their old password, which moves them onto
+the current hasher, and get a token from the login endpoint.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .addresses import SNAPSHOT_FIELDS
+from .hashers import import_password
+from .models import Address
+
+User = get_user_model()
+
+# Address columns are optional; a row gets an address when address_line_1 is filled in
+ADDRESS_COLUMNS = {field: f'address_{field}' if field == 'full_name' else field for field in SNAPSHOT_FIELDS}
+
+MAX_REJECTED = 1000
+
+_validate_username = UnicodeUsernameValidator()
+
+
+class ImportStats:
+    def __init__(self):
+        self.created = 0
+        self.addresses = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.rejected = []  # (line number, reason) of the first MAX_REJECTED invalid rows
+
+    @property
+    def processed(self):
+        return self.created + self.duplicates + self.invalid
+
+
+def _clean(row):
+    """
+    Builds the User and Address for one row. Raises ValueError if it's unusable.
+    """
+    username = (row.get('username') or '').strip()
+    if not username:
+        raise ValueError("missing username")
+    try:
+        _validate_username(username)
+    except ValidationError:
+        raise ValueError(f"invalid username {username!r}")
+    email = User.objects.normalize_email((row.get('email') or '').strip())
+    password = (row.get('password') or '').strip()
+    # Users without a usable hash have to reset their password
+    password = import_password(password) if password else make_password(None)
+
+    user = User(
+        username=username, email=email, password=password,
+        first_name=(row.get('first_name') or '').strip(), last_name=(row.get('last_name') or '').strip(),
+    )
+    address = None
+    if (row.get('address_line_1') or '').strip():
+        address = Address(
+            is_default=True, **{field: (row.get(column) or '').strip() for field, column in ADDRESS_COLUMNS.items()},
+        )
+        address.address_line_2 = address.address_line_2 or None
+        address.full_name = address.full_name or f'{user.first_name} {user.last_name}'.strip() or username
+    return user, address
+
+
+def _existing(users):
+    usernames = [user.username for user in users]
+    emails = [user.email for user in users if user.email]
+    taken_usernames = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+    taken_emails = set(User.objects.filter(email__in=emails).values_list('email', flat=True)) if emails else set()
+    return taken_usernames, taken_emails
+
+
+def _write_batch(batch, stats, dry_run, seen):
+    taken_usernames, taken_emails = _existing([user for _, user, _ in batch])
+    if dry_run:
+        # Nothing is written, so earlier batches' users have to be remembered here
+        taken_usernames |= seen[0]
+        taken_emails |= seen[1]
+    fresh = []
+    duplicates = 0
+    for line, user, address in batch:
+        if user.username in taken_usernames or (user.email and user.email in taken_emails):
+            duplicates += 1
+            continue
+        # Later rows of the same batch can repeat an earlier one too
+        taken_usernames.add(user.username)
+        if user.email:
+            taken_emails.add(user.email)
+        fresh.append((user, address))
+    if dry_run:
+        seen[0].update(user.username for user, _ in fresh)
+        seen[1].update(user.email for user, _ in fresh if user.email)
+    if dry_run or not fresh:
+        stats.created += len(fresh)
+        stats.addresses += sum(1 for _, address in fresh if address is not None)
+        stats.duplicates += duplicates
+        return
+
+    with transaction.atomic():
+        users = User.objects.bulk_create([user for user, _ in fresh])
+        addresses = []
+        for user, (_, address) in zip(users, fresh):
+            if address is not None:
+                address.user = user
+                addresses.append(address)
+        Address.objects.bulk_create(addresses)
+    stats.created += len(users)
+    stats.addresses += len(addresses)
+    stats.duplicates += duplicates
+
+
+def import_users(rows, batch_size=1000, dry_run=False, progress=None):
+    """
+    Imports users (and optionally one default address each) from an iterable
+    of dict rows, skipping any whose username or email already exists.
+    Returns an ImportStats.
+    """
+    stats = ImportStats()
+    batch = []
+    seen = (set(), set())
+
+    def flush():
+        try:
+            _write_batch(batch, stats, dry_run, seen)
+        except IntegrityError:
+            # Someone registered one of these names since the check; the re-check skips them
+            _write_batch(batch, stats, dry_run, seen)
+        batch.clear()
+        if progress is not None:
+            progress(stats)
+
+    # Line 1 is the CSV header
+    for line, row in enumerate(rows, start=2):
+        try:
+            user, address = _clean(row)
+        except ValueError as e:
+            stats.invalid += 1
+            if len(stats.rejected) < MAX_REJECTED:
+                stats.rejected.append((line, str(e)))
+            continue
+        batch.append((line, user, address))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return stats
@@ -0,0 +1,62 @@
+import time
+
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+
+from m_soko.throttling import LoginRateThrottle
+from users.views import UserLoginView
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the cost of rejecting a throttled login with the cost of the "
+        "password check that an unthrottled login performs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        factory = APIRequestFactory()
+        view = UserLoginView.as_view()
+
+        def login_request():
+            return factory.post(
+                '/api/login/', {'username': 'benchmark-user', 'password': 'wrong'},
+                format='json', REMOTE_ADDR='203.0.113.7',
+            )
+
+        # Fill the window so every timed request is rejected by the throttle
+        cache.clear()
+        while view(login_request()).status_code != 429:
+            pass
+
+        requests = [login_request() for _ in range(iterations)]
+        start = time.perf_counter()
+        for request in requests:
+            view(request)
+        rejected_us = (time.perf_counter() - start) / iterations * 1e6
+
+        # The throttle decision on its own, without DRF's request/response handling
+        throttle = LoginRateThrottle()
+        drf_request = view.cls().initialize_request(requests[0])
+        start = time.perf_counter()
+        for _ in range(iterations):
+            throttle.allow_request(drf_request, None)
+        check_us = (time.perf_counter() - start) / iterations * 1e6
+
+        encoded = make_password('benchmark-password')
+        checks = max(1, iterations // 200)
+        start = time.perf_counter()
+        for _ in range(checks):
+            check_password('wrong-password', encoded)
+        hash_us = (time.perf_counter() - start) / checks * 1e6
+        cache.clear()
+
+        self.stdout.write(f"Throttled login rejected in {rejected_us:,.1f} us per request ({iterations} requests)")
+        self.stdout.write(f"Throttle check alone costs {check_us:,.1f} us per request")
+        self.stdout.write(f"Password check costs {hash_us:,.1f} us per attempt ({checks} checks)")
+        self.stdout.write(self.style.SUCCESS(f"Rejection is {hash_us / rejected_us:,.0f}x cheaper than hashing"))
@@ -0,0 +1,75 @@
+import io
+import time
+from contextlib import redirect_stdout
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+
+from users.views import UserLoginView
+
+PASSWORD = 'correct horse battery staple'
+
+
+class Command(BaseCommand):
+    help = (
+        "Reports the CPU cost of one password check per hasher profile and "
+        "PBKDF2 iteration count, and of a whole login request with the current settings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pbkdf2-iterations', type=int, nargs='*', default=[260_000, 600_000, 1_000_000],
+            help="PBKDF2 iteration counts to compare with the configured one.",
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def _cpu_ms(self, fn, repeat):
+        fn()
+        start = time.process_time()
+        for _ in range(repeat):
+            fn()
+        return (time.process_time() - start) / repeat * 1000
+
+    def _report(self, label, ms):
+        self.stdout.write(f"{label:40} {ms:>9,.1f} ms {1000 / ms if ms else 0:>9,.1f}/s per core")
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        self.stdout.write(f"{'hasher':40} {'check':>12} {'logins':>16}")
+
+        configured = settings.PASSWORD_PBKDF2_ITERATIONS
+        for iterations in sorted(set(options['pbkdf2_iterations']) | {configured}):
+            with override_settings(PASSWORD_PBKDF2_ITERATIONS=iterations):
+                hasher = get_hasher('pbkdf2_sha256')
+                encoded = hasher.encode(PASSWORD, hasher.salt())
+                label = f"pbkdf2_sha256 x{iterations:,}" + (" (configured)" if iterations == configured else "")
+                self._report(label, self._cpu_ms(lambda: hasher.verify(PASSWORD, encoded), repeat))
+
+        for algorithm in ('argon2', 'scrypt'):
+            hasher = get_hasher(algorithm)
+            try:
+                encoded = hasher.encode(PASSWORD, hasher.salt())
+            except ValueError:
+                self.stdout.write(f"{algorithm:40} skipped (library not installed)")
+                continue
+            self._report(algorithm, self._cpu_ms(lambda: hasher.verify(PASSWORD, encoded), repeat))
+
+        # A whole login request (lookup, password check, token rotation) without the throttles, rolled back afterwards
+        factory = APIRequestFactory()
+        view = UserLoginView.as_view(throttle_classes=[])
+        with transaction.atomic():
+            user = get_user_model().objects.create_user('benchmark-login-user', password=PASSWORD)
+
+            def login():
+                request = factory.post('/api/login/', {'username': user.username, 'password': PASSWORD}, format='json')
+                with redirect_stdout(io.StringIO()):
+                    response = view(request)
+                assert response.status_code == 200
+
+            self._report(f"login request ({settings.PASSWORD_HASHER_PROFILE})", self._cpu_ms(login, repeat))
+            transaction.set_rollback(True)
@@ -0,0 +1,45 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.importing import import_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports customers from a CSV export with columns username, email, "
+        "first_name, last_name, password (a hash) and, optionally, "
+        "address_full_name, phone_number, address_line_1, address_line_2, city, "
+        "state_province, country and postal_code. Existing usernames and emails are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--encoding', default='utf-8-sig')
+        parser.add_argument('--dry-run', action='store_true', help="Check the file without writing anything.")
+        parser.add_argument('--show-invalid', type=int, default=20, help="How many rejected rows to list.")
+
+    def handle(self, *args, **options):
+        try:
+            f = open(options['path'], newline='', encoding=options['encoding'])
+        except OSError as e:
+            raise CommandError(f"Can't read {options['path']}: {e}")
+        with f:
+            reader = csv.DictReader(f)
+            if not reader.fieldnames or 'username' not in reader.fieldnames:
+                raise CommandError("The file needs a header row with at least a username column.")
+            stats = import_users(
+                reader,
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+                progress=lambda stats: self.stdout.write(f"Processed {stats.processed} rows..."),
+            )
+
+        for line, reason in stats.rejected[:options['show_invalid']]:
+            self.stdout.write(f"Line {line}: {reason}")
+        verb = "Would import" if options['dry_run'] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {stats.created} users and {stats.addresses} addresses; "
+            f"skipped {stats.duplicates} duplicates and {stats.invalid} invalid rows."
+        ))
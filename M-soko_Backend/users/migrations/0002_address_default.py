@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:22
+
+from django.db import migrations, models
+
+
+def keep_one_default(apps, schema_editor):
+    # Users with several defaults keep their oldest one
+    Address = apps.get_model('users', 'Address')
+    kept = set()
+    extra = []
+    for pk, user_id in Address.objects.filter(is_default=True).order_by('user_id', 'pk').values_list('pk', 'user_id'):
+        if user_id in kept:
+            extra.append(pk)
+        kept.add(user_id)
+    Address.objects.filter(pk__in=extra).update(is_default=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_one_default, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='address',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_default', True)), fields=('user',), name='address_one_default_per_user'),
+        ),
+    ]
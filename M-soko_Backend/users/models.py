@@ -10,6 +10,12 @@ class CustomUser(AbstractUser):
     """
     profile_picture = CloudinaryField('profile_picture', blank=True, null=True)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Registration, profile edits and import_users check emails for duplicates
+            models.Index(fields=['email'], name='user_email_idx'),
+        ]
+
     def __str__(self):
         return self.username
 
@@ -27,6 +33,12 @@ class Address(models.Model):
 
     class Meta:
         verbose_name_plural = "Addresses"
+        constraints = [
+            # At most one default per user; also the index checkout resolves the default through
+            models.UniqueConstraint(
+                fields=['user'], condition=models.Q(is_default=True), name='address_one_default_per_user',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.full_name}, {self.city}, {self.country}"
\ No newline at end of file
@@ -10,7 +10,8 @@ class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'profile_picture']
-        read_only_fields = ['username']
+        # Pictures are uploaded directly to storage (see m_soko.uploads)
+        read_only_fields = ['username', 'profile_picture']
         extra_kwargs = {
             'email': {'required': True},
         }
@@ -1,3 +1,133 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from .models import Address
+
+User = get_user_model()
+
+ADDRESS = {
+    'full_name': 'Ann Shopper', 'phone_number': '0700000000', 'address_line_1': '1 Main St', 'city': 'Nairobi',
+    'state_province': 'Nairobi', 'country': 'Kenya', 'postal_code': '00100',
+}
+
+
+class AddressBookTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ann', 'ann@example.com', 'pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add(self, **fields):
+        response = self.client.post('/api/users/addresses/', dict(ADDRESS, **fields))
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def default_id(self):
+        return Address.objects.get(user=self.user, is_default=True).pk
+
+    def test_first_address_becomes_the_default(self):
+        first = self.add()
+        second = self.add(city='Mombasa')
+        self.assertEqual(self.default_id(), first)
+        self.assertFalse(Address.objects.get(pk=second).is_default)
+
+    def test_switching_the_default(self):
+        first = self.add()
+        second = self.add(is_default=True)
+        self.assertEqual(self.default_id(), second)
+        response = self.client.post(f'/api/users/addresses/{first}/default/')
+        self.assertTrue(response.json()['is_default'])
+        self.assertEqual(self.default_id(), first)
+        self.assertEqual(Address.objects.filter(user=self.user, is_default=True).count(), 1)
+
+    def test_deleting_the_default_promotes_the_oldest(self):
+        first = self.add()
+        second = self.add()
+        third = self.add(is_default=True)
+        self.client.delete(f'/api/users/addresses/{third}/')
+        self.assertEqual(self.default_id(), first)
+        self.client.delete(f'/api/users/addresses/{first}/')
+        self.assertEqual(self.default_id(), second)
+
+    def test_other_users_addresses_are_out_of_reach(self):
+        other = User.objects.create_user('bea', 'bea@example.com', 'pw')
+        theirs = Address.objects.create(user=other, is_default=True, **ADDRESS)
+        self.add()
+        self.assertEqual(self.client.post(f'/api/users/addresses/{theirs.pk}/default/').status_code, 404)
+        self.assertTrue(Address.objects.get(pk=theirs.pk).is_default)
+
+
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        User.objects.create_user('ann', 'ann@example.com', 'right-password')
+
+    def login(self, username, password='wrong'):
+        return self.client.post('/api/login/', {'username': username, 'password': password})
+
+    def test_guessing_one_username_is_throttled_and_counted(self):
+        # login_username allows 5 attempts a minute
+        for _ in range(5):
+            self.assertEqual(self.login('ann').status_code, 400)
+        response = self.login('Ann ')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        # Other accounts from the same client are still under the per-IP limit
+        self.assertEqual(self.login('bob').status_code, 400)
+
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        metrics = APIClient()
+        metrics.force_authenticate(admin)
+        counts = metrics.get('/api/metrics/throttles/').json()['throttled']
+        self.assertEqual((counts['login_username'], counts['login']), (1, 0))
+
+    def test_metrics_are_staff_only(self):
+        self.client.force_authenticate(User.objects.get(username='ann'))
+        self.assertEqual(self.client.get('/api/metrics/throttles/').status_code, 403)
+
+
+class ImportUsersCommandTests(TestCase):
+    HEADER = 'username,email,first_name,last_name,password,address_line_1,city,country,postal_code,phone_number\n'
+
+    def run_import(self, rows, *args):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write(self.HEADER + ''.join(row + '\n' for row in rows))
+        self.addCleanup(os.remove, f.name)
+        out = StringIO()
+        call_command('import_users', f.name, *args, stdout=out)
+        return out.getvalue()
+
+    def test_import(self):
+        User.objects.create_user('taken', 'taken@example.com', 'pw')
+        password = make_password('old-secret')
+        output = self.run_import([
+            f'alice,Alice@Example.COM,Alice,A,{password},1 Main St,Nairobi,Kenya,00100,0700',
+            'bob,bob@example.com,Bob,B,,,,,,',
+            'taken,new@example.com,,,,,,,,',
+            'dupe,taken@example.com,,,,,,,,',
+            'bob,other@example.com,,,,,,,,',
+            'bad name!,x@example.com,,,,,,,,',
+        ], '--batch-size', '2')
+
+        self.assertIn("Imported 2 users and 1 addresses; skipped 3 duplicates and 1 invalid rows.", output)
+        self.assertIn("Line 7: invalid username 'bad name!'", output)
+        alice = User.objects.get(username='alice')
+        self.assertEqual(alice.email, 'Alice@example.com')
+        self.assertTrue(alice.check_password('old-secret'))
+        address = Address.objects.get(user=alice)
+        self.assertEqual((address.full_name, address.city, address.is_default), ('Alice A', 'Nairobi', True))
+        self.assertFalse(User.objects.get(username='bob').has_usable_password())
 
-# Create your tests here.
+    def test_dry_run_writes_nothing(self):
+        output = self.run_import(['alice,alice@example.com,,,,,,,,', 'alice,,,,,,,,,'], '--dry-run')
+        self.assertIn("Would import 1 users and 0 addresses; skipped 1 duplicates", output)
+        self.assertFalse(User.objects.filter(username='alice').exists())
@@ -1,11 +1,15 @@
 from django.contrib.auth import get_user_model
 from rest_framework import generics, viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.authtoken.models import Token # Import the Token model
 from django.contrib.auth import authenticate
+from m_soko.throttling import LoginRateThrottle, LoginUsernameRateThrottle, RegistrationRateThrottle
+from m_soko.uploads import DirectUploadMixin
+from .addresses import ensure_default, forget_addresses, set_default
 from .models import Address, CustomUser
 from .serializers import (
     AddressSerializer, 
@@ -19,6 +23,7 @@ class UserRegistrationView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserRegistrationSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [RegistrationRateThrottle]
 
 
 # 👈 New: View for retrieving the user's profile (GET only)
@@ -30,7 +35,7 @@ class UserProfileRetrieveView(generics.RetrieveAPIView):
         return self.request.user
 
 # 👈 New: View for updating the user's profile (PUT/PATCH only)
-class UserProfileUpdateView(generics.UpdateAPIView):
+class UserProfileUpdateView(DirectUploadMixin, generics.UpdateAPIView):
     serializer_class = UserProfileSerializer
     permission_classes = [IsAuthenticated]
 
@@ -45,7 +50,41 @@ class AddressViewSet(viewsets.ModelViewSet):
         return Address.objects.filter(user=self.request.user)
     
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        # The default flag only moves through set_default(), which keeps it unique
+        make_default = serializer.validated_data.pop('is_default', False)
+        address = serializer.save(user=self.request.user)
+        if make_default:
+            set_default(self.request.user, address.pk)
+            address.is_default = True
+        else:
+            address.is_default = ensure_default(self.request.user) == address.pk
+        forget_addresses(self.request)
+
+    def perform_update(self, serializer):
+        # Clearing the flag isn't supported; the default changes by making another address the default
+        make_default = serializer.validated_data.pop('is_default', False)
+        address = serializer.save()
+        if make_default:
+            set_default(self.request.user, address.pk)
+            address.is_default = True
+        forget_addresses(self.request)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        if instance.is_default:
+            ensure_default(self.request.user)
+        forget_addresses(self.request)
+
+    @action(detail=True, methods=['post'], url_path='default')
+    def make_default(self, request, pk=None):
+        """
+        Makes this address the user's default.
+        """
+        address = self.get_object()
+        set_default(request.user, address.pk)
+        forget_addresses(request)
+        address.refresh_from_db()
+        return Response(self.get_serializer(address).data)
 
 class LogoutView(APIView):
     permission_classes = [IsAuthenticated]
@@ -60,6 +99,8 @@ class LogoutView(APIView):
         
 class UserLoginView(APIView):
     permission_classes = [AllowAny] 
+    # Rejected before authenticate() runs the expensive password hash
+    throttle_classes = [LoginRateThrottle, LoginUsernameRateThrottle]
 
     def post(self, request, *args, **kwargs):
         print("UserLoginView is being called!")